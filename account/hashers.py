@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class Cost:
+    """
+    Reads a work factor from ``PASSWORD_HASHER_COST`` on every access, so changing
+    the setting makes ``must_update`` true for older hashes and they are upgraded
+    on the next successful login.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __set_name__(self, owner, attr):
+        self.default = getattr(owner.__mro__[1], attr)
+
+    def __get__(self, instance, owner=None):
+        return getattr(settings, 'PASSWORD_HASHER_COST', {}).get(self.name, self.default)
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    iterations = Cost('pbkdf2_iterations')
+
+
+class ScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    work_factor = Cost('scrypt_work_factor')
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """Needs ``argon2-cffi``."""
+    time_cost = Cost('argon2_time_cost')
+    memory_cost = Cost('argon2_memory_cost')
+    parallelism = Cost('argon2_parallelism')
+
+
+class BCryptSHA256PasswordHasher(hashers.BCryptSHA256PasswordHasher):
+    """Needs ``bcrypt``."""
+    rounds = Cost('bcrypt_rounds')
@@ -0,0 +1,47 @@
+import base64
+
+from django.core.management.base import BaseCommand
+from rest_framework.authentication import TokenAuthentication, BasicAuthentication, SessionAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from account.services import User
+from api.authentication import CachedTokenAuthentication, local_token_cache
+from utils.bench import benchmark_database, measure, count_queries
+
+
+class Command(BaseCommand):
+    help = 'Measures the per-request cost of each authentication chain.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=200)
+
+    def handle(self, *args, repeat, **options):
+        factory = APIRequestFactory()
+
+        with benchmark_database():
+            user = User.objects.create_user(email='bench@example.com', password='password', phone='+996700000000')
+            token = Token.objects.create(user=user)
+            basic = base64.b64encode(b'bench@example.com:password').decode()
+            local_token_cache.clear()
+
+            chains = (
+                ('anonymous, default chain', {}, [
+                    CachedTokenAuthentication, SessionAuthentication, BasicAuthentication,
+                ]),
+                ('TokenAuthentication', {'HTTP_AUTHORIZATION': f'Token {token.key}'}, [TokenAuthentication]),
+                ('CachedTokenAuthentication', {'HTTP_AUTHORIZATION': f'Token {token.key}'}, [
+                    CachedTokenAuthentication,
+                ]),
+                ('BasicAuthentication', {'HTTP_AUTHORIZATION': f'Basic {basic}'}, [BasicAuthentication]),
+            )
+            for name, headers, authenticators in chains:
+                def run():
+                    request = Request(factory.get('/', **headers), authenticators=[cls() for cls in authenticators])
+                    request.user
+
+                run()
+                queries = count_queries(run)
+                timing = measure(run, repeat=repeat if 'Basic' not in name else max(3, repeat // 50))
+                self.stdout.write(f'{name:26} {queries} queries  {timing}')
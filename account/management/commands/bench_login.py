@@ -0,0 +1,72 @@
+import importlib.util
+
+from django.contrib.auth import authenticate
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIRequestFactory
+
+from account.services import User
+from api.auth.serializers import ReadUserSerializer
+from api.auth.views import LoginApiView
+from utils.bench import benchmark_database, measure, count_queries
+
+HASHERS = (
+    ('pbkdf2', 'account.hashers.PBKDF2PasswordHasher', None),
+    ('scrypt', 'account.hashers.ScryptPasswordHasher', None),
+    ('argon2', 'account.hashers.Argon2PasswordHasher', 'argon2'),
+    ('bcrypt', 'account.hashers.BCryptSHA256PasswordHasher', 'bcrypt'),
+)
+
+
+class Command(BaseCommand):
+    help = 'Measures logins per second on one core for every available password hasher.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, repeat, **options):
+        factory = APIRequestFactory()
+        view = LoginApiView.as_view()
+
+        def login(email='bench@example.com'):
+            request = factory.post('/', {'email': email, 'password': 'password'}, format='json')
+            return view(request)
+
+        def legacy_login():
+            # The flow LoginApiView had before: authenticate(), get_or_create() and the serializer.
+            user = authenticate(email='bench@example.com', password='password')
+            token, _ = Token.objects.get_or_create(user=user)
+            return {**ReadUserSerializer(user).data, 'token': token.key}
+
+        with benchmark_database(), override_settings(
+            LOGIN_THROTTLE={'IP': None, 'EMAIL': None}, API_THROTTLE={'RATES': {}},
+        ):
+            user = User.objects.create_user(email='bench@example.com', password='password', phone='+996700000000')
+            Token.objects.create(user=user)
+
+            for name, path, module in HASHERS:
+                if module and importlib.util.find_spec(module) is None:
+                    self.stdout.write(f'{name:8} skipped, {module} is not installed')
+                    continue
+
+                others = [item[1] for item in HASHERS if item[1] != path]
+                with override_settings(PASSWORD_HASHERS=[path, *others]):
+                    # The first login upgrades the stored hash to this hasher.
+                    assert login().status_code == 200
+
+                    queries = count_queries(login)
+                    timing = measure(login, repeat=repeat)
+                    unknown = measure(lambda: login('unknown@example.com'), repeat=repeat)
+                    self.stdout.write(
+                        f'{name:8} {1 / timing.median:8.1f} logins/s  {queries} queries  {timing}\n'
+                        f'{"":8} unknown email  {unknown}'
+                    )
+
+                    if name == 'pbkdf2':
+                        legacy_queries = count_queries(legacy_login)
+                        legacy = measure(legacy_login, repeat=repeat)
+                        self.stdout.write(
+                            f'{"":8} {1 / legacy.median:8.1f} logins/s  {legacy_queries} queries  '
+                            f'authenticate() + get_or_create()  {legacy}'
+                        )
@@ -1,4 +1,40 @@
-from django.contrib.auth import get_user_model
+from django.contrib.auth import get_user_model, user_login_failed
+from django.contrib.auth.hashers import check_password, get_hasher, make_password
 from account.models import User as UserModel
 
 User: UserModel = get_user_model()
+
+
+_dummy_passwords = {}
+
+
+def _dummy_password():
+    hasher = get_hasher()
+    encoded = _dummy_passwords.get(hasher.algorithm)
+    if encoded is None or hasher.must_update(encoded):
+        encoded = _dummy_passwords[hasher.algorithm] = make_password('dummy password', hasher=hasher)
+    return encoded
+
+
+def authenticate_by_email(email, password, queryset=None, request=None):
+    """
+    What ``authenticate(email=..., password=...)`` does with ``ModelBackend``,
+    in a single query over ``queryset``, ``user_login_failed`` included. An
+    unknown email is checked against a dummy hash of the preferred hasher so
+    that it takes as long as a wrong password, and a password stored with an
+    outdated hasher or cost is re-hashed by ``check_password``.
+    """
+    queryset = User._default_manager.all() if queryset is None else queryset
+    try:
+        user = queryset.get(**{User.USERNAME_FIELD: email})
+    except User.DoesNotExist:
+        check_password(password, _dummy_password())
+        user = None
+
+    if user is not None and user.check_password(password) and user.is_active:
+        return user
+    # the same cleaned credentials as authenticate() sends
+    user_login_failed.send(
+        sender=__name__, credentials={User.USERNAME_FIELD: email, 'password': '********************'}, request=request,
+    )
+    return None
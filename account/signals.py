@@ -1,8 +1,11 @@
-from django.db.models.signals import pre_save
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
 
 from account.services import User
 from account.models import User as UserModel
+from api.authentication import invalidate_token, invalidate_user_tokens
 
 
 @receiver(pre_save, sender=User)
@@ -12,4 +15,19 @@ def pre_save_user(sender, instance: UserModel, *args, **kwargs):
         instance.role = User.ADMIN
         instance.is_superuser = True
 
-    return instance
\ No newline at end of file
+    return instance
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_token_cache(sender, instance: UserModel, *args, **kwargs):
+    # pre_save_user may have changed role/is_superuser; drop cached users now and
+    # again after commit, in case a concurrent request re-cached the old row meanwhile.
+    pk = instance.pk
+    invalidate_user_tokens(pk)
+    transaction.on_commit(lambda: invalidate_user_tokens(pk))
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_token_cache(sender, instance: Token, *args, **kwargs):
+    invalidate_token(instance.key)
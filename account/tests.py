@@ -1,3 +1,151 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import user_login_failed
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from api.authentication import local_token_cache
+from api.throttling import login_buckets, api_buckets
+from account.services import User
+
+
+class CachedTokenAuthenticationTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='user@example.com', password='password', phone='+996700000001')
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        local_token_cache.clear()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def get(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/v1/categories/')
+        return response, [query['sql'] for query in context.captured_queries if 'authtoken_token' in query['sql']]
+
+    def test_token_lookup_is_cached(self):
+        response, token_queries = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(token_queries), 1)
+        response, token_queries = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(token_queries, [])
+
+    def test_user_change_invalidates(self):
+        self.get()
+        self.user.is_active = False
+        self.user.save()
+        response, token_queries = self.get()
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(len(token_queries), 1)
+
+    def test_token_delete_invalidates(self):
+        self.get()
+        self.token.delete()
+        self.assertEqual(self.get()[0].status_code, 401)
+
+    @override_settings(TOKEN_AUTH_CACHE={'CACHE_ALIAS': 'default'})
+    def test_shared_cache_replaces_local(self):
+        cache.clear()
+        self.assertEqual(len(self.get()[1]), 1)
+        self.assertEqual(self.get()[1], [])
+        self.assertEqual(len(local_token_cache), 0)
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get()[0].status_code, 401)
+
+    @override_settings(TOKEN_AUTH_CACHE={'TTL': 0})
+    def test_settings_are_read_per_request(self):
+        self.get()
+        self.assertEqual(len(self.get()[1]), 1)
+
+
+@override_settings(
+    PASSWORD_HASHER_COST={'pbkdf2_iterations': 1000, 'scrypt_work_factor': 2 ** 10},
+    LOGIN_THROTTLE={'IP': None, 'EMAIL': '3/min'},
+)
+class LoginApiViewTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='user@example.com', password='password', phone='+996700000001')
+
+    def setUp(self):
+        login_buckets.clear()
+        api_buckets.clear()
+
+    def login(self, email='user@example.com', password='password'):
+        return self.client.post('/api/v1/auth/login/', {'email': email, 'password': password})
+
+    def test_login_creates_and_reuses_token(self):
+        response = self.login()
+        self.assertEqual(response.status_code, 200)
+        token = Token.objects.get(user=self.user)
+        self.assertEqual(response.data['token'], token.key)
+        self.assertEqual(response.data['email'], 'user@example.com')
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.login()
+        self.assertEqual(response.data['token'], token.key)
+        self.assertEqual(len(context.captured_queries), 1)
+
+    def test_wrong_password_and_inactive_user(self):
+        handler = mock.Mock()
+        user_login_failed.connect(handler)
+        self.addCleanup(user_login_failed.disconnect, handler)
+
+        self.assertEqual(self.login(password='wrong').status_code, 400)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.login().status_code, 400)
+        self.assertEqual(handler.call_count, 2)
+        self.assertEqual(handler.call_args.kwargs['credentials']['email'], 'user@example.com')
+        self.assertNotEqual(handler.call_args.kwargs['credentials']['password'], 'password')
+
+    def test_unknown_email_checks_dummy_hash(self):
+        with mock.patch('account.services.check_password', wraps=check_password) as checked:
+            response = self.login(email='nobody@example.com')
+        self.assertEqual(response.status_code, 400)
+        checked.assert_called_once()
+        self.assertTrue(checked.call_args.args[1].startswith('pbkdf2_sha256$1000$'))
+
+    def test_rehash_on_login(self):
+        User.objects.filter(pk=self.user.pk).update(password=make_password('password', hasher='pbkdf2_sha256', salt='salt'))
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1000$'))
+
+        with self.settings(PASSWORD_HASHER_COST={'pbkdf2_iterations': 2000}):
+            self.assertEqual(self.login().status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$2000$'))
+
+        hashers = ['account.hashers.ScryptPasswordHasher', 'account.hashers.PBKDF2PasswordHasher']
+        with self.settings(PASSWORD_HASHERS=hashers):
+            self.assertEqual(self.login().status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('scrypt$'))
+        self.assertEqual(self.login().status_code, 200)
+
+    def test_throttle_by_email(self):
+        for _ in range(3):
+            self.assertEqual(self.login(password='wrong').status_code, 400)
+        response = self.login()
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(self.login(email='USER@example.com').status_code, 429)
+        self.assertEqual(self.login(email='other@example.com').status_code, 400)
+
+    @override_settings(LOGIN_THROTTLE={'IP': '4/min', 'EMAIL': '1/min'})
+    def test_refused_attempts_do_not_count_on_ip(self):
+        self.assertEqual(self.login(password='wrong').status_code, 400)
+        for _ in range(5):
+            self.assertEqual(self.login().status_code, 429)
+        for i in range(3):
+            self.assertEqual(self.login(email=f'other{i}@example.com').status_code, 400)
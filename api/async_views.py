@@ -0,0 +1,169 @@
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views import View
+from rest_framework import exceptions
+from rest_framework.request import Request
+
+from api.mixins import USE_PAGINATION, USE_CURSOR, STREAM_FORMAT, NDJSON, NDJSON_MEDIA_TYPE
+from api.renderers import FastJSONRenderer
+from api.throttling import get_throttle_settings
+from api.views import ProductViewSet, CategoryViewSet, ProductTagsViewSet
+
+NOT_FILTER_PARAMS = {USE_PAGINATION, USE_CURSOR, STREAM_FORMAT}
+
+
+class AsyncReadView(View):
+    """
+    Async-native ``list`` and ``retrieve`` of a DRF viewset.
+
+    The queryset, filters, pagination and serializers are taken from
+    ``viewset_class``; rows are read with ``aiterator``/``aget``, so under ASGI
+    the request never waits for the sync thread as a whole. Authentication and
+    permission checks with the classes the viewset has for the action, filtering
+    by query params (whose validation may query the database) and the cursor
+    pagination still run through ``sync_to_async``. The throttles of the viewset
+    are applied too; its response cache is not, every response is built afresh.
+    """
+    viewset_class = None
+    http_method_names = ['get', 'head', 'options']
+    chunk_size = 500
+    renderer = FastJSONRenderer()
+
+    def get_viewset(self, request, action):
+        viewset = self.viewset_class(
+            request=request, action=action, action_map={'get': action}, format_kwarg=None, args=self.args,
+            kwargs=self.kwargs,
+        )
+        viewset.request = Request(request, authenticators=viewset.get_authenticators())
+        viewset.headers = {}
+        return viewset
+
+    async def get(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.viewset_class.lookup_url_kwarg or self.viewset_class.lookup_field
+        viewset = self.get_viewset(request, 'retrieve' if lookup_url_kwarg in kwargs else 'list')
+        try:
+            await sync_to_async(self.check_permissions)(viewset)
+            await self.check_throttles(viewset)
+            if viewset.action == 'retrieve':
+                return await self.retrieve(viewset, kwargs[lookup_url_kwarg])
+            return await self.list(viewset)
+        except exceptions.APIException as exc:
+            data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+            status = exc.status_code
+            if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+                # as APIView.handle_exception does
+                authenticate_header = viewset.get_authenticate_header(viewset.request)
+                status = status if authenticate_header else 403
+            response = self.render(data, status=status)
+            if status == 401:
+                response['WWW-Authenticate'] = authenticate_header
+            if getattr(exc, 'wait', None):
+                response['Retry-After'] = str(exc.wait)
+            return response
+
+    @staticmethod
+    def check_permissions(viewset):
+        # resolving the user may query the database
+        viewset.perform_authentication(viewset.request)
+        viewset.check_permissions(viewset.request)
+
+    @staticmethod
+    async def check_throttles(viewset):
+        # a shared cache may be a network round trip, which must not block the event loop
+        if get_throttle_settings()['STORE'] == 'cache':
+            await sync_to_async(viewset.check_throttles)(viewset.request)
+        else:
+            viewset.check_throttles(viewset.request)
+
+    async def list(self, viewset):
+        request = viewset.request
+        queryset = viewset.get_queryset()
+        if set(request.query_params) - NOT_FILTER_PARAMS - self._pagination_params(viewset):
+            queryset = await sync_to_async(viewset.filter_queryset)(queryset)
+
+        if not viewset._break_pagination(request):
+            return self.stream(viewset, queryset)
+
+        paginator = viewset.paginator
+        if paginator is None:
+            page = [obj async for obj in queryset.aiterator(chunk_size=self.chunk_size)]
+        elif hasattr(paginator, 'apaginate_queryset'):
+            page = await paginator.apaginate_queryset(queryset, request, viewset)
+        else:
+            page = await sync_to_async(paginator.paginate_queryset)(queryset, request, viewset)
+
+        data = viewset.get_serializer(page, many=True).data
+        if paginator is not None:
+            data = paginator.get_paginated_response(data).data
+        return self.render(data)
+
+    async def retrieve(self, viewset, lookup):
+        try:
+            instance = await viewset.get_queryset().aget(**{viewset.lookup_field: lookup})
+        except viewset.queryset.model.DoesNotExist:
+            raise exceptions.NotFound(f'No {viewset.queryset.model._meta.object_name} matches the given query.')
+        await sync_to_async(viewset.check_object_permissions)(viewset.request, instance)
+        return self.render(viewset.get_serializer(instance).data)
+
+    def stream(self, viewset, queryset):
+        request = viewset.request
+        ndjson = (
+            request.query_params.get(STREAM_FORMAT) == NDJSON or
+            NDJSON_MEDIA_TYPE in request.META.get('HTTP_ACCEPT', '')
+        )
+        response = StreamingHttpResponse(
+            self._stream(viewset, queryset, ndjson),
+            content_type=NDJSON_MEDIA_TYPE if ndjson else 'application/json',
+        )
+        response['Vary'] = 'Accept'
+        return response
+
+    async def _stream(self, viewset, queryset, ndjson):
+        separator = b'\n' if ndjson else b','
+        first = True
+
+        if not ndjson:
+            yield b'['
+
+        async for chunk in self._chunks(queryset):
+            for item in viewset.get_serializer(chunk, many=True).data:
+                body = self.renderer.render(item)
+                yield body + separator if ndjson else (body if first else separator + body)
+                first = False
+
+        if not ndjson:
+            yield b']'
+
+    async def _chunks(self, queryset):
+        chunk = []
+        async for obj in queryset.aiterator(chunk_size=self.chunk_size):
+            chunk.append(obj)
+            if len(chunk) == self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def render(self, data, status=200):
+        return HttpResponse(self.renderer.render(data), status=status, content_type='application/json')
+
+    @staticmethod
+    def _pagination_params(viewset):
+        return {
+            getattr(pagination_class, name)
+            for pagination_class in (viewset.pagination_class, viewset.cursor_pagination_class)
+            for name in ('page_query_param', 'page_size_query_param', 'cursor_query_param')
+            if getattr(pagination_class, name, None)
+        }
+
+
+class AsyncProductView(AsyncReadView):
+    viewset_class = ProductViewSet
+
+
+class AsyncCategoryView(AsyncReadView):
+    viewset_class = CategoryViewSet
+
+
+class AsyncTagView(AsyncReadView):
+    viewset_class = ProductTagsViewSet
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 
 from account.services import User
+from api.metrics import MeasuredSerializerMixin
 
 
 class LoginSerializer(serializers.Serializer):
@@ -9,7 +10,7 @@ class LoginSerializer(serializers.Serializer):
     password = serializers.CharField()
 
 
-class ReadUserSerializer(serializers.ModelSerializer):
+class ReadUserSerializer(MeasuredSerializerMixin, serializers.ModelSerializer):
 
     class Meta:
         model = User
@@ -1,22 +1,41 @@
-from django.contrib.auth import authenticate
+from django.db import IntegrityError
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.authtoken.models import Token
 
+from account.services import User, authenticate_by_email
 from api.auth.serializers import LoginSerializer, ReadUserSerializer
+from api.throttling import LoginRateThrottle, CostRateThrottle
+
+
+def get_or_create_token(user):
+    # The token comes with the user from select_related, a query is only needed on the first login.
+    try:
+        return user.auth_token
+    except Token.DoesNotExist:
+        pass
+    try:
+        return Token.objects.create(user=user)
+    except IntegrityError:
+        return Token.objects.get(user=user)
 
 
 class LoginApiView(APIView):
+    authentication_classes = []
+    throttle_classes = [LoginRateThrottle, CostRateThrottle]
+    throttle_cost_classes = {'post': 'login'}
 
     def post(self, request, *args, **kwargs):
         serializer = LoginSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         email, password = serializer.validated_data.get('email'), serializer.validated_data.get('password')
-        user = authenticate(email=email, password=password)
+        user = authenticate_by_email(
+            email, password, queryset=User.objects.select_related('auth_token'), request=request,
+        )
 
         if user:
-            token, created = Token.objects.get_or_create(user=user)
+            token = get_or_create_token(user)
             read_serializer = ReadUserSerializer(user, context={'request': request})
 
             data = {
@@ -0,0 +1,84 @@
+import copy
+import hashlib
+
+from django.conf import settings
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from utils.cache import LocalTTLCache, get_cache
+
+TOKEN_CACHE_KEY = 'auth-token:{}'
+
+
+def _settings():
+    return {
+        'MAX_SIZE': 10000,
+        'TTL': 60,
+        'CACHE_ALIAS': None,
+        **getattr(settings, 'TOKEN_AUTH_CACHE', {}),
+    }
+
+
+# sized by _local_cache on every use, so TOKEN_AUTH_CACHE can change after import
+local_token_cache = LocalTTLCache()
+
+
+def _local_cache(config):
+    local_token_cache.max_size, local_token_cache.ttl = config['MAX_SIZE'], config['TTL']
+    return local_token_cache
+
+
+def _hash(key):
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def _shared_cache(config):
+    alias = config['CACHE_ALIAS']
+    return get_cache(alias) if alias else None
+
+
+def invalidate_token(key):
+    hashed = _hash(key)
+    local_token_cache.delete(hashed)
+    shared = _shared_cache(_settings())
+    if shared is not None:
+        shared.delete(TOKEN_CACHE_KEY.format(hashed))
+
+
+def invalidate_user_tokens(user_id):
+    local_token_cache.delete_where(lambda entry: entry[0].pk == user_id)
+    shared = _shared_cache(_settings())
+    if shared is not None:
+        keys = Token.objects.filter(user_id=user_id).values_list('key', flat=True)
+        shared.delete_many([TOKEN_CACHE_KEY.format(_hash(key)) for key in keys])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    ``TokenAuthentication`` that remembers resolved tokens in an in-process LRU
+    with a TTL, or in the Django cache named in ``TOKEN_AUTH_CACHE['CACHE_ALIAS']``
+    when it is set. Entries are dropped when the token is deleted or its user is
+    saved or deleted (see ``account.signals``).
+
+    The in-process LRU is only used without a shared cache: the invalidation
+    runs in the process that changed the user, the LRUs of the other workers
+    would go on authenticating a deactivated user until the TTL runs out.
+    """
+
+    def authenticate_credentials(self, key):
+        config = _settings()
+        hashed = _hash(key)
+        shared = _shared_cache(config)
+        if shared is None:
+            cache, cache_key = _local_cache(config), hashed
+        else:
+            cache, cache_key = shared, TOKEN_CACHE_KEY.format(hashed)
+
+        entry = cache.get(cache_key)
+        if entry is None:
+            entry = super().authenticate_credentials(key)
+            cache.set(cache_key, entry, config['TTL'])
+
+        user, token = entry
+        # Every request gets its own copy, a view may modify request.user.
+        return copy.copy(user), token
@@ -0,0 +1,55 @@
+from django.db import transaction, router
+from django.db.models import PROTECT, RESTRICT
+from django.db.models.deletion import ProtectedError, RestrictedError
+
+PROTECTING = (PROTECT, RESTRICT)
+
+
+def find_protected_ids(model, ids, using=None):
+    """
+    Returns the subset of ``ids`` that another row points at through a PROTECT or
+    RESTRICT foreign key, with one query per such relation.
+    """
+    protected = set()
+    for relation in model._meta.related_objects:
+        if relation.on_delete not in PROTECTING or relation.many_to_many:
+            continue
+        field = relation.field
+        protected.update(
+            relation.related_model._base_manager.using(using)
+            .filter(**{f'{field.name}__in': ids})
+            .values_list(field.attname, flat=True)
+            .distinct()
+        )
+    return protected
+
+
+def bulk_delete(queryset, chunk_size=500):
+    """
+    Deletes every row of ``queryset`` that is not protected and returns the pks that
+    were kept. Rows are deleted chunk by chunk with set-based cascades inside one
+    transaction; a chunk that still hits a protected row deeper in the cascade is
+    retried row by row.
+    """
+    model = queryset.model
+    using = router.db_for_write(model)
+    ids = list(queryset.order_by().values_list('pk', flat=True))
+    protected = find_protected_ids(model, ids, using)
+    deletable = [pk for pk in ids if pk not in protected]
+    not_deleted = [pk for pk in ids if pk in protected]
+
+    with transaction.atomic(using=using):
+        for start in range(0, len(deletable), chunk_size):
+            chunk = deletable[start:start + chunk_size]
+            try:
+                with transaction.atomic(using=using):
+                    model._base_manager.using(using).filter(pk__in=chunk).delete()
+            except (ProtectedError, RestrictedError):
+                for item in model._base_manager.using(using).filter(pk__in=chunk):
+                    try:
+                        with transaction.atomic(using=using):
+                            item.delete()
+                    except (ProtectedError, RestrictedError):
+                        not_deleted.append(item.pk)
+
+    return not_deleted
@@ -0,0 +1,101 @@
+from decimal import Decimal
+
+from django.db.models import Count
+from django_filters.utils import translate_validation
+from rest_framework.response import Response
+
+from api.filters import ProductFilter
+from store import facets
+from store.models import Product, Category, Tag
+
+CENT = Decimal('0.01')
+# filters the counters have no dimension for; any of them falls back to a GROUP BY query
+UNCOUNTED_PARAMS = ('user', 'rating', 'search')
+
+
+def counter_lookups(params, cleaned_data, group):
+    """
+    ``ProductFacetCount`` lookups equivalent to the ``ProductFilter`` data, or
+    ``None`` when the filters cannot be answered from the counters.
+    """
+    if any(params.get(name) for name in UNCOUNTED_PARAMS):
+        return None
+
+    lookups = {}
+    if cleaned_data.get('categories'):
+        lookups['category_id__in'] = [category.pk for category in cleaned_data['categories']]
+    if cleaned_data.get('receive_types'):
+        lookups['receive_type__in'] = cleaned_data['receive_types']
+    if cleaned_data.get('is_published') is not None:
+        lookups['is_published'] = cleaned_data['is_published']
+
+    tags = cleaned_data.get('tags')
+    if tags:
+        # a product is counted once per tag, so only a single tag keeps the counts distinct
+        if len(tags) > 1 or group == 'tag_id':
+            return None
+        lookups['tag_id'] = tags[0].pk
+
+    bounds = facets.get_price_buckets()
+    min_price, max_price = cleaned_data.get('min_price'), cleaned_data.get('max_price')
+    if min_price is not None:
+        if min_price not in bounds:
+            return None
+        lookups['price_bucket__gte'] = bounds.index(min_price)
+    if max_price is not None:
+        # ``price <= max_price`` matches whole buckets only right below a bound
+        if max_price + CENT not in bounds:
+            return None
+        lookups['price_bucket__lt'] = bounds.index(max_price + CENT)
+    return lookups
+
+
+def query_counts(queryset, group):
+    queryset = queryset.order_by()
+    if group == 'price_bucket':
+        queryset = queryset.annotate(price_bucket=facets.price_bucket_expression())
+    elif group == 'tag_id':
+        group = 'tags'
+        queryset = queryset.filter(tags__isnull=False)
+    rows = queryset.values_list(group).annotate(count=Count('id', distinct=True))
+    return {value: count for value, count in rows if count}
+
+
+def facet_response(request, view, group):
+    """
+    ``{value: count}`` of the products that ``view`` would list for the
+    request, grouped by ``group``. Answered from the counters where possible,
+    the ``X-Facets`` header tells which way was taken.
+    """
+    filterset = ProductFilter(request.query_params, queryset=Product.objects.all(), request=request)
+    if not filterset.is_valid():
+        raise translate_validation(filterset.errors)
+
+    lookups = counter_lookups(request.query_params, filterset.form.cleaned_data, group)
+    if lookups is not None:
+        counts, source = facets.facet_counts(group, **lookups), 'counters'
+    else:
+        counts, source = query_counts(view.filter_queryset(Product.objects.all()), group), 'query'
+
+    if group == 'price_bucket':
+        data = price_bucket_data(counts)
+    else:
+        model = Category if group == 'category_id' else Tag
+        data = [
+            {'id': obj.pk, 'name': obj.name, 'count': counts[obj.pk]}
+            for obj in model.objects.filter(pk__in=counts).order_by('name', 'pk')
+        ]
+    return Response(data, headers={'X-Facets': source})
+
+
+def price_bucket_data(counts):
+    bounds = facets.get_price_buckets()
+    return [
+        {
+            'bucket': index,
+            'min': f'{bound:.2f}',
+            'max': f'{bounds[index + 1] - CENT:.2f}' if index + 1 < len(bounds) else None,
+            'count': counts.get(index, 0),
+        }
+        for index, bound in enumerate(bounds)
+    ]
@@ -0,0 +1,199 @@
+import datetime
+import decimal
+from functools import partial
+from operator import attrgetter
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models.manager import BaseManager
+from django.db.models.query_utils import DeferredAttribute
+from django.db.models.fields.related_descriptors import ManyToManyDescriptor, ReverseManyToOneDescriptor
+from rest_framework import ISO_8601, serializers
+from rest_framework.fields import SkipField, get_attribute
+from rest_framework.settings import api_settings
+from rest_framework.relations import PKOnlyObject, PrimaryKeyRelatedField, ManyRelatedField
+
+SKIP = object()
+
+# to_representation of these fields is exactly the builtin
+BUILTIN_REPRESENTATIONS = {
+    serializers.CharField.to_representation: str,
+    serializers.IntegerField.to_representation: int,
+    serializers.ReadOnlyField.to_representation: None,
+}
+# attributes whose class-level descriptor never calls anything nor raises ObjectDoesNotExist
+PLAIN_DESCRIPTORS = (DeferredAttribute, ManyToManyDescriptor, ReverseManyToOneDescriptor, property)
+
+
+def compile_serializer(serializer):
+    """
+    Compiles the readable fields of a bound ``serializer`` into one function
+    ``instance -> dict`` that returns exactly what ``serializer.to_representation``
+    would. Nested serializers are compiled too; fields with no fast path keep
+    their own ``get_attribute``/``to_representation``.
+    """
+    representation = _own_representation(type(serializer))
+    if representation is not serializers.Serializer.to_representation:
+        return partial(representation, serializer)
+
+    model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+    extractors, skippable = [], False
+    for field in serializer._readable_fields:
+        extract, can_skip = _compile_field(field, model)
+        extractors.append((field.field_name, extract))
+        skippable |= can_skip
+
+    def to_representation(instance):
+        ret = {name: extract(instance) for name, extract in extractors}
+        if skippable:
+            ret = {name: value for name, value in ret.items() if value is not SKIP}
+        return ret
+
+    return to_representation
+
+
+def _own_representation(serializer_class):
+    for klass in serializer_class.__mro__:
+        if klass is not CompiledSerializerMixin and 'to_representation' in vars(klass):
+            return klass.to_representation
+
+
+def _compile_field(field, model):
+    getter = _compile_getter(field, model)
+    if getter is None:
+        return _generic(field), True
+
+    convert = _compile_converter(field)
+    if convert is None:
+        return getter, False
+
+    def extract(instance):
+        value = getter(instance)
+        return None if value is None else convert(value)
+
+    return extract, False
+
+
+def _generic(field):
+    def extract(instance):
+        try:
+            attribute = field.get_attribute(instance)
+        except SkipField:
+            return SKIP
+        check_for_none = attribute.pk if isinstance(attribute, PKOnlyObject) else attribute
+        return None if check_for_none is None else field.to_representation(attribute)
+
+    return extract
+
+
+def _compile_getter(field, model):
+    if field.source == '*':
+        return lambda instance: instance
+    if model is None or len(field.source_attrs) != 1 or isinstance(field, ManyRelatedField):
+        return None
+
+    name = field.source_attrs[0]
+    if isinstance(field, PrimaryKeyRelatedField):
+        if field.pk_field is not None:
+            return None
+        try:
+            return attrgetter(model._meta.get_field(name).attname)
+        except (FieldDoesNotExist, AttributeError):
+            return None
+
+    if isinstance(field, serializers.RelatedField):
+        return None
+    if isinstance(getattr(model, name, None), PLAIN_DESCRIPTORS):
+        return attrgetter(name)
+    return lambda instance: get_attribute(instance, field.source_attrs)
+
+
+def _compile_converter(field):
+    if isinstance(field, PrimaryKeyRelatedField):
+        return None
+
+    if isinstance(field, serializers.ListSerializer):
+        if type(field).to_representation is not serializers.ListSerializer.to_representation:
+            return field.to_representation
+        child = compile_serializer(field.child)
+
+        def convert_many(data):
+            iterable = data.all() if isinstance(data, BaseManager) else data
+            return [child(item) for item in iterable]
+
+        return convert_many
+
+    if isinstance(field, serializers.BaseSerializer):
+        return compile_serializer(field)
+
+    representation = type(field).to_representation
+    if representation is serializers.DateTimeField.to_representation:
+        return _compile_datetime(field)
+    if representation is serializers.DecimalField.to_representation:
+        return _compile_decimal(field)
+    if representation in BUILTIN_REPRESENTATIONS:
+        return BUILTIN_REPRESENTATIONS[representation]
+    return field.to_representation
+
+
+def _compile_datetime(field):
+    """
+    ``DateTimeField.to_representation`` with the field timezone resolved once
+    instead of per value; anything but an aware datetime goes the usual way.
+    """
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+    if (
+        type(field).enforce_timezone is not serializers.DateTimeField.enforce_timezone or
+        field_timezone is None or output_format is None or output_format.lower() != ISO_8601
+    ):
+        return field.to_representation
+
+    def convert(value):
+        if not isinstance(value, datetime.datetime) or value.utcoffset() is None:
+            return field.to_representation(value)
+        value = value.astimezone(field_timezone).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+    return convert
+
+
+def _compile_decimal(field):
+    """
+    ``DecimalField.to_representation`` with the quantum and the context built
+    once instead of per value, straight from ``Decimal`` to the string.
+    """
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if (
+        type(field).quantize is not serializers.DecimalField.quantize or field.decimal_places is None or
+        not coerce_to_string or field.localize or field.normalize_output
+    ):
+        return field.to_representation
+
+    quantum = decimal.Decimal('.1') ** field.decimal_places
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+    rounding = field.rounding
+
+    def convert(value):
+        if not isinstance(value, decimal.Decimal):
+            return field.to_representation(value)
+        return '{:f}'.format(value.quantize(quantum, rounding=rounding, context=context))
+
+    return convert
+
+
+class CompiledSerializerMixin:
+    """
+    Read-only fast path for a serializer: ``to_representation`` runs a function
+    compiled once per serializer instance from its field set (see
+    ``compile_serializer``) instead of dispatching field by field for every row.
+    The output is the same; validation and saving are left untouched.
+    """
+
+    def to_representation(self, instance):
+        try:
+            compiled = self._compiled
+        except AttributeError:
+            compiled = self._compiled = compile_serializer(self)
+        return compiled(instance)
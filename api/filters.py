@@ -1,6 +1,8 @@
 from django_filters import rest_framework as filterset
+from rest_framework.filters import SearchFilter
 
 from store.models import Product, Category
+from store.search import get_search_backend
 
 
 class ProductFilter(filterset.FilterSet):
@@ -17,4 +19,16 @@ class ProductFilter(filterset.FilterSet):
             'user',
             'is_published',
             'rating',
-        ]
\ No newline at end of file
+        ]
+
+
+class FullTextSearchFilter(SearchFilter):
+    """
+    Ranked search through the configured product search backend.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        if not query.strip():
+            return queryset
+        return get_search_backend().search(queryset, query)
@@ -0,0 +1,232 @@
+import csv
+import io
+import json
+import posixpath
+from itertools import islice
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from rest_framework import serializers
+
+from api.read_models import read_model_enabled, schedule_refresh
+from store.models import Product, ProductAttribute, ProductImage, Category, Tag
+from store import facets
+from store.processing import RAW_UPLOAD_TO
+from store.search import get_search_backend
+from utils.cache import bump_version
+
+CSV = 'csv'
+NDJSON = 'ndjson'
+FORMATS = (CSV, NDJSON)
+LIST_SEPARATOR = '|'
+ATTRIBUTE_SEPARATOR = '='
+IMAGE_PREFIX = ProductImage._meta.get_field('image').upload_to
+# unprocessed uploads and generated sizes live under the same prefix but are never product images
+EXCLUDED_IMAGE_PREFIXES = (RAW_UPLOAD_TO, ProductImage.VARIANTS_UPLOAD_TO)
+
+
+class ImportAttributeSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = ProductAttribute
+        fields = ('name', 'value')
+
+
+class ImportProductSerializer(serializers.ModelSerializer):
+    category = serializers.CharField(help_text='ID или название категории')
+    tags = serializers.ListField(child=serializers.CharField(max_length=255), required=False)
+    attributes = ImportAttributeSerializer(many=True, required=False)
+    images = serializers.ListField(child=serializers.CharField(max_length=100), required=False)
+
+    class Meta:
+        model = Product
+        fields = (
+            'name',
+            'description',
+            'content',
+            'category',
+            'price',
+            'receive_type',
+            'rating',
+            'is_published',
+            'tags',
+            'attributes',
+            'images',
+        )
+
+    def validate_images(self, value):
+        # only files that were uploaded as product images, never any other media file
+        for path in value:
+            if (posixpath.normpath(path) != path or not path.startswith(IMAGE_PREFIX)
+                    or path.startswith(EXCLUDED_IMAGE_PREFIXES) or not default_storage.exists(path)):
+                raise serializers.ValidationError(f'Изображение не найдено: {path}.')
+        if len(set(value)) != len(value):
+            raise serializers.ValidationError('Изображения повторяются.')
+        return value
+
+
+def _split(value):
+    return [item.strip() for item in value.split(LIST_SEPARATOR) if item.strip()]
+
+
+def parse_csv(stream):
+    """
+    One product per row. ``tags`` and ``images`` are ``|``-separated,
+    ``attributes`` are ``name=value`` pairs separated by ``|``.
+    """
+    for line, row in enumerate(csv.DictReader(stream), start=2):
+        row = {key: value for key, value in row.items() if key and value not in (None, '')}
+        if 'tags' in row:
+            row['tags'] = _split(row['tags'])
+        if 'images' in row:
+            row['images'] = _split(row['images'])
+        if 'attributes' in row:
+            row['attributes'] = [
+                dict(zip(('name', 'value'), item.split(ATTRIBUTE_SEPARATOR, 1)))
+                for item in _split(row['attributes'])
+            ]
+        yield line, row
+
+
+def parse_ndjson(stream):
+    for line, raw in enumerate(stream, start=1):
+        if not raw.strip():
+            continue
+        try:
+            row = json.loads(raw)
+        except ValueError as e:
+            row = e
+        yield line, row
+
+
+def parse_rows(stream, format):
+    if isinstance(stream.read(0), bytes):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    return parse_csv(stream) if format == CSV else parse_ndjson(stream)
+
+
+def guess_format(filename, default=NDJSON):
+    extension = str(filename).rsplit('.', 1)[-1].lower()
+    if extension == CSV:
+        return CSV
+    if extension in (NDJSON, 'jsonl'):
+        return NDJSON
+    return default
+
+
+class ProductImporter:
+    """
+    Validates rows batch by batch and writes every valid row of a batch with
+    ``bulk_create`` inside one transaction. Invalid rows are reported, not written.
+    Images are paths of files already uploaded under ``product_images/`` that
+    no product uses yet; each file can be taken by one imported row only, because
+    deleting a product deletes its image files.
+    """
+    batch_size = 1000
+
+    def __init__(self, user, batch_size=None):
+        self.user = user
+        self.batch_size = batch_size or self.batch_size
+        self.created = 0
+        self.errors = []
+        self.images = set()
+
+    def run(self, rows):
+        rows = iter(rows)
+        while batch := list(islice(rows, self.batch_size)):
+            self.import_batch(batch)
+        return {'created': self.created, 'errors': self.errors}
+
+    def import_batch(self, batch):
+        serializer = ImportProductSerializer()
+        errors, valid = [], []
+        for line, row in batch:
+            if not isinstance(row, dict):
+                errors.append({'row': line, 'errors': {'non_field_errors': ['Некорректная строка.']}})
+                continue
+            try:
+                valid.append((line, serializer.run_validation(row)))
+            except serializers.ValidationError as e:
+                errors.append({'row': line, 'errors': e.detail})
+
+        categories = self._resolve_categories([data['category'] for _, data in valid])
+        used_images = self._used_images({path for _, data in valid for path in data.get('images', [])})
+        rows = []
+        for line, data in valid:
+            category = categories.get(data['category'])
+            if category is None:
+                errors.append({'row': line, 'errors': {'category': ['Категория не найдена.']}})
+                continue
+            used = (used_images | self.images).intersection(data.get('images', []))
+            if used:
+                errors.append({'row': line, 'errors': {'images': [f'Изображение уже используется: {min(used)}.']}})
+                continue
+            self.images.update(data.get('images', []))
+            data['category'] = category
+            rows.append(data)
+        self.errors += sorted(errors, key=lambda error: error['row'])
+
+        if rows:
+            with transaction.atomic():
+                self._write(rows)
+            self.created += len(rows)
+
+    def _resolve_categories(self, refs):
+        ids = {ref for ref in refs if ref.isdigit()}
+        categories = Category.objects.filter(Q(name__in=set(refs)) | Q(id__in=ids)).only('id', 'name')
+        resolved = {}
+        for category in categories:
+            resolved[category.name] = category
+            resolved.setdefault(str(category.id), category)
+        return resolved
+
+    def _used_images(self, paths):
+        """The ``paths`` that already belong to some product."""
+        if not paths:
+            return set()
+        return set(ProductImage.objects.filter(image__in=paths).values_list('image', flat=True))
+
+    def _resolve_tags(self, names):
+        tags = {}
+        for tag in Tag.objects.filter(name__in=names).order_by('id'):
+            tags.setdefault(tag.name, tag)
+        missing = [Tag(name=name) for name in names if name not in tags]
+        for tag in Tag.objects.bulk_create(missing):
+            tags[tag.name] = tag
+        return tags
+
+    def _write(self, rows):
+        products = Product.objects.bulk_create([
+            Product(
+                user=self.user,
+                **{key: value for key, value in data.items() if key not in ('tags', 'attributes', 'images')}
+            )
+            for data in rows
+        ])
+        tags = self._resolve_tags({name for data in rows for name in data.get('tags', [])})
+
+        Through = Product.tags.through
+        Through.objects.bulk_create([
+            Through(product_id=product.id, tag_id=tags[name].id)
+            for product, data in zip(products, rows)
+            for name in dict.fromkeys(data.get('tags', []))
+        ])
+        ProductAttribute.objects.bulk_create([
+            ProductAttribute(product=product, **attribute)
+            for product, data in zip(products, rows)
+            for attribute in data.get('attributes', [])
+        ])
+        ProductImage.objects.bulk_create([
+            ProductImage(product=product, image=image)
+            for product, data in zip(products, rows)
+            for image in data.get('images', [])
+        ])
+
+        # bulk_create sends no post_save, so do what the store signals would have done.
+        get_search_backend().index(products)
+        facets.count_products([product.pk for product in products])
+        if read_model_enabled():
+            schedule_refresh([product.pk for product in products])
+        for model in (Product, ProductAttribute, ProductImage, Tag):
+            bump_version(model)
@@ -0,0 +1,251 @@
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, Http404
+from django.utils.crypto import constant_time_compare
+from rest_framework import serializers
+
+from utils.metrics import MetricsRegistry, render_prometheus
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_current = ContextVar('request_metrics', default=None)
+
+
+def get_metrics_settings():
+    return {
+        'ENABLED': True,
+        'DIRECTORY': None,
+        'FLUSH_INTERVAL': 5,
+        'ALLOWED_IPS': ('127.0.0.1', '::1'),
+        'TOKEN': None,
+        **getattr(settings, 'METRICS', {}),
+    }
+
+
+@lru_cache(maxsize=None)
+def get_registry():
+    options = get_metrics_settings()
+    return MetricsRegistry(options['DIRECTORY'], options['FLUSH_INTERVAL'])
+
+
+class RequestMetrics:
+
+    def __init__(self):
+        self.view = 'unresolved'
+        self.queries = 0
+        self.durations = {'sql': 0.0, 'serialize': 0.0, 'render': 0.0}
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.durations['sql'] += time.perf_counter() - start
+            self.queries += 1
+
+
+@contextmanager
+def measure(name):
+    """Adds the time of the block to the ``name`` phase of the current request, if there is one."""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.durations[name] += time.perf_counter() - start
+
+
+def view_name(view_func, method):
+    """``ProductViewSet.list`` for a viewset action, the class or function name otherwise."""
+    cls = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+    if cls is None:
+        return getattr(view_func, '__qualname__', 'unknown')
+    actions = getattr(view_func, 'actions', None)
+    if actions:
+        return f'{cls.__name__}.{actions.get(method.lower(), method.lower())}'
+    return cls.__name__
+
+
+class MetricsMiddleware:
+    """
+    Records the SQL queries, serializer and render time and the response size
+    of every request per view and action. They are sent back in a
+    ``Server-Timing`` header and collected into the histograms of ``/metrics``.
+
+    A streamed body is produced after the handler returns: its chunks are
+    measured as they are read and the request is recorded once the body is
+    exhausted or closed, so the histograms include it. The header can only
+    hold the time until the body starts.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = get_metrics_settings()['ENABLED']
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            # first in MIDDLEWARE: a sync-only middleware here would make ASGI adapt the whole chain
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        start = time.perf_counter()
+        with self.measuring(metrics):
+            response = self.get_response(request)
+        return self.finish(metrics, response, start)
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+
+        metrics = RequestMetrics()
+        start = time.perf_counter()
+        token = _current.set(metrics)
+        try:
+            # sync views run their queries in the thread-sensitive thread of the request, not in this one
+            queries = await sync_to_async(self.counting_queries)(metrics)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(queries.close)()
+        finally:
+            _current.reset(token)
+        return self.finish(metrics, response, start)
+
+    def finish(self, metrics, response, start):
+        total = time.perf_counter() - start
+        response['Server-Timing'] = ', '.join((
+            f'sql;dur={metrics.durations["sql"] * 1000:.2f};desc="{metrics.queries} queries"',
+            f'serialize;dur={metrics.durations["serialize"] * 1000:.2f}',
+            f'render;dur={metrics.durations["render"] * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ))
+        if not response.streaming:
+            self.record(metrics, response, total, len(response.content))
+        elif response.is_async:
+            response.streaming_content = self.measure_async_stream(response.streaming_content, response, metrics, start)
+        else:
+            response.streaming_content = self.measure_stream(response.streaming_content, response, metrics, start)
+        return response
+
+    @classmethod
+    @contextmanager
+    def measuring(cls, metrics):
+        token = _current.set(metrics)
+        try:
+            with cls.counting_queries(metrics):
+                yield
+        finally:
+            _current.reset(token)
+
+    @staticmethod
+    def counting_queries(metrics):
+        """Counts the queries of this thread's connections until the returned stack is closed."""
+        stack = ExitStack()
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(metrics.execute_wrapper))
+        return stack
+
+    def measure_stream(self, content, response, metrics, start):
+        chunks, size = iter(content), 0
+        try:
+            while True:
+                with self.measuring(metrics):
+                    chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                size += len(chunk)
+                yield chunk
+        finally:
+            self.record(metrics, response, time.perf_counter() - start, size)
+
+    async def measure_async_stream(self, content, response, metrics, start):
+        # the queries of the async ORM run in a thread of their own and are not counted
+        chunks, size = aiter(content), 0
+        try:
+            while True:
+                with self.measuring(metrics):
+                    chunk = await anext(chunks, None)
+                if chunk is None:
+                    break
+                size += len(chunk)
+                yield chunk
+        finally:
+            self.record(metrics, response, time.perf_counter() - start, size)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.view = view_name(view_func, request.method)
+
+    @staticmethod
+    def record(metrics, response, total, size):
+        registry, labels = get_registry(), (metrics.view,)
+        registry.observe('http_request_duration_seconds', labels, total)
+        registry.observe('http_request_sql_queries', labels, metrics.queries)
+        registry.observe('http_request_sql_duration_seconds', labels, metrics.durations['sql'])
+        registry.observe('http_request_serialize_duration_seconds', labels, metrics.durations['serialize'])
+        registry.observe('http_request_render_duration_seconds', labels, metrics.durations['render'])
+        registry.observe('http_response_size_bytes', labels, size)
+        registry.incr('http_responses_total', (metrics.view, str(response.status_code)))
+        registry.maybe_flush()
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint with the totals of every worker sharing
+    ``METRICS['DIRECTORY']``. With ``METRICS['TOKEN']`` the scraper must send
+    it as a bearer token; otherwise only ``ALLOWED_IPS`` may scrape, which
+    behind a reverse proxy on the same host lets every client through.
+    """
+    options = get_metrics_settings()
+    if options['TOKEN']:
+        allowed = constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {options["TOKEN"]}')
+    else:
+        allowed = request.META.get('REMOTE_ADDR') in options['ALLOWED_IPS']
+    if not allowed:
+        raise Http404
+    registry = get_registry()
+    return HttpResponse(render_prometheus(registry.collect()), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+class MeasuredListSerializer(serializers.ListSerializer):
+
+    @property
+    def data(self):
+        with measure('serialize'):
+            return super().data
+
+
+class MeasuredSerializerMixin:
+    """Counts the time spent producing ``data`` as the serialize phase of the request."""
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # many=True builds Meta.list_serializer_class, the root whose data is asked for then
+        meta = getattr(cls, 'Meta', None)
+        if meta is None:
+            cls.Meta = type('Meta', (), {'list_serializer_class': MeasuredListSerializer})
+        elif not hasattr(meta, 'list_serializer_class'):
+            meta.list_serializer_class = MeasuredListSerializer
+
+    @property
+    def data(self):
+        with measure('serialize'):
+            return super().data
@@ -1,6 +1,17 @@
+import hashlib
+import json
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save
+from django.http import StreamingHttpResponse, HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
 from rest_framework.generics import GenericAPIView
 import django
 from rest_framework import serializers
+from rest_framework import exceptions
 from rest_framework import status
 from rest_framework.decorators import action, permission_classes
 from rest_framework.mixins import RetrieveModelMixin, ListModelMixin
@@ -8,8 +19,19 @@ from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet, GenericViewSet
 
 from account.services import User
+from api.deletion import bulk_delete
+from api.paginations import KeysetPagination
+from api.renderers import FastJSONRenderer
+from utils.cache import get_cache, get_versions, incr_stat
+from utils.databases import pin_replica, pinned_replica, unpin_replica
 
 USE_PAGINATION = 'use_pagination'
+USE_CURSOR = 'use_cursor'
+STREAM_FORMAT = 'stream_format'
+FIELDS = 'fields'
+EXPAND = 'expand'
+NDJSON = 'ndjson'
+NDJSON_MEDIA_TYPE = 'application/x-ndjson'
 
 
 def make_bool(val):
@@ -35,10 +57,23 @@ class PermissionByActionMixin:
         _permission_classes = self.permission_classes_by_action.get(self.action, self.permission_classes)
         if self.action == 'partial_update' or self.action == 'update_partial':
             _permission_classes = self.permission_classes_by_action.get('update', self.permission_classes)
+        if self.action == 'multiple_update' and self.action not in self.permission_classes_by_action:
+            _permission_classes = self.permission_classes_by_action.get('update', self.permission_classes)
 
         return [permission() for permission in _permission_classes]
 
 
+class AuthenticationByActionMixin:
+    authentication_classes_by_action = {}
+
+    def get_authenticators(self):
+        # Authenticators are built before ``self.action`` is set, so resolve the action from the method.
+        action_map = getattr(self, 'action_map', None) or {}
+        action = action_map.get(self.request.method.lower())
+        _authentication_classes = self.authentication_classes_by_action.get(action, self.authentication_classes)
+        return [authentication() for authentication in _authentication_classes]
+
+
 class PermissionByMethod:
     permission_classes_by_method = {}
 
@@ -48,19 +83,285 @@ class PermissionByMethod:
         return [permission() for permission in _permission_classes]
 
 
+class QuerySetByActionMixin:
+    select_related_by_action = {}
+    prefetch_related_by_action = {}
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        action = self.action
+        if action == 'partial_update' or action == 'update_partial':
+            action = 'update'
+
+        select_related, prefetch_related = self.get_related_lookups(action)
+        if select_related:
+            qs = qs.select_related(*select_related)
+        if prefetch_related:
+            qs = qs.prefetch_related(*prefetch_related)
+
+        return qs
+
+    def get_related_lookups(self, action):
+        return self.select_related_by_action.get(action), self.prefetch_related_by_action.get(action)
+
+
+class SparseFieldsMixin:
+    """
+    ``?fields=`` limits the output of ``sparse_fields_actions`` to the listed
+    fields. Relations among them are given as primary keys unless listed in
+    ``?expand=``; without ``fields`` the output stays whole, relations nested.
+
+    The queryset follows the output: relations that are not returned are not
+    prefetched, those that are not expanded are not joined, and the
+    ``deferrable_fields`` columns that are not returned are deferred. The
+    serializer has to come with ``SparseFieldsSerializerMixin``.
+    """
+    sparse_fields_actions = ('list', 'retrieve')
+    deferrable_fields = ()
+
+    def get_sparse_fields(self):
+        """``(fields, expand)`` of the request, ``None`` for the whole output."""
+        try:
+            return self._sparse_fields
+        except AttributeError:
+            pass
+
+        self._sparse_fields = None
+        serializer_class = self.get_serializer_class()
+        params = self.request.query_params
+        if (
+            self.action not in self.sparse_fields_actions or
+            not hasattr(serializer_class, 'get_sparse_field_names') or
+            FIELDS not in params
+        ):
+            return None
+
+        names, expandable = serializer_class.get_sparse_field_names()
+        fields, expand = (
+            [name.strip() for value in params.getlist(param) for name in value.split(',') if name.strip()]
+            for param in (FIELDS, EXPAND)
+        )
+        errors = {}
+        if set(fields) - set(names):
+            errors[FIELDS] = [f'Неизвестные поля: {", ".join(sorted(set(fields) - set(names)))}.']
+        if set(expand) - set(expandable):
+            errors[EXPAND] = [
+                f'Нельзя раскрыть: {", ".join(sorted(set(expand) - set(expandable)))}. '
+                f'Доступны: {", ".join(expandable) or "-"}.'
+            ]
+        if errors:
+            raise exceptions.ValidationError(errors)
+        self._sparse_fields = tuple(fields), frozenset(expand)
+        return self._sparse_fields
+
+    def get_returned_fields(self):
+        sparse = self.get_sparse_fields()
+        if sparse is not None:
+            return set(sparse[0]) | sparse[1]
+        serializer_class = self.get_serializer_class()
+        if hasattr(serializer_class, 'get_sparse_field_names'):
+            return set(serializer_class.get_sparse_field_names()[0])
+        return None
+
+    def get_related_lookups(self, action):
+        select_related, prefetch_related = super().get_related_lookups(action)
+        sparse = self.get_sparse_fields()
+        if sparse is None:
+            return select_related, prefetch_related
+
+        fields, expand = sparse
+        # relations read by a field besides its own, such as the images of Product.image
+        field_lookups = getattr(self.get_serializer_class().Meta, 'field_lookups', {})
+        expanded = set(expand).union(*(field_lookups.get(name, ()) for name in {*fields, *expand}))
+        returned = expanded.union(fields)
+        return (
+            [lookup for lookup in select_related or () if lookup.split('__')[0] in expanded],
+            [lookup for lookup in prefetch_related or () if lookup.split('__')[0] in returned],
+        )
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action not in self.sparse_fields_actions or not self.deferrable_fields:
+            return queryset
+        returned = self.get_returned_fields()
+        if returned is None:
+            return queryset
+        deferred = [name for name in self.deferrable_fields if name not in returned]
+        return queryset.defer(*deferred) if deferred else queryset
+
+    def get_serializer(self, *args, **kwargs):
+        sparse = self.get_sparse_fields() if getattr(self, 'action', None) else None
+        if sparse is not None:
+            kwargs.setdefault('fields', sparse[0])
+            kwargs.setdefault('expand', sparse[1])
+        return super().get_serializer(*args, **kwargs)
+
+
 class PaginationBreakerMixin:
 
     item_to_include = None
+    cursor_pagination_class = KeysetPagination
+    stream_chunk_size = 500
 
     def _break_pagination(self, request):
         use_pagination = make_bool(request.GET.get(USE_PAGINATION, True))
+        use_cursor = make_bool(request.GET.get(USE_CURSOR, False))
         if not use_pagination:
             self.pagination_class = None
+        elif use_cursor and self.cursor_pagination_class is not None:
+            self.pagination_class = self.cursor_pagination_class
+        return use_pagination
 
     def list(self, request, *args, **kwargs):
-        self._break_pagination(request)
+        if not self._break_pagination(request):
+            return self.stream_list(request)
         return super().list(request, *args, **kwargs)
 
+    def stream_list(self, request):
+        queryset = self.filter_queryset(self.get_queryset())
+        ndjson = (
+            request.GET.get(STREAM_FORMAT) == NDJSON or
+            NDJSON_MEDIA_TYPE in request.META.get('HTTP_ACCEPT', '')
+        )
+        content_type = NDJSON_MEDIA_TYPE if ndjson else 'application/json'
+        response = StreamingHttpResponse(self._stream(queryset, ndjson), content_type=content_type)
+        response['Vary'] = 'Accept'
+        return response
+
+    def _stream(self, queryset, ndjson):
+        renderer = FastJSONRenderer()
+        separator = b'\n' if ndjson else b','
+        first = True
+
+        if not ndjson:
+            yield b'['
+
+        iterator = queryset.iterator(chunk_size=self.stream_chunk_size)
+        while chunk := list(islice(iterator, self.stream_chunk_size)):
+            for item in self.get_serializer(chunk, many=True).data:
+                body = renderer.render(item)
+                yield body + separator if ndjson else (body if first else separator + body)
+                first = False
+
+        if not ndjson:
+            yield b']'
+
+
+class ReplicaReadMixin:
+    """
+    Runs the queries of the safe ``replica_actions`` on a ``DATABASE_REPLICAS``
+    alias; authentication still reads the primary. Streamed bodies are produced
+    after the view returns and read the primary as well.
+
+    Requests whose response ``CacheResponseMixin`` will cache read the primary
+    too: a lagging replica would otherwise store stale rows under the key of
+    the current versions, where they outlive the lag. Place this mixin before
+    ``CacheResponseMixin`` so that the key is known here.
+    """
+    replica_actions = ('list', 'retrieve')
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if getattr(self, 'response_cache_key', None):
+            return
+        if self.action in self.replica_actions and request.method in ('GET', 'HEAD', 'OPTIONS'):
+            self._replica_token = pin_replica()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        try:
+            return super().finalize_response(request, response, *args, **kwargs)
+        finally:
+            token = self.__dict__.pop('_replica_token', None)
+            if token is not None:
+                unpin_replica(token)
+
+
+class CacheResponseMixin:
+    """
+    Caches rendered anonymous JSON responses of ``cache_actions``.
+
+    The key holds the normalized query params and the current version of every
+    model in ``cache_models``; store signals bump those versions, so a write
+    makes exactly the dependent entries unreachable. That holds for the
+    workers sharing the ``cache_alias`` cache only, so caching is off unless
+    ``API_CACHE_ENABLED`` says that cache is shared (see the settings). A
+    response read from a replica is never stored, it may predate the versions.
+    """
+    cache_actions = ('list', 'retrieve')
+    cache_models = ()
+    cache_alias = 'default'
+    cache_timeout = None
+
+    def get_response_cache_key(self, request):
+        if not getattr(settings, 'API_CACHE_ENABLED', False):
+            return None
+        if self.action not in self.cache_actions or request.user.is_authenticated:
+            return None
+        if getattr(request.accepted_renderer, 'format', None) != 'json':
+            return None
+
+        params = sorted(
+            (key, value)
+            for key, values in request.query_params.lists()
+            for value in values
+            if value != ''
+        )
+        raw = json.dumps([
+            type(self).__name__,
+            self.action,
+            request.get_host(),
+            request.path,
+            request.accepted_media_type,
+            params,
+            get_versions(self.cache_models, self.cache_alias),
+        ])
+        return f'response:{hashlib.md5(raw.encode()).hexdigest()}'
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.response_cache_key = self.get_response_cache_key(request)
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(request) or super().list(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(request) or super().retrieve(request, *args, **kwargs)
+
+    def get_cached_response(self, request):
+        if not self.response_cache_key:
+            return None
+        cached = get_cache(self.cache_alias).get(self.response_cache_key)
+        if cached is None:
+            return None
+
+        incr_stat('hit', self.cache_alias)
+        etag, content, content_type = cached
+        return self._cache_response(request, HttpResponse(content, content_type=content_type), etag, 'HIT')
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        key = getattr(self, 'response_cache_key', None)
+        if not key or not isinstance(response, Response) or response.status_code != status.HTTP_200_OK:
+            return response
+        if pinned_replica() is not None:
+            return response
+
+        response.render()
+        etag = f'"{hashlib.md5(response.content).hexdigest()}"'
+        timeout = self.cache_timeout or getattr(settings, 'API_CACHE_TIMEOUT', 300)
+        get_cache(self.cache_alias).set(key, (etag, response.content, response['Content-Type']), timeout)
+        incr_stat('miss', self.cache_alias)
+        return self._cache_response(request, response, etag, 'MISS')
+
+    @staticmethod
+    def _cache_response(request, response, etag, state):
+        if_none_match = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+        if etag in if_none_match or '*' in if_none_match:
+            response = HttpResponseNotModified()
+        response['ETag'] = etag
+        response['X-Cache'] = state
+        return response
+
 
 class DestroyModelMixin:
     """
@@ -93,13 +394,7 @@ class MultipleDestroyMixin:
         serializer.is_valid(raise_exception=True)
         queryset = self.get_queryset()
         items = queryset.filter(pk__in=serializer.data['ids'])
-        not_deleted_items = []
-        for item in items:
-            item_id = item.pk
-            try:
-                item.delete()
-            except django.db.models.deletion.ProtectedError as e:
-                not_deleted_items.append(item_id)
+        not_deleted_items = bulk_delete(items)
         return Response({
             'not_deleted_items': not_deleted_items
         }, status=status.HTTP_204_NO_CONTENT if len(not_deleted_items) == 0 else status.HTTP_423_LOCKED)
@@ -111,6 +406,123 @@ class MultipleDestroyMixin:
         return super().get_serializer_class()
 
 
+class MultipleUpdateItemSerializer(serializers.Serializer):
+    id = serializers.CharField()
+    fields = serializers.DictField()
+
+
+class MultipleUpdateMixin:
+    """
+    Partially updates many objects in one request.
+
+    Objects are fetched with one query, checked against the object permissions
+    of the ``update`` action and validated with its serializer row by row. The
+    response lists every row under the ``id`` it was sent with, the status is
+    200 when all rows were updated, 207 when some were and 400 when none was.
+
+    When the serializer keeps ``ModelSerializer.update`` the valid rows are
+    written with ``bulk_update`` in chunks, ``pre_save`` and ``post_save`` are
+    sent for every written object so that receivers behave as they do for a
+    regular update; nested writes are rejected as by ``update`` itself. A
+    serializer with its own ``update`` is saved row by row instead.
+    """
+    multiple_update_chunk_size = 500
+
+    @action(methods=['PATCH'], url_path='multiple-update', detail=False)
+    def multiple_update(self, request, *args, **kwargs):
+        serializer = MultipleUpdateItemSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        patches = serializer.validated_data
+        # rows are reported under the id as sent, whether it was found or not
+        sent_ids = [item['id'] for item in request.data]
+
+        queryset = self.get_queryset()
+        model = queryset.model
+        pk_field = model._meta.pk
+        ids = []
+        for patch in patches:
+            try:
+                ids.append(pk_field.to_python(patch['id']))
+            except DjangoValidationError:
+                ids.append(None)
+        instances = queryset.in_bulk([pk for pk in ids if pk is not None])
+
+        update_serializer_class = self.serializer_classes.get('update', self.serializer_class)
+        results, valid = [], []
+        for patch, pk, sent_id in zip(patches, ids, sent_ids):
+            instance = instances.get(pk)
+            if instance is None:
+                results.append({'id': sent_id, 'status': status.HTTP_404_NOT_FOUND})
+                continue
+            try:
+                self.check_object_permissions(request, instance)
+            except exceptions.APIException as e:
+                results.append({'id': sent_id, 'status': e.status_code, 'errors': e.detail})
+                continue
+
+            update_serializer = update_serializer_class(
+                instance, data=patch['fields'], partial=True, context=self.get_serializer_context(),
+            )
+            if not update_serializer.is_valid():
+                results.append({'id': sent_id, 'status': status.HTTP_400_BAD_REQUEST,
+                                'errors': update_serializer.errors})
+                continue
+
+            valid.append(update_serializer)
+            results.append({'id': sent_id, 'status': status.HTTP_200_OK})
+
+        self.perform_multiple_update(model, valid)
+        updated = sum(result['status'] == status.HTTP_200_OK for result in results)
+        if updated == len(results):
+            response_status = status.HTTP_200_OK
+        elif updated:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response({'results': results}, status=response_status)
+
+    def perform_multiple_update(self, model, valid):
+        if not valid:
+            return
+        if type(valid[0]).update is not serializers.ModelSerializer.update:
+            with transaction.atomic():
+                for update_serializer in valid:
+                    update_serializer.save()
+            return
+
+        many_to_many = {field.name for field in model._meta.many_to_many}
+        fields = {field.name for field in model._meta.concrete_fields if getattr(field, 'auto_now', False)}
+
+        for update_serializer in valid:
+            instance, validated_data = update_serializer.instance, update_serializer.validated_data
+            serializers.raise_errors_on_nested_writes('update', update_serializer, validated_data)
+            for name, value in validated_data.items():
+                if name not in many_to_many:
+                    setattr(instance, name, value)
+                    fields.add(name)
+            for field in model._meta.concrete_fields:
+                if getattr(field, 'auto_now', False):
+                    field.pre_save(instance, add=False)
+
+        instances = [update_serializer.instance for update_serializer in valid]
+        with transaction.atomic():
+            for instance in instances:
+                pre_save.send(
+                    sender=model, instance=instance, raw=False, using=instance._state.db,
+                    update_fields=frozenset(fields),
+                )
+            if fields:
+                model.objects.bulk_update(instances, sorted(fields), batch_size=self.multiple_update_chunk_size)
+            for update_serializer in valid:
+                for name in many_to_many.intersection(update_serializer.validated_data):
+                    getattr(update_serializer.instance, name).set(update_serializer.validated_data[name])
+            for instance in instances:
+                post_save.send(
+                    sender=model, instance=instance, created=False, update_fields=frozenset(fields),
+                    raw=False, using=instance._state.db,
+                )
+
+
 class QuerySetByUserMixin:
 
     def get_queryset(self):
@@ -147,20 +559,27 @@ class QuerySetByUserMixin:
 
 
 class UltraModelViewSet(
+    AuthenticationByActionMixin,
     PermissionByActionMixin,
     MultipleDestroyMixin,
+    MultipleUpdateMixin,
     SerializersByActionMixin,
+    SparseFieldsMixin,
+    QuerySetByActionMixin,
     PaginationBreakerMixin,
     DestroyModelMixin,
     ModelViewSet,
 ):
-    pass
+    throttle_cost_classes = {'multiple_update': 'bulk_write', 'multiple_delete': 'bulk_write'}
 
 
 class UltraReadOnlyModelViewSet(
+    AuthenticationByActionMixin,
     PermissionByActionMixin,
     PaginationBreakerMixin,
     SerializersByActionMixin,
+    SparseFieldsMixin,
+    QuerySetByActionMixin,
     RetrieveModelMixin,
     ListModelMixin,
     GenericViewSet,
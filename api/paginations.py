@@ -1,4 +1,12 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination, CursorPagination
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class SimplePagination(PageNumberPagination):
@@ -6,3 +14,154 @@ class SimplePagination(PageNumberPagination):
     page_query_param = '_page'
     page_size_query_param = '_page_size'
     max_page_size = 1000
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        ``paginate_queryset`` for async views: the count and the page are read
+        with ``acount`` and ``aiterator``; links and errors are the same.
+        """
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            number = paginator.validate_number(page_number)
+        except InvalidPage as exc:
+            msg = self.invalid_page_message.format(page_number=page_number, message=str(exc))
+            raise NotFound(msg)
+
+        bottom = (number - 1) * page_size
+        objects = [obj async for obj in queryset[bottom:bottom + page_size].aiterator(chunk_size=page_size)]
+        self.page = paginator._get_page(objects, number, paginator)
+        self.request = request
+        return list(self.page)
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination keyed on the full ordering tuple, e.g. ``(-created_at, id)``.
+
+    Unlike ``CursorPagination`` it supports every ordering the view accepts
+    (including multiple fields) and seeks with a ``WHERE`` on the last seen
+    keys, so neither ``COUNT(*)`` nor ``OFFSET`` is ever executed. Annotations
+    can be keys too, such as the ``search_rank`` of the full-text search.
+    """
+    page_size = 20
+    cursor_query_param = '_cursor'
+    page_size_query_param = '_page_size'
+    max_page_size = 1000
+    tiebreaker = 'id'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_keyset_ordering(queryset)
+        self.fields = [self._get_field(queryset, field) for field in self.ordering]
+        self.cursor = self.decode_cursor(request)
+
+        if self.cursor is None:
+            keys, self.reverse = None, False
+        else:
+            keys, self.reverse = self.cursor
+
+        ordering = self._invert(self.ordering) if self.reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if keys is not None:
+            queryset = queryset.filter(self._keyset_q(keys))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        if self.reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, keys is not None
+
+        return self.page
+
+    def get_keyset_ordering(self, queryset):
+        ordering = list(queryset.query.order_by) or list(queryset.model._meta.ordering)
+        ordering = [
+            f'-{self.tiebreaker}' if field == '-pk' else self.tiebreaker if field == 'pk' else field
+            for field in ordering
+        ]
+        if any(not isinstance(field, str) for field in ordering):
+            raise ValueError('KeysetPagination supports only field name orderings.')
+        if not any(field.lstrip('-') == self.tiebreaker for field in ordering):
+            ordering.append(self.tiebreaker)
+        return ordering
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self._link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self._link(self.page[0], reverse=True)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            data = json.loads(urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            if data['o'] != self.ordering:
+                raise ValueError
+            keys = [field.to_python(value) for field, value in zip(self.fields, data['k'], strict=True)]
+            return keys, bool(data['r'])
+        except (TypeError, ValueError, KeyError, ValidationError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _link(self, instance, reverse):
+        data = {
+            'o': self.ordering,
+            'k': [self._key(instance, name, field) for name, field in zip(self.ordering, self.fields)],
+            'r': int(reverse),
+        }
+        encoded = urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode('utf-8')).decode('ascii')
+        url = remove_query_param(self.base_url, self.cursor_query_param)
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def _keyset_q(self, keys):
+        condition = Q()
+        for index, field in enumerate(self.ordering):
+            descending = field.startswith('-') != self.reverse
+            lookup = 'lt' if descending else 'gt'
+            step = Q(**{f'{field.lstrip("-")}__{lookup}': keys[index]})
+            for previous, key in zip(self.ordering[:index], keys[:index]):
+                step &= Q(**{previous.lstrip('-'): key})
+            condition |= step
+        return condition
+
+    @staticmethod
+    def _invert(ordering):
+        return [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+
+    @staticmethod
+    def _key(instance, name, field):
+        if getattr(field, 'model', None) is None:
+            return getattr(instance, name.lstrip('-'))  # an annotation, its output field belongs to no model
+        return field.value_to_string(instance)
+
+    @staticmethod
+    def _get_field(queryset, name):
+        annotation = queryset.query.annotations.get(name.lstrip('-'))
+        if annotation is not None:
+            return annotation.output_field
+        try:
+            return queryset.model._meta.get_field(name.lstrip('-'))
+        except FieldDoesNotExist:
+            raise ValueError(f'KeysetPagination cannot order by {name!r}.')
@@ -0,0 +1,37 @@
+import codecs
+import json
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.utils import json as strict_json
+
+from api.renderers import FastJSONRenderer, get_json_backend
+
+
+class FastJSONParser(JSONParser):
+    """
+    Reads the whole body at once and decodes it with ``orjson`` when available,
+    or with one ``json.loads`` call, instead of ``JSONParser``'s incremental
+    codec reader; this matters for the large base64 image bodies.
+    """
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        backend = get_json_backend()
+
+        try:
+            data = stream.read()
+            if codecs.lookup(encoding).name != 'utf-8':
+                data = data.decode(encoding)
+            if backend is not None and self.strict:
+                # orjson rejects NaN and Infinity, as the strict mode does
+                return backend.loads(data)
+            if isinstance(data, bytes):
+                data = data.decode(encoding)
+            parse_constant = strict_json.strict_constant if self.strict else None
+            return json.loads(data, parse_constant=parse_constant)
+        except (ValueError, LookupError) as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
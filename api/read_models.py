@@ -0,0 +1,110 @@
+import json
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework import serializers
+
+from api.metrics import MeasuredSerializerMixin
+from api.renderers import FastJSONRenderer
+from api.serializers import FastListProductSerializer
+from store.models import Product, ProductListDocument
+
+_pending = threading.local()
+
+
+def build_document(product):
+    """The ``ListProductSerializer`` output of the product with site-relative URLs, as plain JSON."""
+    return json.loads(FastJSONRenderer().render(FastListProductSerializer(product).data))
+
+
+def refresh_documents(ids, batch_size=500):
+    ids = list(ids)
+    for start in range(0, len(ids), batch_size):
+        products = (
+            Product.objects
+            .filter(pk__in=ids[start:start + batch_size])
+            .select_related('category')
+            .prefetch_related('tags', 'attributes', 'images')
+        )
+        ProductListDocument.objects.bulk_create(
+            [ProductListDocument(product=product, data=build_document(product)) for product in products],
+            update_conflicts=True,
+            unique_fields=['product'],
+            update_fields=['data', 'updated_at'],
+        )
+
+
+def rebuild_documents(batch_size=500):
+    ProductListDocument.objects.all().delete()
+    ids = Product.objects.order_by().values_list('pk', flat=True).iterator(chunk_size=batch_size)
+    batch = []
+    for pk in ids:
+        batch.append(pk)
+        if len(batch) >= batch_size:
+            refresh_documents(batch, batch_size)
+            batch = []
+    refresh_documents(batch, batch_size)
+
+
+def read_model_enabled():
+    return getattr(settings, 'PRODUCT_LIST_READ_MODEL', False)
+
+
+def schedule_refresh(ids):
+    """
+    Refreshes the documents once the current transaction commits, so that a
+    cascade or a batch of writes inside one transaction rebuilds each product once.
+    """
+    if not hasattr(_pending, 'ids'):
+        _pending.ids = set()
+    _pending.ids.update(ids)
+    transaction.on_commit(_flush)
+
+
+def _flush():
+    ids, _pending.ids = getattr(_pending, 'ids', set()), set()
+    if ids:
+        refresh_documents(ids)
+
+
+class ProductListDocumentSerializer(MeasuredSerializerMixin, serializers.BaseSerializer):
+    """
+    Reads the denormalized document of a product instead of serializing its relations.
+    ``fields`` and ``expand`` prune the document the way ``FastListProductSerializer`` would.
+    """
+
+    def __init__(self, *args, fields=None, expand=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sparse_fields = fields, expand
+
+    @classmethod
+    def get_sparse_field_names(cls):
+        return FastListProductSerializer.get_sparse_field_names()
+
+    def to_representation(self, product):
+        try:
+            data = product.list_document.data
+        except ProductListDocument.DoesNotExist:
+            data = build_document(product)
+
+        fields, expand = self.sparse_fields
+        if fields is not None:
+            kept = {*fields, *expand}
+            data = {name: value for name, value in data.items() if name in kept}
+            for name in self.get_sparse_field_names()[1]:
+                if name in data and name not in expand:
+                    value = data[name]
+                    data[name] = [item['id'] for item in value] if isinstance(value, list) else value and value['id']
+
+        request = self.context.get('request')
+        if request is None:
+            return data
+
+        absolute = request.build_absolute_uri
+        if data.get('image'):
+            data['image'] = absolute(data['image'])
+        for image in data.get('images', []):
+            image['image'] = absolute(image['image'])
+            image['srcset'] = {variant: absolute(url) for variant, url in image.get('srcset', {}).items()}
+        return data
@@ -0,0 +1,54 @@
+from django.conf import settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from api.metrics import measure
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def get_json_backend():
+    """``orjson`` when it is installed and ``API_JSON_BACKEND`` is not ``'json'``, otherwise ``None``."""
+    if orjson is None or getattr(settings, 'API_JSON_BACKEND', 'orjson') == 'json':
+        return None
+    return orjson
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    ``JSONRenderer`` on top of ``orjson`` when available, with the same output:
+    datetimes, dates and UUIDs are encoded by orjson itself, other types
+    (``Decimal``, lazy strings, querysets...) go through DRF's ``JSONEncoder``.
+    Whatever orjson cannot reproduce (non-compact separators, an indent other
+    than 2, ``UNICODE_JSON = False``, huge ints) is rendered by ``JSONRenderer``.
+    """
+    default = staticmethod(JSONEncoder().default)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with measure('render'):
+            return self._render(data, accepted_media_type, renderer_context)
+
+    def _render(self, data, accepted_media_type=None, renderer_context=None):
+        backend = get_json_backend()
+        if data is None or backend is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent not in (None, 2):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        option = backend.OPT_UTC_Z | backend.OPT_NON_STR_KEYS
+        if indent:
+            option |= backend.OPT_INDENT_2
+        try:
+            ret = backend.dumps(data, default=self.default, option=option)
+        except backend.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # the same escaping as JSONRenderer, so the output stays a strict javascript subset
+        if b'\xe2\x80' in ret:
+            ret = ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+        return ret
@@ -1,12 +1,45 @@
 import uuid
+from functools import lru_cache
 
 from rest_framework import serializers
 
+from api.fast_serializers import CompiledSerializerMixin
+from api.metrics import MeasuredSerializerMixin
 from store.models import Product, ProductAttribute, Category, Tag, ProductImage
-from utils.main import base64_to_image_file
+from store.processing import store_raw_image
+from utils.main import base64_to_image_file, ImageDecodeError
 
 
-class ProductSerializer(serializers.ModelSerializer):
+@lru_cache(maxsize=None)
+def _field_names(serializer_class):
+    return tuple(serializer_class().fields)
+
+
+class SparseFieldsSerializerMixin:
+    """
+    Returns only ``fields`` when they are given; of the ``Meta.expandable_fields``
+    relations among them, those not in ``expand`` are given as primary keys.
+    ``Meta.field_lookups`` names the relations a field reads besides its own.
+    """
+
+    def __init__(self, *args, fields=None, expand=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is None:
+            return
+        kept = {*fields, *expand}
+        for name in [name for name in self.fields if name not in kept]:
+            self.fields.pop(name)
+        for name in [name for name in self.get_sparse_field_names()[1] if name in self.fields and name not in expand]:
+            many = isinstance(self.fields[name], serializers.ListSerializer)
+            self.fields[name] = serializers.PrimaryKeyRelatedField(read_only=True, many=many)
+
+    @classmethod
+    def get_sparse_field_names(cls):
+        """The names of all fields and of the expandable ones."""
+        return _field_names(cls), tuple(getattr(cls.Meta, 'expandable_fields', ()))
+
+
+class ProductSerializer(MeasuredSerializerMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Product
@@ -20,28 +53,39 @@ class AttributeForProductSerializer(serializers.ModelSerializer):
         exclude = ('product',)
 
 
-class ImageForProductSerializer(serializers.ModelSerializer):
+class ImageVariantsMixin(serializers.Serializer):
+    srcset = serializers.SerializerMethodField()
+
+    def get_srcset(self, product_image):
+        request = self.context.get('request')
+        urls = product_image.variant_urls
+        if request is None:
+            return urls
+        return {variant: request.build_absolute_uri(url) for variant, url in urls.items()}
+
+
+class ImageForProductSerializer(ImageVariantsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = ProductImage
         exclude = ('product',)
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(SparseFieldsSerializerMixin, MeasuredSerializerMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Category
         fields = '__all__'
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(SparseFieldsSerializerMixin, MeasuredSerializerMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Tag
         fields = '__all__'
 
 
-class ListProductSerializer(serializers.ModelSerializer):
+class ListProductSerializer(SparseFieldsSerializerMixin, MeasuredSerializerMixin, serializers.ModelSerializer):
 
     # image1 = serializers.ImageField(source='image')
     # category = serializers.CharField(source='category.name')
@@ -55,9 +99,15 @@ class ListProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
         exclude = ('content',)
+        expandable_fields = ('category', 'tags', 'attributes', 'images')
+        field_lookups = {'image': ('images',)}
 
 
-class DetailProductSerializer(serializers.ModelSerializer):
+class FastListProductSerializer(CompiledSerializerMixin, ListProductSerializer):
+    pass
+
+
+class DetailProductSerializer(SparseFieldsSerializerMixin, MeasuredSerializerMixin, serializers.ModelSerializer):
 
     # image1 = serializers.ImageField(source='image')
     # category = serializers.CharField(source='category.name')
@@ -71,9 +121,15 @@ class DetailProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = '__all__'
+        expandable_fields = ('category', 'tags', 'attributes', 'images')
+        field_lookups = {'image': ('images',)}
+
+
+class FastDetailProductSerializer(CompiledSerializerMixin, DetailProductSerializer):
+    pass
 
 
-class CreateProductSerializer(serializers.ModelSerializer):
+class CreateProductSerializer(MeasuredSerializerMixin, serializers.ModelSerializer):
 
     attributes = AttributeForProductSerializer(many=True, required=False)
     images = serializers.ListSerializer(child=serializers.CharField(), required=False)
@@ -93,6 +149,8 @@ class CreateProductSerializer(serializers.ModelSerializer):
             try:
                 file = base64_to_image_file(image, uuid.uuid4())
                 file_images.append(file)
+            except ImageDecodeError as e:
+                raise serializers.ValidationError({'images': [str(e)]})
             except Exception as e:
                 print(e)
                 raise serializers.ValidationError(
@@ -109,37 +167,44 @@ class CreateProductSerializer(serializers.ModelSerializer):
             )
 
         for file_image in file_images:
-            product_image = ProductImage.objects.create(product=product)
-            product_image.image.save(file_image.name, file_image)
-            product_image.save()
+            store_raw_image(product, file_image)
 
         return product
 
 
-class UpdateProductSerializer(serializers.ModelSerializer):
+class UpdateProductSerializer(MeasuredSerializerMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Product
         exclude = ('user',)
 
 
-class ProductImageSerializer(serializers.ModelSerializer):
+class ProductImageSerializer(MeasuredSerializerMixin, ImageVariantsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = ProductImage
         fields = '__all__'
+        read_only_fields = ('status', 'has_variants')
+
+    def create(self, validated_data):
+        return store_raw_image(validated_data['product'], validated_data['image'])
 
 
-class ProductAttributeSerializer(serializers.ModelSerializer):
+class ProductAttributeSerializer(MeasuredSerializerMixin, serializers.ModelSerializer):
 
     class Meta:
         model = ProductAttribute
         fields = '__all__'
 
 
-class UpdateProductAttributeSerializer(serializers.ModelSerializer):
+class UpdateProductAttributeSerializer(MeasuredSerializerMixin, serializers.ModelSerializer):
 
     class Meta:
         model = ProductAttribute
         fields = ('name', 'value')
 
+
+
+class ImportProductsSerializer(serializers.Serializer):
+    file = serializers.FileField()
+    format = serializers.ChoiceField(choices=('csv', 'ndjson'), required=False)
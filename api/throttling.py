@@ -0,0 +1,128 @@
+import math
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import BaseThrottle
+
+from utils.throttling import LocalTokenBucketStore, CacheTokenBucketStore, parse_rate
+
+login_buckets = LocalTokenBucketStore()
+api_buckets = LocalTokenBucketStore()
+
+
+class LoginRateThrottle(BaseThrottle):
+    """
+    Limits login attempts per client IP and per email with the buckets of
+    ``LOGIN_THROTTLE``. An attempt is only counted when every bucket lets it
+    through, so the IP of a client is not charged for attempts refused on the
+    email. The buckets live in process memory, so each worker keeps its own count.
+    """
+    scope = 'login'
+
+    def get_rates(self):
+        return {'IP': '30/min', 'EMAIL': '10/min', **getattr(settings, 'LOGIN_THROTTLE', {})}
+
+    def get_keys(self, request):
+        keys = {'IP': self.get_ident(request)}
+        email = request.data.get('email') if hasattr(request.data, 'get') else None
+        if isinstance(email, str) and email:
+            keys['EMAIL'] = email.strip().lower()
+        return keys
+
+    def allow_request(self, request, view):
+        rates = self.get_rates()
+        buckets = []
+        for name, ident in self.get_keys(request).items():
+            rate = parse_rate(rates.get(name))
+            if rate is not None:
+                buckets.append((f'{self.scope}:{name.lower()}:{ident}', *rate, 1))
+        self.wait_time = login_buckets.consume_all(buckets)
+        return not self.wait_time
+
+    def wait(self):
+        return self.wait_time
+
+
+def get_throttle_settings():
+    return {
+        'STORE': 'local',
+        'CACHE_ALIAS': 'default',
+        'RATES': {'user': '1200/min', 'anon': '300/min'},
+        'COSTS': {'read': 1, 'list': 2, 'unpaginated': 100, 'write': 5, 'login': 10, 'import': 100, 'bulk_write': 2},
+        **getattr(settings, 'API_THROTTLE', {}),
+    }
+
+
+class CostRateThrottle(BaseThrottle):
+    """
+    Takes the cost of the request from the token bucket of its user, or of its
+    IP for anonymous clients, with the rates and costs of ``API_THROTTLE``.
+
+    The cost class comes from the ``throttle_cost_classes`` of the view, keyed
+    by action or, for plain views, by method; otherwise it is ``write`` for
+    unsafe methods, ``list`` or ``unpaginated`` for lists and ``read`` for the
+    rest. A page larger than the default one costs as many lists as it spans,
+    ``bulk_write`` is paid for every row of the batch, and no request costs
+    more than the whole bucket.
+    """
+    scope = 'api'
+
+    def get_store(self, options):
+        if options['STORE'] == 'cache':
+            return CacheTokenBucketStore(caches[options['CACHE_ALIAS']])
+        return api_buckets
+
+    def get_cost_class(self, request, view):
+        # api.mixins imports the DRF views, which import this module through DEFAULT_THROTTLE_CLASSES
+        from api.mixins import USE_PAGINATION, make_bool
+
+        action = getattr(view, 'action', None)
+        cost_class = getattr(view, 'throttle_cost_classes', {}).get(action or request.method.lower())
+        if cost_class:
+            return cost_class
+        if request.method not in SAFE_METHODS:
+            return 'write'
+        if action == 'list':
+            return 'list' if make_bool(request.query_params.get(USE_PAGINATION, True)) else 'unpaginated'
+        return 'read'
+
+    def get_cost(self, request, view, costs):
+        cost_class = self.get_cost_class(request, view)
+        cost = costs.get(cost_class, 1)
+        # not view.paginator, which would be cached before the view picks its pagination
+        pagination_class = getattr(view, 'pagination_class', None) if cost_class == 'list' else None
+        paginator = pagination_class() if pagination_class else None
+        if paginator is not None and getattr(paginator, 'page_size', None):
+            page_size = paginator.get_page_size(request) or paginator.page_size
+            cost *= math.ceil(page_size / paginator.page_size)
+        if cost_class == 'bulk_write':
+            cost *= max(self.get_batch_size(request), 1)
+        return cost
+
+    @staticmethod
+    def get_batch_size(request):
+        # the body of multiple-update is the list of rows, the one of multiple-delete has them under ids
+        data = request.data
+        if isinstance(data, dict):
+            data = data.get('ids')
+        return len(data) if isinstance(data, list) else 0
+
+    def allow_request(self, request, view):
+        options = get_throttle_settings()
+        self.wait_time = 0
+        if request.user and request.user.is_authenticated:
+            kind, ident = 'user', request.user.pk
+        else:
+            kind, ident = 'anon', self.get_ident(request)
+        rate = parse_rate(options['RATES'].get(kind))
+        if rate is None:
+            return True
+
+        capacity, refill = rate
+        cost = min(self.get_cost(request, view, options['COSTS']), capacity)
+        self.wait_time = self.get_store(options).consume(f'{self.scope}:{kind}:{ident}', capacity, refill, cost)
+        return not self.wait_time
+
+    def wait(self):
+        return self.wait_time
@@ -1,7 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .yasg import urlpatterns as url_doc
-from . import views
+from . import views, async_views
 
 router = DefaultRouter()
 router.register('products', views.ProductViewSet)
@@ -15,6 +15,13 @@ urlpatterns = [
     path('product-attributes/', views.CreateProductAttrApiView.as_view()),
     path('product-attributes/<int:id>/', views.UpdateDeleteProductAttrApiView.as_view()),
     path('auth/', include('api.auth.urls')),
+
+    path('async/products/', async_views.AsyncProductView.as_view()),
+    path('async/products/<int:id>/', async_views.AsyncProductView.as_view()),
+    path('async/categories/', async_views.AsyncCategoryView.as_view()),
+    path('async/categories/<int:pk>/', async_views.AsyncCategoryView.as_view()),
+    path('async/tags/', async_views.AsyncTagView.as_view()),
+    path('async/tags/<int:pk>/', async_views.AsyncTagView.as_view()),
     path('', include(router.urls))
 ]
 
@@ -1,34 +1,51 @@
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status
-from rest_framework.authentication import TokenAuthentication, SessionAuthentication
+from rest_framework.authentication import SessionAuthentication
 from rest_framework.decorators import action
-from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.filters import OrderingFilter
 from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import IsAuthenticatedOrReadOnly, AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 
-from api.filters import ProductFilter
-from api.mixins import SuperGenericAPIView, UltraModelViewSet
+from api.authentication import CachedTokenAuthentication
+from api.facets import facet_response
+from api.filters import ProductFilter, FullTextSearchFilter
+from api.importers import ProductImporter, parse_rows, guess_format
+from api.read_models import ProductListDocumentSerializer, read_model_enabled
+from api.mixins import SuperGenericAPIView, UltraModelViewSet, CacheResponseMixin, ReplicaReadMixin
 from api.paginations import SimplePagination
 from api.permissions import IsAdminOrReadOnly, IsOwnerOrReadOnly, IsSalesmanOrReadOnly, IsSalesman, IsOwner
-from api.serializers import ListProductSerializer, DetailProductSerializer, CreateProductSerializer, TagSerializer, \
+from api.serializers import FastListProductSerializer, FastDetailProductSerializer, CreateProductSerializer, TagSerializer, \
     UpdateProductSerializer, ProductImageSerializer, ProductAttributeSerializer, \
-    UpdateProductAttributeSerializer, CategorySerializer, ProductSerializer
+    UpdateProductAttributeSerializer, CategorySerializer, ProductSerializer, ImportProductsSerializer
 from store.models import Product, ProductAttribute, ProductImage, Category, Tag
 
-class ProductViewSet(UltraModelViewSet):
+class ProductViewSet(ReplicaReadMixin, CacheResponseMixin, UltraModelViewSet):
     queryset = Product.objects.all()
     lookup_field = 'id'
+    cache_models = (Product, ProductImage, ProductAttribute, Category, Tag)
     serializer_classes = {
-        'list': ListProductSerializer,
-        'retrieve': DetailProductSerializer,
+        'list': FastListProductSerializer,
+        'retrieve': FastDetailProductSerializer,
         'create': CreateProductSerializer,
         'update': UpdateProductSerializer,
+        'import_products': ImportProductsSerializer,
     }
+    select_related_by_action = {
+        'list': ['category'],
+        'retrieve': ['category'],
+        'multiple_update': ['user'],
+    }
+    prefetch_related_by_action = {
+        'list': ['tags', 'attributes', 'images'],
+        'retrieve': ['tags', 'attributes', 'images'],
+    }
+    deferrable_fields = ('description', 'content')
+    throttle_cost_classes = {**UltraModelViewSet.throttle_cost_classes, 'import_products': 'import'}
     pagination_class = SimplePagination
     filter_backends = [
-        SearchFilter,
+        FullTextSearchFilter,
         DjangoFilterBackend,
         OrderingFilter,
     ]
@@ -36,14 +53,52 @@ class ProductViewSet(UltraModelViewSet):
     ordering_fields = ['price', 'name', 'is_published', 'rating']
     # filterset_fields = ['category', 'tags', 'user', 'is_published']
     filterset_class = ProductFilter
+    authentication_classes_by_action = {
+        'list': [CachedTokenAuthentication],
+        'retrieve': [CachedTokenAuthentication],
+        'price_facets': [CachedTokenAuthentication],
+    }
     permission_classes_by_action = {
         'list':  [AllowAny],
         'retrieve': [AllowAny],
+        'price_facets': [AllowAny],
         'create': [IsAuthenticated, IsSalesman],
         'update': [IsAuthenticated, IsOwner],
         'destroy': [IsAuthenticated, IsOwner],
+        'import_products': [IsAuthenticated, IsSalesman],
     }
 
+    def get_queryset(self):
+        if self.action == 'list' and read_model_enabled():
+            return self.queryset.select_related('list_document')
+        return super().get_queryset()
+
+    def get_serializer_class(self):
+        if self.action == 'list' and read_model_enabled():
+            return ProductListDocumentSerializer
+        return super().get_serializer_class()
+
+    @action(methods=['POST'], url_path='import', detail=False)
+    def import_products(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        file = serializer.validated_data['file']
+        _format = serializer.validated_data.get('format') or guess_format(file.name)
+
+        result = ProductImporter(request.user).run(parse_rows(file.file, _format))
+        # the valid batches are committed whatever the other rows do, so only a 400 means nothing was written
+        if not result['errors']:
+            response_status = status.HTTP_201_CREATED
+        elif result['created']:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response(result, status=response_status)
+
+    @action(methods=['GET'], url_path='price-facets', detail=False)
+    def price_facets(self, request, *args, **kwargs):
+        return facet_response(request, self, 'price_bucket')
+
     # @action(methods=['GET'], url_path='custom-action', detail=False)
     # def custom_action(self, request, *args, **kwargs):
     #     return Response({'message': 'Hello world'})
@@ -63,6 +118,12 @@ class CreateProductImageApiView(SuperGenericAPIView):
 class DeleteProductImageApiView(SuperGenericAPIView):
     
     queryset = ProductImage.objects.all()
+    serializer_class = ProductImageSerializer
+    lookup_field = 'id'
+
+    def get(self, request, *args, **kwargs):
+        serializer = self.get_serializer(self.get_object())
+        return Response(serializer.data)
 
     def delete(self, request, *args, **kwargs):
         product_image = self.get_object()
@@ -70,23 +131,29 @@ class DeleteProductImageApiView(SuperGenericAPIView):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class CategoryViewSet(UltraModelViewSet):
+class CategoryViewSet(CacheResponseMixin, UltraModelViewSet):
     permission_classes = [IsAuthenticatedOrReadOnly, IsAdminOrReadOnly]
     serializer_class = CategorySerializer
     queryset = Category.objects.all()
+    cache_models = (Category,)
 
+    @action(methods=['GET'], url_path='facets', detail=False)
+    def facets(self, request, *args, **kwargs):
+        return facet_response(request, ProductViewSet(request=request, format_kwarg=None, action='list'), 'category_id')
 
 
-
-
-class ProductTagsViewSet(UltraModelViewSet):
+class ProductTagsViewSet(CacheResponseMixin, UltraModelViewSet):
     
     serializer_class = TagSerializer
     queryset = Tag.objects.all()
+    cache_models = (Tag,)
 
-    authentication_classes = [TokenAuthentication, SessionAuthentication]
+    authentication_classes = [CachedTokenAuthentication, SessionAuthentication]
     permission_classes = [IsAuthenticatedOrReadOnly, IsAdminOrReadOnly]
 
+    @action(methods=['GET'], url_path='facets', detail=False)
+    def facets(self, request, *args, **kwargs):
+        return facet_response(request, ProductViewSet(request=request, format_kwarg=None, action='list'), 'tag_id')
 
 
     
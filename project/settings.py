@@ -10,9 +10,14 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import importlib.util
 import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
+from utils.databases import get_databases
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -52,6 +57,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -87,12 +93,41 @@ WSGI_APPLICATION = 'project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Profiles: 'sqlite', 'sqlite-wal', 'postgres' (persistent connections) or 'postgres-pool' (needs psycopg[pool]).
+# Postgres is configured by POSTGRES_DB/USER/PASSWORD/HOST/PORT, SQLite by SQLITE_PATH; DATABASE_REPLICAS
+# lists read-only replicas (hosts or files) that serve the ProductViewSet reads. See utils.databases.
+DATABASE_PROFILE = os.environ.get('DATABASE_PROFILE', 'sqlite')
+DATABASES = get_databases(DATABASE_PROFILE, BASE_DIR / 'db.sqlite3')
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['utils.databases.ReplicaRouter']
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+# Without REDIS_URL the default cache is the memory of each process. The response cache of CacheResponseMixin is
+# invalidated through version counters kept in its cache, so it is only safe when every worker shares that cache:
+# it is on with Redis and off otherwise, unless API_CACHE_ENABLED forces it for a single process (runserver).
+# Redis is an optional extra: REDIS_URL needs the redis package (pip install redis), which is not in requirements.txt.
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    if importlib.util.find_spec('redis') is None:
+        raise ImproperlyConfigured('REDIS_URL is set but the redis package is not installed, run pip install redis.')
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'market',
+        }
     }
-}
+
+API_CACHE_ENABLED = os.environ.get('API_CACHE_ENABLED', '1' if REDIS_URL else '0') == '1'
+API_CACHE_TIMEOUT = 60 * 5
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -112,6 +147,46 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Preferred password hasher: 'pbkdf2', 'scrypt', 'argon2' (needs argon2-cffi) or 'bcrypt' (needs bcrypt).
+# Hashes made by the others, or with another cost, are still accepted and upgraded on the next login.
+PASSWORD_HASHER = os.environ.get('PASSWORD_HASHER', 'pbkdf2')
+PASSWORD_HASHER_COST = {
+    'pbkdf2_iterations': 870000,
+    'scrypt_work_factor': 2 ** 14,
+    'argon2_time_cost': 2,
+    'argon2_memory_cost': 102400,
+    'argon2_parallelism': 8,
+    'bcrypt_rounds': 12,
+}
+_PASSWORD_HASHERS = {
+    'pbkdf2': 'account.hashers.PBKDF2PasswordHasher',
+    'scrypt': 'account.hashers.ScryptPasswordHasher',
+    'argon2': 'account.hashers.Argon2PasswordHasher',
+    'bcrypt': 'account.hashers.BCryptSHA256PasswordHasher',
+}
+if PASSWORD_HASHER not in _PASSWORD_HASHERS:
+    raise ImproperlyConfigured(
+        f'PASSWORD_HASHER must be one of {", ".join(_PASSWORD_HASHERS)}, not {PASSWORD_HASHER!r}.'
+    )
+PASSWORD_HASHERS = [_PASSWORD_HASHERS.pop(PASSWORD_HASHER), *_PASSWORD_HASHERS.values()]
+
+# Token buckets of LoginRateThrottle, kept in process memory; None disables a bucket
+LOGIN_THROTTLE = {
+    'IP': '30/min',
+    'EMAIL': '10/min',
+}
+
+# Token buckets of api.throttling.CostRateThrottle, the default throttle of the API. A request takes the cost
+# of its class from the bucket of its user, anonymous ones from the bucket of their IP; None disables a rate.
+# STORE 'local' keeps the buckets in process memory, 'cache' shares them between the workers through the
+# CACHE_ALIAS cache (which has to be a shared one, such as Redis or Memcached, for that).
+API_THROTTLE = {
+    'STORE': os.environ.get('API_THROTTLE_STORE', 'local'),
+    'CACHE_ALIAS': 'default',
+    'RATES': {'user': '1200/min', 'anon': '300/min'},
+    'COSTS': {'read': 1, 'list': 2, 'unpaginated': 100, 'write': 5, 'login': 10, 'import': 100, 'bulk_write': 2},
+}
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
 
@@ -135,21 +210,78 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static', 'static_root')
 MEDIA_URL = 'media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Product images are re-encoded off the request: 'thread' (local worker pool) or 'sync'
+IMAGE_PROCESSING_MODE = 'thread'
+IMAGE_PROCESSING_WORKERS = 2
+IMAGE_UPLOAD_MAX_SIZE = 15 * 1024 * 1024
+IMAGE_UPLOAD_MAX_PIXELS = 50_000_000
+PRODUCT_IMAGE_VARIANTS = {
+    'thumb': (150, 150),
+    'medium': (600, 600),
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.BasicAuthentication',
+        'api.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
+        'rest_framework.authentication.BasicAuthentication',
+    ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.CostRateThrottle',
     ],
+    # Proxies in front of the app whose X-Forwarded-For entries the throttles trust; with 0 they key anonymous
+    # clients on REMOTE_ADDR, a client cannot pick its own bucket by sending the header.
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0)),
+}
+
+# FastJSONRenderer/FastJSONParser use orjson when it is installed; 'json' forces the stdlib
+API_JSON_BACKEND = 'orjson'
+
+# Per view timings of api.metrics.MetricsMiddleware, scraped from /metrics. Workers of one host share their
+# histograms through DIRECTORY (one snapshot file per process); without it every process reports its own.
+# ALLOWED_IPS is checked against REMOTE_ADDR, which is the address of the proxy when one runs on the same host:
+# behind it set TOKEN, which the scraper then sends as 'Authorization: Bearer <TOKEN>' instead.
+METRICS = {
+    'ENABLED': True,
+    'DIRECTORY': os.environ.get('METRICS_DIR'),
+    'FLUSH_INTERVAL': 5,
+    'ALLOWED_IPS': ('127.0.0.1', '::1'),
+    'TOKEN': os.environ.get('METRICS_TOKEN'),
+}
+
+# Token cache of CachedTokenAuthentication. Without CACHE_ALIAS it lives in each process and only the process that
+# changed a user drops its entries, the others see the change after TTL seconds; with it the named shared cache
+# replaces the in-process one.
+TOKEN_AUTH_CACHE = {
+    'MAX_SIZE': 10000,
+    'TTL': 60,
+    'CACHE_ALIAS': 'default' if REDIS_URL else None,
 }
 
 AUTH_USER_MODEL = 'account.User'
 
+PRODUCT_SEARCH_BACKEND = 'store.search.SQLiteFTS5SearchBackend'
+
+# Serve ProductViewSet.list from the denormalized ProductListDocument rows (run rebuild_product_documents first)
+PRODUCT_LIST_READ_MODEL = False
+
+# Lower bounds of the price buckets counted by store.facets; run reconcile_facets after changing them
+PRODUCT_PRICE_BUCKETS = (0, 100, 500, 1000, 5000, 10000, 50000, 100000)
+
 CORS_ALLOWED_ORIGINS = [
     'http://localhost:3000',
     'http://127.0.0.1:3000',
@@ -20,9 +20,12 @@ from django.contrib import admin
 from django.shortcuts import redirect
 from django.urls import path, include
 
+from api.metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/v1/', include('api.urls')),
+    path('metrics', metrics_view),
     path('', lambda r: redirect('/admin/')),
 ]
 
@@ -38,10 +38,14 @@ class ProductAdmin(admin.ModelAdmin):
     readonly_fields = ('created_at', 'updated_at', 'get_big_image',)
     inlines = [ProductAttributeStackedInline, ProductImageStackedInline]
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('category').prefetch_related('images')
+
     @admin.display(description='Изображение')
     def get_image(self, item):
-        if item.image:
-            return mark_safe(f'<img src="{item.image.url}" width="150px">')
+        product_image = item.first_image
+        if product_image:
+            return mark_safe(f'<img src="{product_image.get_variant_url("thumb")}" width="150px">')
         return '-'
 
     @admin.display(description='Изображение')
@@ -0,0 +1,140 @@
+import bisect
+from collections import Counter
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, When, Value, Count, Sum, F, IntegerField
+
+from store.models import Product, ProductFacetCount
+
+DEFAULT_PRICE_BUCKETS = (0, 100, 500, 1000, 5000, 10000, 50000, 100000)
+CELL_FIELDS = ('category_id', 'tag_id', 'is_published', 'receive_type', 'price_bucket')
+
+
+def get_price_buckets():
+    """Lower bounds of the price buckets; the last bucket has no upper bound."""
+    return tuple(Decimal(bound) for bound in getattr(settings, 'PRODUCT_PRICE_BUCKETS', DEFAULT_PRICE_BUCKETS))
+
+
+def price_bucket(price):
+    return max(0, bisect.bisect_right(get_price_buckets(), Decimal(price)) - 1)
+
+
+def price_bucket_expression(field='price'):
+    bounds = get_price_buckets()
+    return Case(
+        *(When(**{f'{field}__gte': bound}, then=Value(index)) for index, bound in reversed(list(enumerate(bounds)))),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def product_key(product):
+    """The cell of ``product`` without tag: (category_id, is_published, receive_type, price_bucket)."""
+    return product.category_id, product.is_published, product.receive_type, price_bucket(product.price)
+
+
+def product_cells(key, tag_ids, sign=1):
+    category_id, is_published, receive_type, bucket = key
+    cells = Counter({(category_id, None, is_published, receive_type, bucket): sign})
+    for tag_id in tag_ids:
+        cells[(category_id, tag_id, is_published, receive_type, bucket)] += sign
+    return cells
+
+
+def apply(cells):
+    """Adds the ``{cell: delta}`` counts; a missing cell row is created."""
+    with transaction.atomic():
+        for cell, delta in cells.items():
+            if not delta:
+                continue
+            lookup = dict(zip(CELL_FIELDS, cell))
+            if not ProductFacetCount.objects.filter(**lookup).update(count=F('count') + delta):
+                ProductFacetCount.objects.create(count=delta, **lookup)
+
+
+def _product_keys(ids):
+    products = Product.objects.filter(pk__in=ids).only('category_id', 'is_published', 'receive_type', 'price')
+    return {product.pk: product_key(product) for product in products}
+
+
+def count_links(links, sign=1):
+    """Adds (or with ``sign=-1`` removes) the ``(product_id, tag_id)`` links to the tag cells."""
+    links = list(links)
+    if not links:
+        return
+    keys = _product_keys({product_id for product_id, _ in links})
+    cells = Counter()
+    for product_id, tag_id in links:
+        category_id, is_published, receive_type, bucket = keys[product_id]
+        cells[(category_id, tag_id, is_published, receive_type, bucket)] += sign
+    apply(cells)
+
+
+def count_products(ids, sign=1):
+    """Adds (or with ``sign=-1`` removes) the products ``ids`` as they are stored now."""
+    ids = list(ids)
+    if not ids:
+        return
+    tags = {}
+    for product_id, tag_id in Product.tags.through.objects.filter(product_id__in=ids).values_list('product_id', 'tag_id'):
+        tags.setdefault(product_id, []).append(tag_id)
+
+    cells = Counter()
+    for product_id, key in _product_keys(ids).items():
+        cells.update(product_cells(key, tags.get(product_id, []), sign))
+    apply(cells)
+
+
+def expected_counts():
+    """Every non-empty cell computed from the product table with two ``GROUP BY`` queries."""
+    counts = Counter()
+    products = (
+        Product.objects.order_by()
+        .annotate(bucket=price_bucket_expression())
+        .values_list('category_id', 'is_published', 'receive_type', 'bucket')
+        .annotate(count=Count('id'))
+    )
+    for category_id, is_published, receive_type, bucket, count in products:
+        counts[(category_id, None, is_published, receive_type, bucket)] += count
+
+    tags = (
+        Product.tags.through.objects.order_by()
+        .annotate(bucket=price_bucket_expression('product__price'))
+        .values_list('product__category_id', 'tag_id', 'product__is_published', 'product__receive_type', 'bucket')
+        .annotate(count=Count('id'))
+    )
+    for *cell, count in tags:
+        counts[tuple(cell)] += count
+    return counts
+
+
+def current_counts():
+    rows = ProductFacetCount.objects.order_by().values_list(*CELL_FIELDS).annotate(total=Sum('count'))
+    return Counter({tuple(cell): total for *cell, total in rows if total})
+
+
+def rebuild():
+    with transaction.atomic():
+        ProductFacetCount.objects.all().delete()
+        ProductFacetCount.objects.bulk_create(
+            [ProductFacetCount(count=count, **dict(zip(CELL_FIELDS, cell))) for cell, count in expected_counts().items()],
+            batch_size=1000,
+        )
+
+
+def facet_counts(group, **filters):
+    """
+    ``{value: count}`` of ``group`` (``'category_id'``, ``'tag_id'`` or
+    ``'price_bucket'``) over the cells matching ``filters``, which are lookups
+    on ``ProductFacetCount``. Unless ``tag_id`` is grouped or filtered on, only
+    the tag-less cells are summed, so that every product counts once.
+    """
+    queryset = ProductFacetCount.objects.order_by()
+    if group != 'tag_id' and 'tag_id' not in filters:
+        queryset = queryset.filter(tag__isnull=True)
+    elif group == 'tag_id':
+        queryset = queryset.filter(tag__isnull=False)
+    rows = queryset.filter(**filters).values_list(group).annotate(total=Sum('count'))
+    return {value: total for value, total in rows if total}
@@ -0,0 +1,219 @@
+import base64
+import io
+import json
+import platform
+import resource
+import shutil
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from account.services import User
+from store.models import Product, Category, Tag
+from utils.bench import benchmark_database, count_queries, Timing, HOST
+
+CATALOGS = {'1k': 1000, '100k': 100_000, '1m': 1_000_000}
+BASELINE_DIR = settings.BASE_DIR / 'benchmarks'
+
+
+def encoded_image(size=(800, 600)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, format='JPEG')
+    return 'data:image/jpeg;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs the hot API endpoints against a seeded catalog, records latency percentiles, queries and peak '
+        'memory per request and fails when they regress against the stored baseline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--catalog', choices=CATALOGS, default='1k')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--repeat', type=int, default=30)
+        parser.add_argument('--scenario', action='append', dest='scenarios', help='Run only these scenarios.')
+        parser.add_argument('--baseline', help=f'Baseline file, {BASELINE_DIR}/api-<catalog>.json by default.')
+        parser.add_argument('--save-baseline', action='store_true', help='Store the results as the new baseline.')
+        parser.add_argument('--allow-missing-baseline', action='store_true',
+                            help='Only report the results when there is no baseline to compare with.')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed relative slowdown of p50/p95 and growth of peak memory.')
+        parser.add_argument('--min-delta-ms', type=float, default=1.0,
+                            help='Latency differences below this are noise, whatever the ratio.')
+
+    def handle(self, *args, catalog, seed, repeat, scenarios, baseline, save_baseline, allow_missing_baseline,
+               tolerance, min_delta_ms, **options):
+        path = Path(baseline) if baseline else BASELINE_DIR / f'api-{catalog}.json'
+        media_root = tempfile.mkdtemp()
+        overrides = {
+            'DEBUG': False,
+            'ALLOWED_HOSTS': [HOST],
+            'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+            'LOGIN_THROTTLE': {'IP': None, 'EMAIL': None},
+            'API_THROTTLE': {'RATES': {}},
+            'MEDIA_ROOT': media_root,
+            'IMAGE_PROCESSING_MODE': 'sync',
+            'METRICS': {'ENABLED': False},
+        }
+        try:
+            with benchmark_database() as connection, override_settings(**overrides):
+                start = time.perf_counter()
+                # the chunk writer of generate_catalog, the 1m catalog takes minutes instead of an hour
+                call_command(
+                    'generate_catalog', products=CATALOGS[catalog], seed=seed, users=10, categories=20, tags=50,
+                    stdout=io.StringIO(),
+                )
+                self.stdout.write(
+                    f'{connection.vendor}, {CATALOGS[catalog]} products seeded in {time.perf_counter() - start:.1f}s'
+                )
+                results = self.run_scenarios(repeat, scenarios)
+        finally:
+            shutil.rmtree(media_root, ignore_errors=True)
+
+        report = {
+            'catalog': catalog,
+            'seed': seed,
+            'python': platform.python_version(),
+            'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            'scenarios': results,
+        }
+        self.stdout.write(f'max RSS {report["max_rss_kb"] // 1024} MB')
+
+        if save_baseline:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, 'w') as file:
+                json.dump(report, file, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Baseline saved to {path}.'))
+            return
+
+        try:
+            with open(path) as file:
+                stored = json.load(file)
+        except FileNotFoundError:
+            message = f'No baseline at {path}, run with --save-baseline to store one.'
+            if not allow_missing_baseline:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+            return
+
+        regressions = self.compare(stored['scenarios'], results, tolerance, min_delta_ms)
+        if regressions:
+            raise CommandError('Regressions against the baseline:\n  ' + '\n  '.join(regressions))
+        self.stdout.write(self.style.SUCCESS(f'No regressions against {path}.'))
+
+    def get_scenarios(self):
+        """``{name: (prepare, request, expected status)}``; ``prepare`` runs untimed before every request."""
+        user = User.objects.filter(role=User.SALESMAN).first()
+        user.set_password('password')
+        user.save(update_fields=['password'])
+        category = Category.objects.first()
+        tags = list(Tag.objects.values_list('pk', flat=True)[:2])
+        product_id = Product.objects.values_list('pk', flat=True).first()
+
+        client = APIClient(SERVER_NAME=HOST)
+        owner = APIClient(SERVER_NAME=HOST)
+        owner.force_authenticate(user)
+        image = encoded_image()
+
+        def new_products():
+            return [
+                Product.objects.create(
+                    name='Удаляемый', description='Описание', content='Контент', category=category,
+                    user=user, rating=4,
+                ).pk
+                for _ in range(20)
+            ]
+
+        def get(url, params=None):
+            return lambda prepared: client.get(url, params)
+
+        return {
+            'list': (None, get('/api/v1/products/'), 200),
+            'list_filtered': (None, get('/api/v1/products/', {
+                'categories': category.pk, 'min_price': 100, 'max_price': 500, 'is_published': 'true',
+            }), 200),
+            'list_tag_ordered': (None, get('/api/v1/products/', {'tags': tags[0], 'ordering': '-price'}), 200),
+            'list_search': (None, get('/api/v1/products/', {'search': 'беспроводной телефон'}), 200),
+            'list_cursor': (None, get('/api/v1/products/', {'ordering': 'price', 'use_cursor': 'true'}), 200),
+            'list_sparse': (None, get('/api/v1/products/', {'fields': 'id,name,price,image'}), 200),
+            'retrieve': (None, get(f'/api/v1/products/{product_id}/'), 200),
+            'create_with_images': (None, lambda prepared: owner.post('/api/v1/products/', {
+                'name': 'Телефон', 'description': 'Описание', 'content': 'Контент', 'category': category.pk,
+                'user': user.pk, 'rating': 4, 'tags': tags, 'images': [image, image],
+            }, format='json'), 201),
+            'multiple_delete': (new_products, lambda ids: owner.post(
+                '/api/v1/products/multiple-delete/', {'ids': ids}, format='json',
+            ), 204),
+            'login': (None, lambda prepared: client.post(
+                '/api/v1/auth/login/', {'email': user.email, 'password': 'password'}, format='json',
+            ), 200),
+        }
+
+    def run_scenarios(self, repeat, names):
+        scenarios = self.get_scenarios()
+        unknown = set(names or ()) - set(scenarios)
+        if unknown:
+            raise CommandError(f'Unknown scenarios: {", ".join(sorted(unknown))}.')
+
+        results = {}
+        for name, (prepare, request, expected) in scenarios.items():
+            if names and name not in names:
+                continue
+
+            def run():
+                prepared = prepare() if prepare else None
+                start = time.perf_counter()
+                response = request(prepared)
+                elapsed = time.perf_counter() - start
+                if response.status_code != expected:
+                    raise CommandError(f'{name}: {response.status_code} instead of {expected}: {response.content[:200]}')
+                return elapsed
+
+            run()  # warmup
+            prepared = prepare() if prepare else None
+            queries = count_queries(lambda: request(prepared))
+
+            prepared = prepare() if prepare else None
+            tracemalloc.start()
+            request(prepared)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            timing = Timing([run() for _ in range(repeat)])
+            results[name] = {
+                'p50_ms': round(timing.median * 1000, 3),
+                'p95_ms': round(timing.percentile(95) * 1000, 3),
+                'p99_ms': round(timing.percentile(99) * 1000, 3),
+                'queries': queries,
+                'peak_kb': round(peak / 1024, 1),
+            }
+            self.stdout.write(
+                f'{name:20} p50 {timing.median * 1000:9.2f}ms  p95 {timing.percentile(95) * 1000:9.2f}ms  '
+                f'p99 {timing.percentile(99) * 1000:9.2f}ms  {queries:4} queries  {peak / 1024:9.1f} KB peak'
+            )
+        return results
+
+    @staticmethod
+    def compare(stored, results, tolerance, min_delta_ms):
+        regressions = []
+        for name, result in results.items():
+            before = stored.get(name)
+            if before is None:
+                continue
+            for key in ('p50_ms', 'p95_ms'):
+                if result[key] > before[key] * (1 + tolerance) and result[key] - before[key] > min_delta_ms:
+                    regressions.append(f'{name} {key} {before[key]:.2f} -> {result[key]:.2f}')
+            if result['queries'] > before['queries']:
+                regressions.append(f'{name} queries {before["queries"]} -> {result["queries"]}')
+            if result['peak_kb'] > before['peak_kb'] * (1 + tolerance) and result['peak_kb'] - before['peak_kb'] > 64:
+                regressions.append(f'{name} peak memory {before["peak_kb"]:.0f} KB -> {result["peak_kb"]:.0f} KB')
+        return regressions
@@ -0,0 +1,115 @@
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.test import override_settings
+
+from utils.bench import benchmark_database, seed_products, Timing, HOST, run_wsgi
+
+PATHS = (
+    '/api/v1/products/?_page_size=20',
+    '/api/v1/categories/',
+)
+
+
+async def asgi_request(application, url):
+    path = urlsplit(url)
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path.path,
+        'raw_path': path.path.encode(),
+        'query_string': path.query.encode(),
+        'root_path': '',
+        'headers': [(b'host', HOST.encode())],
+        'server': (HOST, 80),
+        'client': ('127.0.0.1', 0),
+    }
+    done = asyncio.Event()
+    received = False
+    result = {}
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await done.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            result['status'] = message['status']
+        elif message['type'] == 'http.response.body' and not message.get('more_body'):
+            done.set()
+
+    await application(scope, receive, send)
+    return result['status']
+
+
+class Command(BaseCommand):
+    help = (
+        'Load-tests the catalog read endpoints in process: the DRF views under WSGI and ASGI, '
+        'and the async views under ASGI, at several concurrency levels.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=2000)
+        parser.add_argument('--requests', type=int, default=400)
+        parser.add_argument('--concurrency', default='1,8,32')
+        parser.add_argument('--path', action='append', dest='paths')
+        parser.add_argument('--cache', action='store_true', help='Keep the response cache of the DRF views.')
+
+    def handle(self, *args, products, requests, concurrency, paths, cache, **options):
+        levels = [int(level) for level in concurrency.split(',')]
+        overrides = {'DEBUG': False, 'ALLOWED_HOSTS': [HOST], 'API_THROTTLE': {'RATES': {}}}
+        if cache:
+            overrides['API_CACHE_ENABLED'] = True  # one process, the local cache is shared by all its threads
+        else:
+            overrides['CACHES'] = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+        with benchmark_database() as connection, override_settings(**overrides):
+            seed_products(products, relations=True)
+            self.stdout.write(f'{connection.vendor}, {products} products, {requests} requests per run')
+            wsgi, asgi = get_wsgi_application(), get_asgi_application()
+
+            for path in paths or PATHS:
+                async_path = path.replace('/api/v1/', '/api/v1/async/', 1)
+                for level in levels:
+                    runs = (
+                        ('wsgi', lambda: run_wsgi(wsgi, path, requests, level)),
+                        ('asgi', lambda: asyncio.run(self.run_asgi(asgi, path, requests, level))),
+                        ('asgi async', lambda: asyncio.run(self.run_asgi(asgi, async_path, requests, level))),
+                    )
+                    for name, run in runs:
+                        run()  # warmup
+                        elapsed, timings, errors = run()
+                        timing = Timing(timings)
+                        self.stdout.write(
+                            f'{path:36} {name:10} c={level:<3} {requests / elapsed:8.1f} req/s  '
+                            f'p50 {timing.median * 1000:8.2f}ms  p99 {timing.percentile(99) * 1000:8.2f}ms  '
+                            f'errors {errors}'
+                        )
+
+    @staticmethod
+    async def run_asgi(application, path, requests, concurrency):
+        timings, errors = [], 0
+        remaining = iter(range(requests))
+
+        async def worker():
+            nonlocal errors
+            for _ in remaining:
+                start = time.perf_counter()
+                status = await asgi_request(application, path)
+                timings.append(time.perf_counter() - start)
+                errors += status != 200
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return time.perf_counter() - start, timings, errors
@@ -0,0 +1,52 @@
+import base64
+import io
+import os
+import time
+import tracemalloc
+
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from utils.main import base64_to_image_file
+
+
+def legacy_base64_to_image_file(base64_string, filename='image'):
+    _format = 'jpg'
+    if 'data:' in base64_string:
+        _format = base64_string.split(';')[0].split(':')[1].split('/')[1]
+    if 'base64,' in base64_string:
+        base64_string = base64_string.split('base64,')[1]
+    return ContentFile(base64.b64decode(base64_string), name=f'{filename}.{_format}')
+
+
+class Command(BaseCommand):
+    help = 'Measures peak memory and time of base64 image decoding for large uploads.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--megabytes', type=int, action='append', dest='sizes')
+
+    def make_payload(self, megabytes):
+        side = int((megabytes * 1024 * 1024 / 3) ** 0.5)
+        buffer = io.BytesIO()
+        Image.frombytes('RGB', (side, side), os.urandom(side * side * 3)).save(buffer, format='PNG', compress_level=0)
+        return 'data:image/png;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')
+
+    def measure(self, func, payload):
+        tracemalloc.start()
+        start = time.perf_counter()
+        file = func(payload, 'image')
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        file.close()
+        return peak, elapsed
+
+    def handle(self, *args, sizes, **options):
+        for megabytes in sizes or [8, 32]:
+            payload = self.make_payload(megabytes)
+            self.stdout.write(f'{megabytes} MB image, {len(payload) / 1024 / 1024:.1f} MB base64 payload')
+            streaming = lambda value, filename: base64_to_image_file(value, filename, max_size=len(payload))
+            for name, func in (('legacy', legacy_base64_to_image_file), ('streaming', streaming)):
+                peak, elapsed = self.measure(func, payload)
+                self.stdout.write(f'  {name:10} peak {peak / 1024 / 1024:7.2f} MB  {elapsed * 1000:7.1f} ms')
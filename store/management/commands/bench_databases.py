@@ -0,0 +1,122 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.test import override_settings
+
+from utils.bench import seed_products, run_wsgi, Timing, HOST
+
+PATHS = (
+    '/api/v1/products/?_page_size=20',
+    '/api/v1/products/?categories=1&ordering=price',
+)
+SQLITE_RUNS = (
+    ('sqlite', 'sqlite', False),
+    ('sqlite-wal', 'sqlite-wal', False),
+    ('sqlite-wal + replica', 'sqlite-wal', True),
+)
+POSTGRES_RUNS = (
+    ('postgres', 'postgres', False),
+    ('postgres-pool', 'postgres-pool', False),
+    ('postgres + replica', 'postgres', True),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures the request throughput of the database profiles of utils.databases, each in its own process. '
+        'SQLite runs on temporary files, Postgres (--postgres) on a temporary database of the POSTGRES_* server; '
+        'the replica runs read the primary through a second, read-only alias.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=5000)
+        parser.add_argument('--requests', type=int, default=400)
+        parser.add_argument('--concurrency', default='1,8')
+        parser.add_argument('--path', action='append', dest='paths')
+        parser.add_argument('--postgres', action='store_true', help='Also run the Postgres profiles.')
+        parser.add_argument('--role', choices=('setup', 'worker', 'teardown'), help='Internal, set for subprocesses.')
+
+    def handle(self, *args, role, **options):
+        if role:
+            return getattr(self, role)(**options)
+
+        self.stdout.write(f'{options["products"]} products, {options["requests"]} requests per run')
+        with tempfile.TemporaryDirectory() as directory:
+            seed_path = os.path.join(directory, 'seed.sqlite3')
+            self.child('setup', options, DATABASE_PROFILE='sqlite', SQLITE_PATH=seed_path)
+            for name, profile, replica in SQLITE_RUNS:
+                path = os.path.join(directory, f'{profile}.sqlite3')
+                shutil.copyfile(seed_path, path)
+                env = {'DATABASE_PROFILE': profile, 'SQLITE_PATH': path, 'DATABASE_REPLICAS': path if replica else ''}
+                self.report(name, self.child('worker', options, **env))
+
+        if options['postgres']:
+            test_name = self.child('setup', options, DATABASE_PROFILE='postgres').strip()
+            host = f'{os.environ.get("POSTGRES_HOST", "localhost")}:{os.environ.get("POSTGRES_PORT", "5432")}'
+            try:
+                for name, profile, replica in POSTGRES_RUNS:
+                    env = {'DATABASE_PROFILE': profile, 'POSTGRES_DB': test_name, 'DATABASE_REPLICAS': host if replica else ''}
+                    self.report(name, self.child('worker', options, **env))
+            finally:
+                self.child('teardown', options, DATABASE_PROFILE='postgres', POSTGRES_DB=test_name)
+
+    def child(self, role, options, **env):
+        command = [
+            sys.executable, str(settings.BASE_DIR / 'manage.py'), 'bench_databases', f'--role={role}',
+            f'--products={options["products"]}', f'--requests={options["requests"]}',
+            f'--concurrency={options["concurrency"]}',
+            *(f'--path={path}' for path in options['paths'] or ()),
+        ]
+        result = subprocess.run(command, env={**os.environ, **env}, capture_output=True, text=True)
+        if result.returncode:
+            raise CommandError(f'{role} with {env} failed:\n{result.stderr}')
+        return result.stdout
+
+    def report(self, name, output):
+        for line in output.splitlines():
+            result = json.loads(line)
+            timing = Timing(result['timings'])
+            self.stdout.write(
+                f'{name:22} {result["path"]:48} c={result["concurrency"]:<3} '
+                f'{result["requests"] / result["elapsed"]:8.1f} req/s  '
+                f'p50 {timing.median * 1000:8.2f}ms  p99 {timing.percentile(99) * 1000:8.2f}ms  '
+                f'errors {result["errors"]}'
+            )
+
+    def setup(self, products, **options):
+        if connection.vendor == 'sqlite':
+            call_command('migrate', run_syncdb=True, verbosity=0)
+        else:
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        seed_products(products, relations=True)
+        self.stdout.write(connection.settings_dict['NAME'])
+
+    def teardown(self, **options):
+        connection.creation.destroy_test_db(verbosity=0)
+
+    def worker(self, requests, concurrency, paths, **options):
+        overrides = {
+            'DEBUG': False,
+            'ALLOWED_HOSTS': [HOST],
+            'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+            'API_THROTTLE': {'RATES': {}},
+        }
+        with override_settings(**overrides):
+            application = get_wsgi_application()
+            for path in paths or PATHS:
+                for level in (int(level) for level in concurrency.split(',')):
+                    run_wsgi(application, path, min(requests, 50), level)  # warmup
+                    elapsed, timings, errors = run_wsgi(application, path, requests, level)
+                    self.stdout.write(json.dumps({
+                        'path': path, 'concurrency': level, 'requests': requests,
+                        'elapsed': elapsed, 'timings': timings, 'errors': errors,
+                    }))
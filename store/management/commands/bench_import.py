@@ -0,0 +1,70 @@
+import io
+import json
+import random
+import tempfile
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+
+from account.services import User
+from api.importers import ProductImporter, parse_rows, NDJSON
+from api.serializers import CreateProductSerializer
+from store.models import Category, Tag
+from utils.bench import benchmark_database, random_text
+
+IMAGES = 100
+
+
+class Command(BaseCommand):
+    help = 'Compares CreateProductSerializer one product at a time against the bulk import pipeline.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000)
+
+    def make_rows(self, count, category):
+        rnd = random.Random(0)
+        for _ in range(count):
+            yield {
+                'name': random_text(rnd, 3)[:100],
+                'description': random_text(rnd, 8)[:255],
+                'content': random_text(rnd, 40),
+                'category': category.name,
+                'price': rnd.randint(100, 10000),
+                'rating': rnd.randint(1, 5),
+                'tags': [f'tag {rnd.randint(0, 50)}' for _ in range(3)],
+                'attributes': [{'name': 'Цвет', 'value': random_text(rnd, 1)}, {'name': 'Размер', 'value': 'L'}],
+                'images': [f'product_images/bench-{rnd.randint(0, IMAGES - 1)}.webp'],
+            }
+
+    def handle(self, *args, rows, **options):
+        with benchmark_database(), tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            # the importer only takes images that were uploaded before
+            for i in range(IMAGES):
+                default_storage.save(f'product_images/bench-{i}.webp', io.BytesIO(b'image'))
+            user = User.objects.create_user(
+                email='bench@example.com', password='password', phone='+996700000000', role=User.SALESMAN,
+            )
+            category = Category.objects.create(name='Категория')
+            tags = {f'tag {i}': Tag.objects.create(name=f'tag {i}') for i in range(51)}
+
+            start = time.perf_counter()
+            with transaction.atomic():
+                for row in self.make_rows(rows, category):
+                    row = {**row, 'user': user.id, 'category': category.id, 'tags': [tags[name].id for name in row['tags']]}
+                    row.pop('images')
+                    serializer = CreateProductSerializer(data=row)
+                    serializer.is_valid(raise_exception=True)
+                    serializer.save()
+            serializer_elapsed = time.perf_counter() - start
+
+            stream = io.StringIO(''.join(json.dumps(row) + '\n' for row in self.make_rows(rows, category)))
+            start = time.perf_counter()
+            result = ProductImporter(user).run(parse_rows(stream, NDJSON))
+            importer_elapsed = time.perf_counter() - start
+            assert not result['errors'], result['errors'][:5]
+
+        self.stdout.write(f'CreateProductSerializer (no images) {rows / serializer_elapsed:8.0f} rows/s')
+        self.stdout.write(f'ProductImporter                     {rows / importer_elapsed:8.0f} rows/s')
@@ -0,0 +1,64 @@
+import base64
+import io
+import json
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.parsers import FastJSONParser
+from api.renderers import FastJSONRenderer, orjson
+from api.serializers import FastListProductSerializer
+from store.models import Product
+from utils.bench import benchmark_database, seed_products, measure
+
+
+class Command(BaseCommand):
+    help = 'Compares JSONRenderer/JSONParser with FastJSONRenderer/FastJSONParser on product payloads.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--image-size', type=int, default=5 * 1024 * 1024, help='Decoded bytes per image.')
+        parser.add_argument('--repeat', type=int, default=10)
+
+    def handle(self, *args, products, image_size, repeat, **options):
+        request = Request(APIRequestFactory().get('/api/v1/products/', SERVER_NAME='localhost'))
+
+        with benchmark_database():
+            seed_products(products, relations=True)
+            queryset = Product.objects.select_related('category').prefetch_related('tags', 'attributes', 'images')
+            page = {'count': products, 'next': None, 'previous': None, 'results': FastListProductSerializer(
+                queryset, many=True, context={'request': request},
+            ).data}
+
+        image = base64.b64encode(bytes(range(256)) * (image_size // 256)).decode()
+        body = json.dumps({
+            'name': 'Товар', 'description': 'Описание', 'content': 'Контент', 'price': '100.00',
+            'category': 1, 'tags': [1, 2], 'user': 1, 'images': [image, image],
+        }).encode()
+
+        self.stdout.write(f'backend: {"orjson " + orjson.__version__ if orjson else "stdlib json"}')
+        rendered = JSONRenderer().render(page)
+        self.stdout.write(f'render {products} products ({len(rendered) // 1024} KB)')
+        for name, renderer, overrides in (
+            ('JSONRenderer', JSONRenderer(), {}),
+            ('FastJSONRenderer', FastJSONRenderer(), {}),
+            ('FastJSONRenderer, stdlib', FastJSONRenderer(), {'API_JSON_BACKEND': 'json'}),
+        ):
+            with override_settings(**overrides):
+                assert renderer.render(page) == rendered
+                timing = measure(lambda: renderer.render(page), repeat=repeat)
+            self.stdout.write(f'  {name:26} {len(rendered) / timing.median / 2 ** 20:8.1f} MB/s  {timing}')
+
+        self.stdout.write(f'parse product create body with 2 base64 images ({len(body) // 1024} KB)')
+        for name, parser, overrides in (
+            ('JSONParser', JSONParser(), {}),
+            ('FastJSONParser', FastJSONParser(), {}),
+            ('FastJSONParser, stdlib', FastJSONParser(), {'API_JSON_BACKEND': 'json'}),
+        ):
+            with override_settings(**overrides):
+                timing = measure(lambda: parser.parse(io.BytesIO(body)), repeat=repeat)
+            self.stdout.write(f'  {name:26} {len(body) / timing.median / 2 ** 20:8.1f} MB/s  {timing}')
@@ -0,0 +1,51 @@
+import time
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.deletion import bulk_delete
+from store.models import Product, Category
+from utils.bench import benchmark_database, seed_products, count_queries
+
+
+def legacy_multiple_delete(queryset):
+    not_deleted_items = []
+    for item in queryset:
+        item_id = item.pk
+        try:
+            item.delete()
+        except django.db.models.deletion.ProtectedError:
+            not_deleted_items.append(item_id)
+    return not_deleted_items
+
+
+class Command(BaseCommand):
+    help = 'Compares the per-item multiple delete loop against the set-based bulk delete.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=5000)
+
+    def run(self, name, func, queryset):
+        result = {}
+        with transaction.atomic():
+            start = time.perf_counter()
+            queries = count_queries(lambda: result.update(not_deleted=func(queryset)))
+            elapsed = time.perf_counter() - start
+            transaction.set_rollback(True)
+        self.stdout.write(
+            f'  {name:8} {queries:7} queries  {elapsed * 1000:9.1f} ms  {len(result["not_deleted"])} not deleted'
+        )
+
+    def handle(self, *args, products, **options):
+        with benchmark_database():
+            seed_products(products, relations=True)
+            Category.objects.bulk_create([Category(name=f'Пустая {i}') for i in range(200)])
+
+            for title, queryset in (
+                (f'{products} products', Product.objects.all()),
+                (f'{Category.objects.count()} categories', Category.objects.all()),
+            ):
+                self.stdout.write(title)
+                self.run('legacy', legacy_multiple_delete, queryset)
+                self.run('bulk', bulk_delete, queryset)
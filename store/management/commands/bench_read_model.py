@@ -0,0 +1,36 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from api.read_models import rebuild_documents
+from utils.bench import benchmark_database, measure, seed_products, count_queries
+
+
+class Command(BaseCommand):
+    help = 'Compares the normalized product list against the denormalized read model.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=20_000)
+        parser.add_argument('--page-size', type=int, action='append', dest='page_sizes')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, products, page_sizes, repeat, **options):
+        client = APIClient()
+
+        with benchmark_database(), override_settings(ALLOWED_HOSTS=['*'], API_CACHE_TIMEOUT=0, API_THROTTLE={'RATES': {}}):
+            seed_products(products, relations=True)
+            rebuild_documents()
+            self.stdout.write(f'Seeded {products} products.')
+
+            for page_size in page_sizes or [20, 100, 1000]:
+                url = f'/api/v1/products/?_page_size={page_size}&_page=3'
+                for name, enabled in (('normalized', False), ('read model', True)):
+                    with override_settings(PRODUCT_LIST_READ_MODEL=enabled):
+                        def run():
+                            cache.clear()
+                            assert client.get(url).status_code == 200
+
+                        queries = count_queries(run)
+                        timing = measure(run, repeat=repeat)
+                    self.stdout.write(f'page size {page_size:5}  {name:11} {queries:2} queries  {timing}')
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from rest_framework.filters import SearchFilter
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.filters import FullTextSearchFilter
+from store.models import Product
+from store.search import get_search_backend
+from utils.bench import benchmark_database, measure, seed_products
+
+
+class SearchView:
+    search_fields = ['name', 'description', 'content']
+
+
+class Command(BaseCommand):
+    help = 'Compares DRF SearchFilter against the full-text search index on a seeded catalog.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100_000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--query', action='append', dest='queries')
+
+    def handle(self, *args, products, repeat, queries, **options):
+        queries = queries or ['телефон', 'беспроводной игр', 'laptop black']
+
+        with benchmark_database():
+            seed_products(products)
+            get_search_backend().rebuild()
+            self.stdout.write(f'Seeded {products} products.')
+
+            for query in queries:
+                request = Request(APIRequestFactory().get('/', {'search': query}))
+                for name, search_filter in (('SearchFilter', SearchFilter()), ('FTS5', FullTextSearchFilter())):
+                    def run():
+                        queryset = search_filter.filter_queryset(request, Product.objects.all(), SearchView())
+                        queryset.count()
+                        list(queryset[:20])
+
+                    self.stdout.write(f'{query!r:24} {name:14} {measure(run, repeat=repeat)}')
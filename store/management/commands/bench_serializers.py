@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.serializers import ListProductSerializer, FastListProductSerializer
+from store.models import Product
+from utils.bench import benchmark_database, seed_products, measure
+
+
+class Command(BaseCommand):
+    help = 'Measures rows per second of ListProductSerializer and its compiled read-only variant.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, sizes, repeat, **options):
+        sizes = [int(size) for size in sizes.split(',')]
+        request = Request(APIRequestFactory().get('/api/v1/products/', SERVER_NAME='localhost'))
+        renderer = JSONRenderer()
+
+        with benchmark_database():
+            seed_products(max(sizes), relations=True)
+            for size in sizes:
+                products = list(
+                    Product.objects.select_related('category')
+                    .prefetch_related('tags', 'attributes', 'images')[:size]
+                )
+                outputs = {}
+                for serializer_class in (ListProductSerializer, FastListProductSerializer):
+                    def run():
+                        return serializer_class(products, many=True, context={'request': request}).data
+
+                    timing = measure(run, repeat=repeat)
+                    outputs[serializer_class] = renderer.render(run())
+                    self.stdout.write(
+                        f'{serializer_class.__name__:26} {size:6} rows  '
+                        f'{size / timing.median:10.0f} rows/s  {timing}'
+                    )
+                identical = outputs[ListProductSerializer] == outputs[FastListProductSerializer]
+                self.stdout.write(f'{"":26} identical JSON: {identical}')
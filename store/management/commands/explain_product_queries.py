@@ -0,0 +1,96 @@
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from account.services import User
+from api.views import ProductViewSet
+from store.models import Product, Category, Tag
+from utils.bench import benchmark_database, seed_products
+
+ORDERINGS = (None, 'price', '-price', 'name', '-name', 'rating', '-rating', 'is_published', '-is_published')
+
+
+def get_filters():
+    category = Category.objects.values_list('pk', flat=True).first() or 1
+    tag = Tag.objects.values_list('pk', flat=True).first() or 1
+    user = User.objects.values_list('pk', flat=True).first() or 1
+    return [
+        {},
+        {'is_published': 'true'},
+        {'categories': category},
+        {'categories': category, 'min_price': 100, 'max_price': 1000},
+        {'tags': tag},
+        {'user': user},
+        {'receive_types': Product.IN_STOCK},
+        {'rating': 4},
+        {'is_published': 'true', 'min_price': 100, 'max_price': 1000},
+    ]
+
+
+def get_page_queryset(params):
+    """The page query ``ProductViewSet.list`` runs for ``params``."""
+    request = Request(APIRequestFactory().get('/api/v1/products/', params, SERVER_NAME='localhost'))
+    view = ProductViewSet(request=request, format_kwarg=None, action='list', kwargs={})
+    queryset = view.filter_queryset(view.get_queryset())
+    return queryset[:view.paginator.get_page_size(request)]
+
+
+def find_problems(plan, table):
+    """Full scans and sorts of ``table`` in an SQLite or PostgreSQL plan."""
+    problems = []
+    for line in plan.splitlines():
+        if connection.vendor == 'sqlite':
+            if f'SCAN {table}' in line and 'USING' not in line:
+                problems.append('full scan')
+            elif 'USE TEMP B-TREE FOR ORDER BY' in line:
+                problems.append('sort')
+        elif connection.vendor == 'postgresql':
+            if f'Seq Scan on {table}' in line:
+                problems.append('full scan')
+            elif line.strip(' ->').startswith('Sort '):
+                problems.append('sort')
+    return problems
+
+
+class Command(BaseCommand):
+    help = 'Runs EXPLAIN on the product list queries of every filter and ordering and reports full scans and sorts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=0,
+                            help='Explain against a temporary database seeded with this many products '
+                                 'instead of the current one.')
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every plan.')
+        parser.add_argument('--fail', action='store_true', help='Exit with an error when a query scans the table.')
+
+    def handle(self, *args, products, verbose_plans, fail, **options):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            self.stdout.write(self.style.WARNING(f'Plans of {connection.vendor} are printed but not checked.'))
+            verbose_plans = True
+
+        scans = 0
+        with benchmark_database() if products else nullcontext():
+            if products:
+                seed_products(products, relations=True)
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+
+            for params in get_filters():
+                for ordering in ORDERINGS:
+                    query = {**params, 'ordering': ordering} if ordering else params
+                    plan = get_page_queryset(query).explain()
+                    problems = find_problems(plan, Product._meta.db_table)
+                    scans += 'full scan' in problems
+                    label = '&'.join(f'{key}={value}' for key, value in query.items()) or '(no params)'
+                    if problems:
+                        self.stdout.write(self.style.WARNING(f'{label}: {", ".join(sorted(set(problems)))}'))
+                    elif verbose_plans:
+                        self.stdout.write(f'{label}: ok')
+                    if verbose_plans:
+                        self.stdout.write('    ' + plan.replace('\n', '\n    '))
+
+        if scans and fail:
+            raise CommandError(f'{scans} queries scan {Product._meta.db_table}.')
+        self.stdout.write(f'{len(get_filters()) * len(ORDERINGS)} queries explained, {scans} full scans.')
@@ -0,0 +1,263 @@
+import multiprocessing
+import random
+import time
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.utils import timezone
+
+from account.services import User
+from api.read_models import read_model_enabled, rebuild_documents
+from store import facets
+from store.models import Category, Product, ProductAttribute, ProductImage, Tag
+from store.search import get_search_backend
+from utils.bench import WORDS
+from utils.cache import bump_version
+
+ATTRIBUTES = ('Цвет', 'Материал', 'Бренд', 'Страна', 'Гарантия')
+RECEIVE_TYPES = [value for value, _ in Product.RECEIVE_TYPE]
+PRODUCT_FIELDS = (
+    'id', 'name', 'description', 'content', 'category', 'price', 'user', 'receive_type', 'rating', 'is_published',
+    'created_at', 'updated_at',
+)
+
+# ids of the users, categories and tags, set in every worker by init_worker
+_context = {}
+
+
+def init_worker(context):
+    _context.update(context)
+
+
+def text(rnd, words, length=None):
+    value = ' '.join(rnd.choices(WORDS, k=words))
+    return value[:length] if length else value
+
+
+def generate_chunk(index):
+    """
+    Rows of the ``index``-th chunk of products as plain tuples. Each product has
+    its own random generator and id, so the catalog does not depend on the
+    batch size, the number of workers or the order the chunks are done in.
+    """
+    seed, batch_size, count, first_id = (_context[key] for key in ('seed', 'batch_size', 'products', 'first_id'))
+    users, categories, tags = _context['users'], _context['categories'], _context['tags']
+    products, links, attributes, images = [], [], [], []
+
+    for number in range(index * batch_size, min((index + 1) * batch_size, count)):
+        rnd = random.Random(f'{seed}:{number}')
+        product_id = first_id + number
+        products.append((
+            product_id,
+            text(rnd, 3, 100),
+            text(rnd, 8, 255),
+            text(rnd, 60),
+            rnd.choice(categories),
+            Decimal(rnd.randint(100, 100000)) / 100,
+            rnd.choice(users),
+            rnd.choice(RECEIVE_TYPES),
+            Decimal(rnd.randint(10, 50)) / 10,
+            rnd.random() < 0.9,
+        ))
+        links.extend((product_id, tag) for tag in rnd.sample(tags, rnd.randint(0, min(5, len(tags)))))
+        attributes.extend(
+            (product_id, name, rnd.choice(WORDS)) for name in rnd.sample(ATTRIBUTES, rnd.randint(1, 3))
+        )
+        images.extend(
+            (product_id, f'product_images/generated/{product_id}-{i}.webp') for i in range(rnd.randint(1, 3))
+        )
+    return products, links, attributes, images
+
+
+def insert(cursor, model, fields, rows):
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(model._meta.get_field(name).column) for name in fields)
+    placeholders = ', '.join(['%s'] * len(fields))
+    cursor.executemany(f'INSERT INTO {quote(model._meta.db_table)} ({columns}) VALUES ({placeholders})', rows)
+
+
+def write_chunk(rows):
+    """
+    Inserts the rows of a chunk in one transaction. They bypass ``bulk_create``,
+    whose per-field preparation of model instances costs more than the inserts
+    themselves, so every column, defaults and timestamps included, is given here.
+    """
+    products, links, attributes, images = rows
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    with transaction.atomic(), connection.cursor() as cursor:
+        insert(cursor, Product, PRODUCT_FIELDS, [(*row, now, now) for row in products])
+        insert(cursor, Product.tags.through, ('product', 'tag'), links)
+        insert(cursor, ProductAttribute, ('product', 'name', 'value', 'created_at', 'updated_at'),
+               [(*row, now, now) for row in attributes])
+        insert(cursor, ProductImage, ('product', 'image', 'status', 'has_variants', 'created_at', 'updated_at'),
+               [(*row, ProductImage.READY, False, now, now) for row in images])
+    return len(products), len(links), len(attributes), len(images)
+
+
+def run_chunk(index):
+    return write_chunk(generate_chunk(index))
+
+
+def reserve_ids(model, count):
+    """
+    Moves the id sequence of ``model`` past ``count`` ids nobody else can take
+    and returns the first of them, so that rows inserted meanwhile by other
+    connections do not collide with the explicitly given ones.
+    """
+    table, column = model._meta.db_table, model._meta.pk.column
+    quote = connection.ops.quote_name
+    with transaction.atomic(), connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # inserts wait for the lock, so no other nextval() comes between these two
+            cursor.execute(f'LOCK TABLE {quote(table)} IN EXCLUSIVE MODE')
+            cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [table, column])
+            sequence = cursor.fetchone()[0]
+            cursor.execute('SELECT nextval(%s)', [sequence])
+            first = cursor.fetchone()[0]
+            cursor.execute('SELECT setval(%s, %s)', [sequence, first + count - 1])
+            return first
+        if connection.vendor == 'sqlite':
+            # AUTOINCREMENT never hands out ids up to sqlite_sequence; the first write takes the database lock
+            cursor.execute('UPDATE sqlite_sequence SET seq = seq WHERE name = %s', [table])
+            exists = cursor.rowcount > 0
+            cursor.execute(
+                f'SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = %s), 0), '
+                f'COALESCE((SELECT MAX({quote(column)}) FROM {quote(table)}), 0))',
+                [table],
+            )
+            first = cursor.fetchone()[0] + 1
+            if exists:
+                cursor.execute('UPDATE sqlite_sequence SET seq = %s WHERE name = %s', [first + count - 1, table])
+            else:
+                cursor.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)', [table, first + count - 1])
+            return first
+    raise CommandError(f'Reserving ids is not supported on {connection.vendor}.')
+
+
+class Command(BaseCommand):
+    help = (
+        'Generates a deterministic synthetic catalog: salesmen, categories, tags and products with tags, '
+        'attributes and images. The same --seed always produces the same rows, whatever the --batch-size; '
+        '--workers processes generate and write the chunks in parallel over their own connections, except on '
+        'SQLite.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100_000)
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--categories', type=int, default=50)
+        parser.add_argument('--tags', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000, help='Products per chunk and transaction.')
+        parser.add_argument('--workers', type=int, default=1)
+        parser.add_argument('--password', default='password', help='Password of every generated user.')
+        parser.add_argument('--skip-indexes', action='store_true',
+                            help='Do not rebuild the facet counters, the search index and the read model.')
+
+    def handle(self, *args, products, users, categories, tags, seed, batch_size, workers, password, skip_indexes,
+               **options):
+        if min(products, users, categories, tags, batch_size, workers) < 1:
+            raise CommandError(
+                '--products, --users, --categories, --tags, --batch-size and --workers must be positive.'
+            )
+        if not 0 <= seed < 100:
+            raise CommandError('--seed must be between 0 and 99, it is part of the generated phone numbers.')
+        if User.objects.filter(email=self.email(seed, 0)).exists():
+            raise CommandError(f'A catalog with seed {seed} was already generated, use another --seed.')
+
+        start = time.perf_counter()
+        context = {
+            'seed': seed,
+            'batch_size': batch_size,
+            'products': products,
+            'users': self.create_users(users, seed, password),
+            'categories': list(Category.objects.bulk_create(
+                [Category(name=f'Категория {seed}-{i}') for i in range(categories)]
+            )),
+            'tags': list(Tag.objects.bulk_create(
+                [Tag(name=f'{random.Random(f"{seed}:tag:{i}").choice(WORDS)}-{i}') for i in range(tags)]
+            )),
+            'first_id': reserve_ids(Product, products),
+        }
+        for key in ('users', 'categories', 'tags'):
+            context[key] = [instance.pk for instance in context[key]]
+        self.stdout.write(f'{users} users, {categories} categories, {tags} tags in {time.perf_counter() - start:.1f}s')
+
+        start = time.perf_counter()
+        totals = self.create_products(context, workers)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f'{totals[0]} products, {totals[1]} tag links, {totals[2]} attributes, {totals[3]} images '
+            f'in {elapsed:.1f}s, {totals[0] / elapsed:.0f} products/s, {sum(totals) / elapsed:.0f} rows/s'
+        )
+
+        if not skip_indexes:
+            self.rebuild_indexes()
+        # the rows bypassed the signals that invalidate the cached responses
+        for model in (Category, Tag, Product, ProductAttribute, ProductImage):
+            bump_version(model)
+        self.stdout.write(self.style.SUCCESS(
+            f'Catalog {seed} generated, products {context["first_id"]}-{context["first_id"] + products - 1}.'
+        ))
+
+    @staticmethod
+    def email(seed, index):
+        return f'seller-{seed}-{index}@example.com'
+
+    def create_users(self, count, seed, password):
+        # hashing is deliberately slow, one hash shared by every user keeps it out of the loop
+        encoded = make_password(password)
+        return User.objects.bulk_create([
+            User(
+                email=self.email(seed, i), phone=f'+9965{seed:02d}{i:06d}', password=encoded, role=User.SALESMAN,
+                first_name=f'Продавец {i}',
+            )
+            for i in range(count)
+        ], batch_size=1000)
+
+    def create_products(self, context, workers):
+        chunks = range((context['products'] + context['batch_size'] - 1) // context['batch_size'])
+        totals = [0, 0, 0, 0]
+
+        def add(counts):
+            for i, value in enumerate(counts):
+                totals[i] += value
+            self.stdout.write(f'  {totals[0]}/{context["products"]} products', ending='\r')
+            self.stdout.flush()
+
+        if workers > 1 and connection.vendor == 'sqlite':
+            # shipping the rows to the only writer costs more than generating them
+            self.stdout.write(self.style.WARNING('SQLite takes one writer at a time, generating in this process.'))
+            workers = 1
+
+        if workers == 1:
+            init_worker(context)
+            for index in chunks:
+                add(write_chunk(generate_chunk(index)))
+        else:
+            # the forked workers must open their own connections
+            connections.close_all()
+            with multiprocessing.get_context('fork').Pool(workers, init_worker, (context,)) as pool:
+                for result in pool.imap_unordered(run_chunk, chunks):
+                    add(result)
+
+        self.stdout.write('')
+        return totals
+
+    def rebuild_indexes(self):
+        start = time.perf_counter()
+        facets.rebuild()
+        self.stdout.write(f'facet counters rebuilt in {time.perf_counter() - start:.1f}s')
+
+        start = time.perf_counter()
+        backend = get_search_backend()
+        backend.ensure_index(force=True)
+        backend.rebuild(Product.objects.all())
+        self.stdout.write(f'search index rebuilt in {time.perf_counter() - start:.1f}s')
+
+        if read_model_enabled():
+            start = time.perf_counter()
+            rebuild_documents()
+            self.stdout.write(f'read model rebuilt in {time.perf_counter() - start:.1f}s')
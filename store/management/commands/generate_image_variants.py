@@ -0,0 +1,49 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from store.models import ProductImage
+from store.processing import generate_variants, process_image
+
+
+class Command(BaseCommand):
+    help = 'Generates missing size variants for processed product images.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pending', action='store_true',
+            help='Instead process uploads left pending, e.g. when a worker restarted before getting to them.',
+        )
+        parser.add_argument(
+            '--older-than', type=int, default=10, metavar='MINUTES',
+            help='With --pending, only uploads pending for longer than this, so queued ones are not taken twice.',
+        )
+
+    def handle(self, *args, **options):
+        if options['pending']:
+            return self.process_pending(options['older_than'])
+
+        generated = failed = 0
+        for product_image in ProductImage.objects.filter(status=ProductImage.READY).iterator(chunk_size=500):
+            try:
+                generate_variants(product_image)
+                generated += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f'{product_image.image.name}: {e}')
+        self.stdout.write(self.style.SUCCESS(f'Processed {generated} images, {failed} failed.'))
+
+    def process_pending(self, older_than):
+        if older_than < 0:
+            raise CommandError('--older-than must not be negative.')
+        pks = list(
+            ProductImage.objects
+            .filter(status=ProductImage.PENDING, updated_at__lt=timezone.now() - timedelta(minutes=older_than))
+            .values_list('pk', flat=True)
+        )
+        for pk in pks:
+            # logs and marks the image FAILED itself if it cannot be processed
+            process_image(pk)
+        failed = ProductImage.objects.filter(pk__in=pks, status=ProductImage.FAILED).count()
+        self.stdout.write(self.style.SUCCESS(f'Processed {len(pks) - failed} images, {failed} failed.'))
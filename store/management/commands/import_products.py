@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from account.services import User
+from api.importers import ProductImporter, parse_rows, guess_format, FORMATS
+
+
+class Command(BaseCommand):
+    help = 'Imports products from a CSV or NDJSON file on behalf of a salesman.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--user', required=True, help='Email of the salesman who owns the products')
+        parser.add_argument('--format', choices=FORMATS)
+        parser.add_argument('--batch-size', type=int, default=ProductImporter.batch_size)
+
+    def handle(self, *args, path, user, format, batch_size, **options):
+        try:
+            user = User.objects.get(email=user)
+        except User.DoesNotExist:
+            raise CommandError(f'User {user} does not exist.')
+
+        start = time.perf_counter()
+        with open(path, encoding='utf-8-sig', newline='') as stream:
+            result = ProductImporter(user, batch_size).run(parse_rows(stream, format or guess_format(path)))
+        elapsed = time.perf_counter() - start
+
+        for error in result['errors']:
+            self.stderr.write(f'row {error["row"]}: {error["errors"]}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {result["created"]} products, {len(result["errors"])} errors '
+            f'in {elapsed:.1f}s ({result["created"] / elapsed:.0f} rows/s).'
+        ))
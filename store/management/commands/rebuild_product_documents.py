@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from api.read_models import rebuild_documents
+from store.models import ProductListDocument
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the denormalized product list documents.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, batch_size, **options):
+        rebuild_documents(batch_size)
+        self.stdout.write(self.style.SUCCESS(f'Built {ProductListDocument.objects.count()} documents.'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from store.models import Product
+from store.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the product full-text search index.'
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        backend.ensure_index(force=True)
+        backend.rebuild(Product.objects.all())
+        self.stdout.write(self.style.SUCCESS(f'Indexed {Product.objects.count()} products.'))
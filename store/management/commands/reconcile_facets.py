@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from store import facets
+
+
+class Command(BaseCommand):
+    help = 'Compares the facet counters with the product table and rebuilds them when they drifted.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report the drift.')
+
+    def handle(self, *args, dry_run, **options):
+        expected, current = facets.expected_counts(), facets.current_counts()
+        drift = {cell: current[cell] - expected[cell] for cell in expected.keys() | current.keys()
+                 if current[cell] != expected[cell]}
+        for cell, delta in sorted(drift.items(), key=lambda item: str(item[0])):
+            self.stdout.write(f'  {dict(zip(facets.CELL_FIELDS, cell))}: {delta:+d}')
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS(f'{len(expected)} cells are up to date.'))
+        elif dry_run:
+            self.stdout.write(self.style.WARNING(f'{len(drift)} of {len(expected)} cells drifted.'))
+        else:
+            facets.rebuild()
+            self.stdout.write(self.style.SUCCESS(f'{len(drift)} drifted cells fixed, {len(expected)} cells rebuilt.'))
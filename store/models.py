@@ -1,7 +1,12 @@
+import hashlib
+import os
+
+from django.conf import settings
 from django.core.exceptions import ValidationError
 
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db import models
+from django.db.models import Q
 from django_resized import ResizedImageField
 
 from account.services import User
@@ -59,6 +64,19 @@ class Product(TimeStampAbstractModel):
         verbose_name = 'товар'
         verbose_name_plural = 'товары'
         ordering = ('-created_at',)
+        # ProductFilter filters combined with the ProductViewSet orderings, see explain_product_queries
+        indexes = [
+            # the default ordering, followed by the id tiebreaker of KeysetPagination
+            models.Index(fields=['-created_at', 'id'], name='product_created_idx'),
+            models.Index(fields=['is_published', '-created_at'], name='product_published_created_idx'),
+            models.Index(fields=['category', '-created_at'], name='product_category_created_idx'),
+            models.Index(fields=['category', 'price'], name='product_category_price_idx'),
+            models.Index(fields=['user', '-created_at'], name='product_user_created_idx'),
+            models.Index(fields=['price'], condition=Q(is_published=True), name='product_published_price_idx'),
+            models.Index(fields=['price'], name='product_price_idx'),
+            models.Index(fields=['name'], name='product_name_idx'),
+            models.Index(fields=['rating'], name='product_rating_idx'),
+        ]
 
     name = models.CharField('название', max_length=100)
     description = models.CharField('описание', max_length=255, help_text='Просто описание')
@@ -73,17 +91,33 @@ class Product(TimeStampAbstractModel):
                                          validators=[MinValueValidator(1), MaxValueValidator(5), example_validation])
     is_published = models.BooleanField('публичность', default=True)
 
+    @property
+    def first_image(self):
+        if 'images' in getattr(self, '_prefetched_objects_cache', {}):
+            images = self.images.all()
+            return images[0] if images else None
+        return self.images.first()
+
     @property
     def image(self):
-        if self.images.first():
-            return self.images.first().image
-        return None
+        product_image = self.first_image
+        return product_image.image if product_image else None
 
     def __str__(self):
         return f'{self.name}'
 
 
 class ProductImage(TimeStampAbstractModel):
+    PENDING = 'pending'
+    READY = 'ready'
+    FAILED = 'failed'
+
+    STATUS = (
+        (PENDING, 'В обработке'),
+        (READY, 'Готово'),
+        (FAILED, 'Ошибка обработки'),
+    )
+
     class Meta:
         verbose_name = 'изображение товара'
         verbose_name_plural = 'изображении товаров'
@@ -91,10 +125,37 @@ class ProductImage(TimeStampAbstractModel):
 
     product = models.ForeignKey('store.Product', models.CASCADE, related_name='images', verbose_name='товар')
     image = ResizedImageField('изображение', upload_to='product_images/', quality=90, force_format='WEBP')
+    status = models.CharField('статус обработки', choices=STATUS, default=READY, max_length=15)
+    has_variants = models.BooleanField('размеры сгенерированы', default=False)
+
+    VARIANTS_UPLOAD_TO = 'product_images/variants/'
+    FULL = 'full'
 
     def __str__(self):
         return f'{self.product.name}'
 
+    @staticmethod
+    def get_variant_sizes():
+        return getattr(settings, 'PRODUCT_IMAGE_VARIANTS', {'thumb': (150, 150), 'medium': (600, 600)})
+
+    def get_variant_name(self, variant):
+        # the digest of the whole path keeps images with the same file name in different directories apart
+        stem = os.path.splitext(os.path.basename(self.image.name))[0]
+        digest = hashlib.md5(self.image.name.encode()).hexdigest()[:8]
+        return f'{self.VARIANTS_UPLOAD_TO}{stem}-{digest}_{variant}.webp'
+
+    def get_variant_url(self, variant):
+        # the original is served until the variants are written, rows inserted in bulk never get them on their own
+        if variant == self.FULL or self.status != self.READY or not self.has_variants:
+            return self.image.url
+        return self.image.storage.url(self.get_variant_name(variant))
+
+    @property
+    def variant_urls(self):
+        variants = {variant: self.get_variant_url(variant) for variant in self.get_variant_sizes()}
+        variants[self.FULL] = self.image.url
+        return variants
+
 
 class ProductAttribute(TimeStampAbstractModel):
     class Meta:
@@ -108,3 +169,42 @@ class ProductAttribute(TimeStampAbstractModel):
 
     def __str__(self):
         return f'{self.name} - {self.value}'
+
+
+class ProductListDocument(TimeStampAbstractModel):
+    class Meta:
+        verbose_name = 'документ списка товаров'
+        verbose_name_plural = 'документы списка товаров'
+
+    product = models.OneToOneField('store.Product', models.CASCADE, primary_key=True, related_name='list_document',
+                                   verbose_name='товар')
+    data = models.JSONField('данные')
+
+    def __str__(self):
+        return f'{self.product_id}'
+
+
+class ProductFacetCount(models.Model):
+    """
+    Number of products per (category, tag, is_published, receive_type, price
+    bucket) cell; ``tag`` is empty on the cells that count each product once.
+    Maintained by ``store.signals``; a cell may be split across several rows,
+    readers always ``Sum`` the counts.
+    """
+    class Meta:
+        verbose_name = 'счетчик фасета'
+        verbose_name_plural = 'счетчики фасетов'
+        indexes = [
+            models.Index(fields=['category', 'tag', 'is_published', 'receive_type', 'price_bucket']),
+            models.Index(fields=['tag', 'category']),
+        ]
+
+    category = models.ForeignKey('store.Category', models.CASCADE, related_name='+', verbose_name='категория')
+    tag = models.ForeignKey('store.Tag', models.CASCADE, null=True, blank=True, related_name='+', verbose_name='тег')
+    is_published = models.BooleanField('публичность')
+    receive_type = models.CharField('условия получение', max_length=15)
+    price_bucket = models.PositiveSmallIntegerField('ценовой диапазон')
+    count = models.IntegerField('количество', default=0)
+
+    def __str__(self):
+        return f'{self.category_id}/{self.tag_id}: {self.count}'
@@ -0,0 +1,137 @@
+import io
+import logging
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from PIL import Image
+
+from store.models import ProductImage
+from utils.cache import bump_version
+
+logger = logging.getLogger(__name__)
+
+RAW_UPLOAD_TO = 'product_images/raw/'
+THREAD = 'thread'
+SYNC = 'sync'
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'IMAGE_PROCESSING_WORKERS', 2),
+            thread_name_prefix='image-processing',
+        )
+    return _executor
+
+
+def store_raw_image(product, file):
+    """
+    Saves the upload as is and queues the WEBP re-encoding for after the commit,
+    so the request does not wait for it.
+    """
+    extension = os.path.splitext(file.name or '')[1].lower()
+    storage = ProductImage._meta.get_field('image').storage
+    name = storage.save(f'{RAW_UPLOAD_TO}{uuid.uuid4().hex}{extension}', file)
+
+    product_image = ProductImage.objects.create(product=product, image=name, status=ProductImage.PENDING)
+    transaction.on_commit(lambda: enqueue(product_image.pk))
+    return product_image
+
+
+def enqueue(pk, task=None):
+    task = task or process_image
+    if getattr(settings, 'IMAGE_PROCESSING_MODE', THREAD) == SYNC:
+        task(pk)
+    else:
+        get_executor().submit(_run_in_thread, task, pk)
+
+
+def _run_in_thread(task, pk):
+    try:
+        task(pk)
+    finally:
+        connections.close_all()
+
+
+def process_image(pk):
+    product_image = ProductImage.objects.filter(pk=pk, status=ProductImage.PENDING).first()
+    if product_image is None:
+        return
+
+    raw_name = product_image.image.name
+    try:
+        with product_image.image.storage.open(raw_name, 'rb') as raw:
+            # ResizedImageFieldFile.save re-encodes to WEBP; django_cleanup removes the raw file.
+            product_image.image.save(os.path.basename(raw_name), File(raw), save=False)
+        generate_variants(product_image)
+        product_image.status = ProductImage.READY
+    except Exception:
+        logger.exception('Failed to process product image %s', pk)
+        product_image.image.name = raw_name
+        product_image.status = ProductImage.FAILED
+
+    product_image.save(update_fields=['image', 'status', 'has_variants', 'updated_at'])
+
+
+def generate_variants(product_image, quality=85):
+    """
+    Writes the downscaled WEBP variants of a processed image next to it; existing ones are kept.
+    Once they all exist the image is flagged with an ``update``, which sends no
+    ``post_save`` and so does not queue the variants once more; the cached responses
+    and the read-model document the signals would have refreshed are refreshed here.
+    """
+    # api.serializers imports this module
+    from api.read_models import read_model_enabled, schedule_refresh
+
+    storage = product_image.image.storage
+    missing = {
+        variant: size
+        for variant, size in product_image.get_variant_sizes().items()
+        if not storage.exists(product_image.get_variant_name(variant))
+    }
+
+    if missing:
+        with storage.open(product_image.image.name, 'rb') as file, Image.open(file) as image:
+            image.load()
+            for variant, size in missing.items():
+                thumb = image.copy()
+                thumb.thumbnail(size, Image.Resampling.LANCZOS)
+                buffer = io.BytesIO()
+                thumb.save(buffer, format='WEBP', quality=quality)
+                storage.save(product_image.get_variant_name(variant), ContentFile(buffer.getvalue()))
+
+    product_image.has_variants = True
+    if product_image.pk is None:
+        return
+    updated = ProductImage.objects.filter(
+        pk=product_image.pk, image=product_image.image.name, has_variants=False,
+    ).update(has_variants=True)
+    if updated:
+        bump_version(ProductImage)
+        if read_model_enabled():
+            schedule_refresh([product_image.product_id])
+
+
+def generate_variants_by_pk(pk):
+    product_image = ProductImage.objects.filter(pk=pk, status=ProductImage.READY).first()
+    if product_image is None:
+        return
+    try:
+        generate_variants(product_image)
+    except Exception:
+        logger.exception('Failed to generate variants of product image %s', pk)
+
+
+def delete_variants(name):
+    storage = ProductImage._meta.get_field('image').storage
+    product_image = ProductImage(image=name)
+    for variant in product_image.get_variant_sizes():
+        storage.delete(product_image.get_variant_name(variant))
@@ -0,0 +1,164 @@
+import re
+from functools import lru_cache, reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from store.models import Product
+
+DEFAULT_SEARCH_BACKEND = 'store.search.SQLiteFTS5SearchBackend'
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+class BaseSearchBackend:
+    """
+    Keeps a product search index and applies ranked search to product querysets.
+    """
+    fields = ('name', 'description', 'content')
+
+    def ensure_index(self, using=None, force=False):
+        pass
+
+    def index(self, products):
+        raise NotImplementedError
+
+    def delete(self, ids):
+        raise NotImplementedError
+
+    def rebuild(self, queryset=None):
+        raise NotImplementedError
+
+    def search(self, queryset, query):
+        raise NotImplementedError
+
+
+class ContainsSearchBackend(BaseSearchBackend):
+    """
+    No index at all: ``icontains`` over every field, the same as DRF ``SearchFilter``.
+    """
+
+    def index(self, products):
+        pass
+
+    def delete(self, ids):
+        pass
+
+    def rebuild(self, queryset=None):
+        pass
+
+    def search(self, queryset, query):
+        for term in WORD_RE.findall(query):
+            queryset = queryset.filter(reduce(or_, (Q(**{f'{field}__icontains': term}) for field in self.fields)))
+        return queryset
+
+
+class SQLiteFTS5SearchBackend(ContainsSearchBackend):
+    """
+    Inverted index in an FTS5 virtual table whose rowid is the product id.
+
+    Results are ranked with bm25, ``name`` weighing more than ``description``
+    and ``content``. Falls back to ``icontains`` on other database vendors.
+    """
+    table = 'store_product_fts'
+    weights = (10.0, 5.0, 1.0)
+    batch_size = 1000
+
+    def __init__(self):
+        self._ready = set()
+
+    def _connection(self, using=None):
+        return connections[using or router.db_for_write(Product)]
+
+    def _supported(self, connection):
+        return connection.vendor == 'sqlite'
+
+    def ensure_index(self, using=None, force=False):
+        connection = self._connection(using)
+        if not self._supported(connection) or (connection.alias in self._ready and not force):
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5('
+                f'{", ".join(self.fields)}, tokenize="unicode61 remove_diacritics 2")'
+            )
+        self._ready.add(connection.alias)
+
+    def index(self, products):
+        connection = self._connection()
+        if not self._supported(connection):
+            return
+        self.ensure_index(connection.alias)
+        rows = [(product.pk, *(getattr(product, field) for field in self.fields)) for product in products]
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s', [(row[0],) for row in rows])
+            cursor.executemany(self._insert_sql(), rows)
+
+    def delete(self, ids):
+        connection = self._connection()
+        if not self._supported(connection):
+            return
+        self.ensure_index(connection.alias)
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s', [(pk,) for pk in ids])
+
+    def rebuild(self, queryset=None):
+        connection = self._connection()
+        if not self._supported(connection):
+            return
+        self.ensure_index(connection.alias)
+        if queryset is None:
+            queryset = Product.objects.all()
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            rows = queryset.order_by().values_list('pk', *self.fields).iterator(chunk_size=self.batch_size)
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= self.batch_size:
+                    cursor.executemany(self._insert_sql(), batch)
+                    batch = []
+            if batch:
+                cursor.executemany(self._insert_sql(), batch)
+
+    def search(self, queryset, query):
+        connection = connections[queryset.db]
+        if not self._supported(connection):
+            return super().search(queryset, query)
+
+        match = self.build_match(query)
+        if not match:
+            return queryset
+        self.ensure_index(connection.alias)
+
+        # the rank is an annotation rather than extra(order_by=...), which the order_by() of the paginations
+        # would drop; the join stays in extra(), a correlated MATCH per row would be orders of magnitude slower
+        product_table = Product._meta.db_table
+        weights = ', '.join(str(weight) for weight in self.weights)
+        return queryset.extra(
+            tables=[self.table],
+            where=[f'{self.table}.rowid = {product_table}.id', f'{self.table} MATCH %s'],
+            params=[match],
+        ).annotate(
+            search_rank=RawSQL(f'bm25({self.table}, {weights})', (), output_field=FloatField()),
+        ).order_by('search_rank', 'pk')
+
+    @staticmethod
+    def build_match(query):
+        """Every word must match, as a prefix so that search-as-you-type works."""
+        return ' '.join(f'"{word}"*' for word in WORD_RE.findall(query))
+
+    def _insert_sql(self):
+        columns = ', '.join(self.fields)
+        placeholders = ', '.join(['%s'] * (len(self.fields) + 1))
+        return f'INSERT INTO {self.table}(rowid, {columns}) VALUES ({placeholders})'
+
+
+@lru_cache(maxsize=None)
+def get_search_backend():
+    return import_string(getattr(settings, 'PRODUCT_SEARCH_BACKEND', DEFAULT_SEARCH_BACKEND))()
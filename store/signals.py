@@ -0,0 +1,160 @@
+from weakref import WeakSet
+
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import pre_save, post_save, post_delete, post_migrate, m2m_changed, pre_delete
+from django.dispatch import receiver
+
+from store import facets
+from store.models import Product, ProductImage, ProductAttribute, Category, Tag
+from api.read_models import read_model_enabled, schedule_refresh
+from store.processing import enqueue, generate_variants_by_pk, delete_variants
+from store.search import get_search_backend
+from utils.cache import bump_version
+
+
+@receiver(post_save, sender=Product)
+def post_save_product_search_index(sender, instance: Product, *args, **kwargs):
+    get_search_backend().index([instance])
+
+
+@receiver(post_delete, sender=Product)
+def post_delete_product_search_index(sender, instance: Product, *args, **kwargs):
+    get_search_backend().delete([instance.pk])
+
+
+@receiver(post_save, sender=ProductImage)
+def post_save_product_image_variants(sender, instance: ProductImage, *args, **kwargs):
+    # process_image saves the image with its variants already written, it must not queue them again
+    if instance.status == ProductImage.READY and instance.image and not instance.has_variants:
+        transaction.on_commit(lambda: enqueue(instance.pk, generate_variants_by_pk))
+
+
+@receiver(post_delete, sender=ProductImage)
+def post_delete_product_image_variants(sender, instance: ProductImage, *args, **kwargs):
+    if instance.image:
+        name = instance.image.name
+        transaction.on_commit(lambda: delete_variants(name))
+
+
+@receiver(post_save, sender=Product)
+def post_save_product_list_document(sender, instance: Product, *args, **kwargs):
+    if read_model_enabled():
+        schedule_refresh([instance.pk])
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=ProductAttribute)
+@receiver(post_delete, sender=ProductAttribute)
+def product_relation_list_document(sender, instance, *args, **kwargs):
+    if read_model_enabled():
+        schedule_refresh([instance.product_id])
+
+
+@receiver(m2m_changed, sender=Product.tags.through)
+def m2m_changed_product_tags_list_document(sender, instance, action, reverse, pk_set, *args, **kwargs):
+    if not read_model_enabled() or action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        schedule_refresh([instance.pk])
+    elif action == 'pre_clear':
+        schedule_refresh(instance.product_set.values_list('pk', flat=True))
+    else:
+        schedule_refresh(pk_set)
+
+
+@receiver(post_save, sender=Category)
+def post_save_category_list_document(sender, instance: Category, created, *args, **kwargs):
+    if read_model_enabled() and not created:
+        schedule_refresh(instance.product_set.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def tag_list_document(sender, instance: Tag, *args, **kwargs):
+    if read_model_enabled() and not kwargs.get('created'):
+        schedule_refresh(instance.product_set.values_list('pk', flat=True))
+
+
+@receiver(pre_save, sender=Product)
+def pre_save_product_facets(sender, instance: Product, raw, *args, **kwargs):
+    if raw or instance._state.adding:
+        return
+    old = Product.objects.filter(pk=instance.pk).only('category_id', 'is_published', 'receive_type', 'price').first()
+    instance._facet_key = facets.product_key(old) if old else None
+
+
+@receiver(post_save, sender=Product)
+def post_save_product_facets(sender, instance: Product, created, raw, *args, **kwargs):
+    if raw:
+        return
+    key = facets.product_key(instance)
+    if created:
+        facets.apply(facets.product_cells(key, []))
+        return
+
+    old_key = instance.__dict__.pop('_facet_key', None)
+    if old_key is None or old_key == key:
+        return
+    tag_ids = list(instance.tags.values_list('pk', flat=True))
+    cells = facets.product_cells(old_key, tag_ids, -1)
+    cells.update(facets.product_cells(key, tag_ids))
+    facets.apply(cells)
+
+
+_counted_deletions = WeakSet()
+
+
+@receiver(pre_delete, sender=Product)
+def pre_delete_product_facets(sender, instance: Product, origin=None, *args, **kwargs):
+    # the tags are still there, and the counts go away in the same transaction as the rows
+    if isinstance(origin, QuerySet) and origin.model is Product:
+        # pre_delete comes for every product before any is deleted, count the whole queryset once
+        if origin not in _counted_deletions:
+            _counted_deletions.add(origin)
+            facets.count_products(origin.values_list('pk', flat=True), -1)
+        return
+    facets.count_products([instance.pk], -1)
+
+
+@receiver(post_delete, sender=Product)
+def post_delete_product_facets(sender, instance: Product, origin=None, *args, **kwargs):
+    # the deletion is over, deleting the same queryset object again has to be counted again
+    if isinstance(origin, QuerySet):
+        _counted_deletions.discard(origin)
+
+
+@receiver(m2m_changed, sender=Product.tags.through)
+def m2m_changed_product_tags_facets(sender, instance, action, reverse, pk_set, *args, **kwargs):
+    if action == 'post_add':
+        facets.count_links([(pk, instance.pk) if reverse else (instance.pk, pk) for pk in pk_set])
+    elif action in ('pre_remove', 'pre_clear'):
+        links = sender.objects.filter(**{'tag_id' if reverse else 'product_id': instance.pk})
+        if action == 'pre_remove':
+            links = links.filter(**{'product_id__in' if reverse else 'tag_id__in': pk_set})
+        facets.count_links(links.values_list('product_id', 'tag_id'), -1)
+
+
+def post_migrate_search_index(sender, using, *args, **kwargs):
+    get_search_backend().ensure_index(using, force=True)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=ProductAttribute)
+@receiver(post_delete, sender=ProductAttribute)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def bump_response_cache_version(sender, *args, **kwargs):
+    bump_version(sender)
+
+
+@receiver(m2m_changed, sender=Product.tags.through)
+def m2m_changed_product_tags_cache_version(sender, action, *args, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_version(Product)
@@ -1,3 +1,1332 @@
-from django.test import TestCase
+import base64
+import datetime
+import io
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import uuid
+from contextlib import nullcontext
+from decimal import Decimal
+from unittest import mock
+from urllib.parse import urlencode
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.handlers.asgi import ASGIHandler
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command, CommandError
+from django.db import connection, router
+from django.test import override_settings, SimpleTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.serializers import ModelSerializer
+from rest_framework.test import APITestCase, APIRequestFactory
+
+from account.services import User
+from store import facets
+from store.models import Product, Category, Tag, ProductAttribute, ProductImage, ProductListDocument, ProductFacetCount
+from store.processing import store_raw_image, process_image
+from api.fast_serializers import CompiledSerializerMixin
+from api.metrics import get_registry
+from api.importers import ProductImporter
+from api.parsers import FastJSONParser
+from api.renderers import FastJSONRenderer
+from api.throttling import api_buckets
+from api.read_models import rebuild_documents
+from utils import databases
+from utils.cache import get_versions
+from api.serializers import ListProductSerializer, DetailProductSerializer, ProductSerializer, ProductImageSerializer, \
+    ProductAttributeSerializer, CategorySerializer, TagSerializer, UpdateProductSerializer
+
+
+class ProductApiTestMixin:
+
+    def setUp(self):
+        cache.clear()
+        api_buckets.clear()
+
+    @classmethod
+    def create_catalog(cls, count):
+        cls.user = User.objects.create_user(
+            email='salesman@example.com', password='password', phone='+996700000001', role=User.SALESMAN,
+        )
+        cls.category = Category.objects.create(name='Категория')
+        cls.tags = [Tag.objects.create(name=f'Тег {i}') for i in range(3)]
+        for i in range(count):
+            product = Product.objects.create(
+                name=f'Товар {i}',
+                description='Описание',
+                content='Контент',
+                category=cls.category,
+                price=100 + i,
+                user=cls.user,
+                rating=4,
+            )
+            product.tags.add(*cls.tags)
+            ProductAttribute.objects.create(name='Цвет', value='Красный', product=product)
+            ProductImage.objects.create(product=product, image=f'product_images/{i}.webp')
+
+
+class ProductQueryCountTest(ProductApiTestMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_catalog(20)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_list_query_count_does_not_grow_with_page_size(self):
+        small = self.count_queries('/api/v1/products/?_page_size=2')
+        large = self.count_queries('/api/v1/products/?_page_size=20')
+        self.assertEqual(small, large)
+
+    def test_retrieve_query_count(self):
+        product = Product.objects.first()
+        self.assertEqual(self.count_queries(f'/api/v1/products/{product.id}/'), 4)
+
+    def test_list_image_uses_first_image(self):
+        product = Product.objects.first()
+        ProductImage.objects.create(product=product, image='product_images/newest.webp')
+        response = self.client.get('/api/v1/products/?_page_size=20')
+        item = next(item for item in response.data['results'] if item['id'] == product.id)
+        self.assertTrue(item['image'].endswith('product_images/newest.webp'))
+
+
+class ProductKeysetPaginationTest(ProductApiTestMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_catalog(7)
+        Product.objects.filter(name__in=['Товар 1', 'Товар 2']).update(price=500)
+
+    def walk(self, url):
+        ids, requests = [], 0
+        while url:
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(any('COUNT(' in query['sql'] for query in context.captured_queries))
+            ids += [item['id'] for item in response.data['results']]
+            url = response.data['next']
+            requests += 1
+        return ids, requests
+
+    def test_walk_default_ordering(self):
+        ids, requests = self.walk('/api/v1/products/?use_cursor=true&_page_size=3')
+        self.assertEqual(ids, list(Product.objects.order_by('-created_at', 'id').values_list('id', flat=True)))
+        self.assertEqual(requests, 3)
+
+    def test_walk_ordering_with_ties(self):
+        ids, _ = self.walk('/api/v1/products/?use_cursor=true&_page_size=2&ordering=-price')
+        self.assertEqual(ids, list(Product.objects.order_by('-price', 'id').values_list('id', flat=True)))
+
+    def test_previous_link(self):
+        first = self.client.get('/api/v1/products/?use_cursor=true&_page_size=3&ordering=name')
+        second = self.client.get(first.data['next'])
+        previous = self.client.get(second.data['previous'])
+        self.assertEqual(previous.data['results'], first.data['results'])
+        self.assertIsNone(previous.data['previous'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/v1/products/?use_cursor=true&_cursor=broken')
+        self.assertEqual(response.status_code, 404)
+
+
+class ProductStreamingListTest(ProductApiTestMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_catalog(5)
+
+    def test_stream_json_array(self):
+        paginated = self.client.get('/api/v1/products/?_page_size=20').json()
+        response = self.client.get('/api/v1/products/?use_pagination=false')
+        self.assertTrue(response.streaming)
+        self.assertEqual(json.loads(b''.join(response.streaming_content)), paginated['results'])
+
+    def test_stream_ndjson(self):
+        paginated = self.client.get('/api/v1/products/?_page_size=20').json()
+        response = self.client.get('/api/v1/products/?use_pagination=false&stream_format=ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual([json.loads(line) for line in lines], paginated['results'])
+
+    def test_stream_empty(self):
+        response = self.client.get('/api/v1/products/?use_pagination=false&min_price=100000')
+        self.assertEqual(json.loads(b''.join(response.streaming_content)), [])
+
+
+class ProductSearchTest(ProductApiTestMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_catalog(0)
+
+    def create_product(self, name, content='Контент'):
+        return Product.objects.create(
+            name=name, description='Описание', content=content, category=self.category, user=self.user, rating=4,
+        )
+
+    def search(self, query):
+        response = self.client.get('/api/v1/products/', {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data['results']]
+
+    def test_ranked_by_field_weight(self):
+        in_content = self.create_product('Чехол', content='Подходит для телефона')
+        in_name = self.create_product('Телефон красный')
+        self.create_product('Ноутбук')
+        self.assertEqual(self.search('телеф'), [in_name.id, in_content.id])
+
+    def test_all_words_must_match(self):
+        red = self.create_product('Телефон красный')
+        self.create_product('Телефон черный')
+        self.assertEqual(self.search('красный телефон'), [red.id])
+
+    def test_index_follows_save_and_delete(self):
+        product = self.create_product('Наушники')
+        product.name = 'Колонка'
+        product.save()
+        self.assertEqual(self.search('наушники'), [])
+        self.assertEqual(self.search('колонка'), [product.id])
+        product.delete()
+        self.assertEqual(self.search('колонка'), [])
+
+    def test_punctuation_only_query(self):
+        self.create_product('Телефон')
+        self.assertEqual(len(self.search('"*')), 1)
+
+    def test_ranked_with_cursor(self):
+        in_content = [self.create_product(f'Чехол {i}', content='Подходит для телефона') for i in range(2)]
+        in_name = [self.create_product(f'Телефон {i}') for i in range(2)]
+        ranked = self.search('телефон')
+        self.assertEqual(set(ranked[:2]), {product.id for product in in_name})
+
+        ids, url = [], '/api/v1/products/?' + urlencode({'search': 'телефон', 'use_cursor': 'true', '_page_size': 1})
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [item['id'] for item in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(ids, ranked)
+        self.assertEqual(len(ids), len(in_content) + len(in_name))
+
+
+@override_settings(API_CACHE_ENABLED=True)
+class ResponseCacheTest(ProductApiTestMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_catalog(3)
+
+    def test_hit_after_miss(self):
+        first = self.client.get('/api/v1/products/?ordering=price&_page=1')
+        with CaptureQueriesContext(connection) as context:
+            second = self.client.get('/api/v1/products/?_page=1&ordering=price&search=')
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(len(context.captured_queries), 0)
+        self.assertEqual(first.content, second.content)
+
+    def test_invalidated_by_related_save(self):
+        self.client.get('/api/v1/products/')
+        Tag.objects.create(name='Новый')
+        self.assertEqual(self.client.get('/api/v1/products/')['X-Cache'], 'MISS')
+
+    def test_not_invalidated_by_unrelated_save(self):
+        self.client.get('/api/v1/categories/')
+        Tag.objects.create(name='Новый')
+        self.assertEqual(self.client.get('/api/v1/categories/')['X-Cache'], 'HIT')
+
+    def test_invalidated_by_tags_change(self):
+        product = Product.objects.first()
+        self.client.get(f'/api/v1/products/{product.id}/')
+        product.tags.clear()
+        response = self.client.get(f'/api/v1/products/{product.id}/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['tags'], [])
+
+    def test_not_modified(self):
+        etag = self.client.get('/api/v1/products/')['ETag']
+        response = self.client.get('/api/v1/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_authenticated_not_cached(self):
+        self.client.force_authenticate(self.user)
+        self.client.get('/api/v1/products/')
+        self.assertNotIn('X-Cache', self.client.get('/api/v1/products/'))
+
+    def test_off_without_shared_cache(self):
+        with self.settings(API_CACHE_ENABLED=False):
+            self.client.get('/api/v1/products/')
+            self.assertNotIn('X-Cache', self.client.get('/api/v1/products/'))
+
+
+class MediaRootTestMixin:
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_override = override_settings(MEDIA_ROOT=cls.media_root, IMAGE_PROCESSING_MODE='sync')
+        cls.media_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+
+class ProductImportTest(MediaRootTestMixin, ProductApiTestMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_catalog(0)
+
+    def setUp(self):
+        super().setUp()
+        default_storage.save('product_images/1.webp', io.BytesIO(b'image'))
+
+    def upload(self, name, content):
+        self.client.force_authenticate(self.user)
+        file = SimpleUploadedFile(name, content.encode('utf-8'))
+        return self.client.post('/api/v1/products/import/', {'file': file}, format='multipart')
+
+    def test_csv(self):
+        response = self.upload('products.csv', (
+            'name,description,content,category,price,rating,tags,attributes,images\n'
+            'Телефон,Описание,Контент,Категория,100.50,4,Тег 0|Новый,Цвет=Красный|Память=128,product_images/1.webp\n'
+            f'Чехол,Описание,Контент,{self.category.id},10,5,,,\n'
+            'Кабель,Описание,Контент,Нет такой,10,5,,,\n'
+            'Зарядка,Описание,Контент,Категория,10,9,,,\n'
+        ))
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual([error['row'] for error in response.data['errors']], [4, 5])
+
+        product = Product.objects.get(name='Телефон')
+        self.assertEqual(product.user, self.user)
+        self.assertEqual(sorted(product.tags.values_list('name', flat=True)), ['Новый', 'Тег 0'])
+        self.assertEqual(product.attributes.count(), 2)
+        self.assertEqual(product.image.name, 'product_images/1.webp')
+        self.assertEqual(self.client.get('/api/v1/products/', {'search': 'чехол'}).data['count'], 1)
+
+    def test_ndjson(self):
+        rows = [
+            {'name': 'Телефон', 'description': 'Описание', 'content': 'Контент', 'category': 'Категория', 'rating': 4},
+            {'name': 'Телефон'},
+        ]
+        response = self.upload('products.ndjson', '\n'.join(json.dumps(row) for row in rows) + '\n{broken\n')
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual([error['row'] for error in response.data['errors']], [2, 3])
+
+    def test_nothing_created(self):
+        response = self.upload('products.csv', 'name,description,content,category,rating\nКабель,О,К,Нет такой,5\n')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['created'], 0)
+
+    def test_images_must_be_own_uploads(self):
+        other = User.objects.create_user(
+            email='other@example.com', password='password', phone='+996700000003', role=User.SALESMAN,
+        )
+        product = Product.objects.create(
+            name='Чужой', description='О', content='К', category=self.category, user=other, rating=4,
+        )
+        ProductImage.objects.create(product=product, image='product_images/1.webp')
+        default_storage.save('product_images/raw/upload.png', io.BytesIO(b'image'))
+        default_storage.save('product_images/variants/1-0123abcd_thumb.webp', io.BytesIO(b'image'))
+        header = 'name,description,content,category,rating,images\n'
+        for path in ('product_images/1.webp', 'avatars/secret.webp', 'product_images/../avatars/a.webp',
+                     'product_images/missing.webp', 'product_images/raw/upload.png',
+                     'product_images/variants/1-0123abcd_thumb.webp'):
+            response = self.upload('products.csv', f'{header}Телефон,О,К,Категория,4,{path}\n')
+            self.assertEqual(response.status_code, 400, path)
+            self.assertIn('images', response.data['errors'][0]['errors'])
+
+        product.delete()
+        response = self.upload('products.csv', f'{header}Телефон,О,К,Категория,4,product_images/1.webp\n')
+        self.assertEqual(response.status_code, 201)
+
+    def test_images_are_not_shared(self):
+        default_storage.save('product_images/2.webp', io.BytesIO(b'image'))
+        header = 'name,description,content,category,rating,images\n'
+        response = self.upload('products.csv', f'{header}Телефон,О,К,Категория,4,product_images/1.webp\n')
+        self.assertEqual(response.status_code, 201)
+
+        # not even the owner's own products may share a file: deleting one would delete it for both
+        response = self.upload('products.csv', f'{header}Телефон,О,К,Категория,4,product_images/1.webp\n')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('images', response.data['errors'][0]['errors'])
+
+        response = self.upload('products.csv', (
+            f'{header}'
+            'Чехол,О,К,Категория,4,product_images/2.webp\n'
+            'Кабель,О,К,Категория,4,product_images/2.webp\n'
+            'Зарядка,О,К,Категория,4,product_images/2.webp|product_images/2.webp\n'
+        ))
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([error['row'] for error in response.data['errors']], [3, 4])
+        self.assertEqual(ProductImage.objects.filter(image='product_images/2.webp').count(), 1)
+
+        importer = ProductImporter(self.user, batch_size=1)
+        rows = [{'name': name, 'description': 'О', 'content': 'К', 'category': 'Категория', 'rating': 4,
+                 'images': ['product_images/3.webp']} for name in ('Кабель', 'Зарядка')]
+        default_storage.save('product_images/3.webp', io.BytesIO(b'image'))
+        result = importer.run(enumerate(rows, start=2))
+        self.assertEqual((result['created'], [error['row'] for error in result['errors']]), (1, [3]))
+
+    def test_requires_salesman(self):
+        client = User.objects.create_user(email='client@example.com', password='password', phone='+996700000002')
+        self.client.force_authenticate(client)
+        file = SimpleUploadedFile('products.csv', b'name\n')
+        response = self.client.post('/api/v1/products/import/', {'file': file}, format='multipart')
+        self.assertEqual(response.status_code, 403)
+
+
+def make_image_file(name='photo.png', size=(800, 640), format='PNG'):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, format=format)
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+class ProductImageProcessingTest(MediaRootTestMixin, ProductApiTestMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_catalog(1)
+        cls.product = Product.objects.get()
+
+    def test_pending_image_variants_fall_back_to_upload(self):
+        product_image = store_raw_image(self.product, make_image_file())
+        self.assertEqual(set(product_image.variant_urls.values()), {product_image.image.url})
+
+    def test_upload_is_processed_after_commit(self):
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(
+                '/api/v1/product-images/', {'product': self.product.id, 'image': make_image_file()}, format='multipart',
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['status'], ProductImage.PENDING)
+        self.assertIn('product_images/raw/', response.data['image'])
+
+        for callback in callbacks:
+            callback()
+        response = self.client.get(f'/api/v1/product-images/{response.data["id"]}/')
+        self.assertEqual(response.data['status'], ProductImage.READY)
+        self.assertTrue(response.data['image'].endswith('.webp'))
+        self.assertNotIn('product_images/raw/', response.data['image'])
+        self.assertEqual(response.data['srcset']['full'], response.data['image'])
+
+        product_image = ProductImage.objects.get(id=response.data['id'])
+        for variant, size in (('thumb', 150), ('medium', 600)):
+            self.assertIn('product_images/variants/', response.data['srcset'][variant])
+            with Image.open(product_image.image.storage.open(product_image.get_variant_name(variant))) as image:
+                self.assertLessEqual(max(image.size), size)
+
+    def test_bulk_created_image_falls_back_until_variants_exist(self):
+        default_storage.save('product_images/a/1.webp', make_image_file())
+        default_storage.save('product_images/b/1.webp', make_image_file())
+        first, second = ProductImage.objects.bulk_create([
+            ProductImage(product=self.product, image='product_images/a/1.webp'),
+            ProductImage(product=self.product, image='product_images/b/1.webp'),
+        ])
+        self.assertEqual(first.get_variant_url('thumb'), first.image.url)
+        self.assertNotEqual(first.get_variant_name('thumb'), second.get_variant_name('thumb'))
+
+        call_command('generate_image_variants', stdout=io.StringIO())
+        first.refresh_from_db()
+        self.assertTrue(first.has_variants)
+        self.assertEqual(first.get_variant_url('thumb'), default_storage.url(first.get_variant_name('thumb')))
+
+    def test_stale_pending_images_are_processed(self):
+        product_image = store_raw_image(self.product, make_image_file())
+        broken = store_raw_image(self.product, SimpleUploadedFile('broken.png', b'not an image'))
+
+        out = io.StringIO()
+        call_command('generate_image_variants', '--pending', stdout=out)
+        self.assertIn('Processed 0 images, 0 failed.', out.getvalue())
+        product_image.refresh_from_db()
+        self.assertEqual(product_image.status, ProductImage.PENDING)
+
+        ProductImage.objects.filter(pk__in=[product_image.pk, broken.pk]).update(
+            updated_at=timezone.now() - datetime.timedelta(hours=1),
+        )
+        call_command('generate_image_variants', '--pending', '--older-than', '30', stdout=out)
+        self.assertIn('Processed 1 images, 1 failed.', out.getvalue())
+        product_image.refresh_from_db()
+        self.assertEqual(product_image.status, ProductImage.READY)
+        self.assertTrue(product_image.has_variants)
+
+    @override_settings(API_CACHE_ENABLED=True, PRODUCT_LIST_READ_MODEL=True)
+    def test_backfill_refreshes_cache_and_documents(self):
+        default_storage.save('product_images/backfill.webp', make_image_file())
+        product_image, = ProductImage.objects.bulk_create([
+            ProductImage(product=self.product, image='product_images/backfill.webp'),
+        ])
+        rebuild_documents()
+
+        def thumb(images):
+            return next(image['srcset']['thumb'] for image in images if image['id'] == product_image.id)
+
+        self.client.get('/api/v1/products/')
+        response = self.client.get('/api/v1/products/')
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertNotIn('product_images/variants/', thumb(response.json()['results'][0]['images']))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('generate_image_variants', stdout=io.StringIO())
+
+        document = ProductListDocument.objects.get(product=self.product)
+        self.assertIn('product_images/variants/', thumb(document.data['images']))
+        response = self.client.get('/api/v1/products/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertIn('product_images/variants/', thumb(response.json()['results'][0]['images']))
+
+    def test_processed_image_queues_no_variants(self):
+        product_image = store_raw_image(self.product, make_image_file())
+        with mock.patch('store.signals.enqueue') as enqueue, self.captureOnCommitCallbacks(execute=True):
+            process_image(product_image.pk)
+        enqueue.assert_not_called()
+        product_image.refresh_from_db()
+        self.assertTrue(product_image.has_variants)
+
+    def test_broken_image_fails(self):
+        product_image = store_raw_image(self.product, SimpleUploadedFile('broken.png', b'not an image'))
+        process_image(product_image.pk)
+        product_image.refresh_from_db()
+        self.assertEqual(product_image.status, ProductImage.FAILED)
+
+
+class ProductCreateBase64ImageTest(MediaRootTestMixin, ProductApiTestMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_catalog(0)
+
+    def create(self, images):
+        self.client.force_authenticate(self.user)
+        return self.client.post('/api/v1/products/', {
+            'name': 'Телефон',
+            'description': 'Описание',
+            'content': 'Контент',
+            'category': self.category.id,
+            'user': self.user.id,
+            'rating': 4,
+            'tags': [self.tags[0].id],
+            'images': images,
+        }, format='json')
+
+    def encode(self, prefix='data:image/jpeg;base64,', **kwargs):
+        return prefix + base64.b64encode(make_image_file(**kwargs).read()).decode('ascii')
+
+    def test_format_sniffed_from_content(self):
+        response = self.create([self.encode()])
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(ProductImage.objects.get().image.name.endswith('.png'))
+
+    @override_settings(IMAGE_UPLOAD_MAX_PIXELS=100)
+    def test_pixel_limit(self):
+        response = self.create([self.encode()])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Product.objects.exists())
+
+    @override_settings(IMAGE_UPLOAD_MAX_SIZE=10)
+    def test_size_limit(self):
+        self.assertEqual(self.create([self.encode(prefix='')]).status_code, 400)
+
+    def test_not_an_image(self):
+        payload = 'data:image/png;base64,' + base64.b64encode(b'<svg></svg>').decode('ascii')
+        self.assertEqual(self.create([payload, 'not base64!']).status_code, 400)
+
+
+class ProductListReadModelTest(ProductApiTestMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_catalog(5)
+
+    def test_same_output_as_serializer(self):
+        expected = self.client.get('/api/v1/products/?_page_size=20').json()
+        cache.clear()
+        rebuild_documents()
+        with override_settings(PRODUCT_LIST_READ_MODEL=True):
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get('/api/v1/products/?_page_size=20')
+        self.assertEqual(response.json(), expected)
+        self.assertEqual(len(context.captured_queries), 2)
+
+    @override_settings(PRODUCT_LIST_READ_MODEL=True)
+    def test_documents_follow_writes(self):
+        rebuild_documents()
+        product = Product.objects.first()
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductAttribute.objects.create(name='Размер', value='XL', product=product)
+            product.tags.remove(self.tags[0])
+            self.tags[1].name = 'Переименован'
+            self.tags[1].save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = 'Другая'
+            self.category.save()
+
+        data = ProductListDocument.objects.get(product=product).data
+        self.assertIn({'name': 'Размер', 'value': 'XL'}, [
+            {'name': attribute['name'], 'value': attribute['value']} for attribute in data['attributes']
+        ])
+        self.assertEqual([tag['name'] for tag in data['tags']], ['Переименован', 'Тег 2'])
+        self.assertEqual(data['category']['name'], 'Другая')
+
+
+class MultipleDeleteTest(ProductApiTestMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_catalog(3)
+        cls.admin = User.objects.create_superuser(email='admin@example.com', password='password', phone='+996700000003')
+
+    def test_protected_categories_are_kept(self):
+        empty = [Category.objects.create(name=f'Пустая {i}') for i in range(2)]
+        self.client.force_authenticate(self.admin)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post('/api/v1/categories/multiple-delete/', {
+                'ids': [self.category.id, *(category.id for category in empty), 999],
+            }, format='json')
+        self.assertEqual(response.status_code, 423)
+        self.assertEqual(response.data['not_deleted_items'], [self.category.id])
+        self.assertEqual(list(Category.objects.values_list('id', flat=True)), [self.category.id])
+        self.assertLess(len(context.captured_queries), 15)
+
+    def test_products_cascade(self):
+        ids = list(Product.objects.values_list('id', flat=True))
+        self.client.force_authenticate(self.user)
+        response = self.client.post('/api/v1/products/multiple-delete/', {'ids': ids[:2]}, format='json')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(list(Product.objects.values_list('id', flat=True)), ids[2:])
+        self.assertEqual(ProductAttribute.objects.count(), 1)
+        self.assertEqual(ProductImage.objects.count(), 1)
+
+
+class MultipleUpdateTest(ProductApiTestMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_catalog(3)
+        cls.other = User.objects.create_user(
+            email='other@example.com', password='password', phone='+996700000004', role=User.SALESMAN,
+        )
+
+    def test_per_row_results(self):
+        first, second, third = Product.objects.order_by('id')
+        foreign = Product.objects.create(
+            name='Чужой', description='Описание', content='Контент', category=self.category, user=self.other, rating=4,
+        )
+        self.client.force_authenticate(self.user)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.patch('/api/v1/products/multiple-update/', [
+                {'id': first.id, 'fields': {'price': '10.00'}},
+                {'id': second.id, 'fields': {'price': '20.00', 'name': 'Новое имя', 'tags': [self.tags[0].id]}},
+                {'id': third.id, 'fields': {'rating': '9'}},
+                {'id': foreign.id, 'fields': {'price': '1.00'}},
+                {'id': 'abc', 'fields': {}},
+            ], format='json')
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(
+            [(result['id'], result['status']) for result in response.data['results']],
+            [(first.id, 200), (second.id, 200), (third.id, 400), (foreign.id, 403), ('abc', 404)],
+        )
+        self.assertEqual(str(Product.objects.get(id=first.id).price), '10.00')
+        second.refresh_from_db()
+        self.assertEqual((second.name, str(second.price)), ('Новое имя', '20.00'))
+        self.assertEqual(list(second.tags.all()), [self.tags[0]])
+        self.assertEqual(str(Product.objects.get(id=foreign.id).price), '0.00')
+        self.assertEqual(self.client.get('/api/v1/products/', {'search': 'новое'}).data['count'], 1)
+        self.assertLess(len(context.captured_queries), 20)
+
+    def test_nothing_updated(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.patch('/api/v1/products/multiple-update/', [{'id': 0, 'fields': {}}], format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_custom_update_is_called(self):
+        product = Product.objects.first()
+        self.client.force_authenticate(self.user)
+        with mock.patch.object(
+            UpdateProductSerializer, 'update', autospec=True, side_effect=ModelSerializer.update,
+        ) as update:
+            response = self.client.patch(
+                '/api/v1/products/multiple-update/', [{'id': product.id, 'fields': {'price': '5.00'}}], format='json',
+            )
+        self.assertEqual(response.status_code, 200)
+        update.assert_called_once()
+        self.assertEqual(str(Product.objects.get(id=product.id).price), '5.00')
+
+    def test_requires_authentication(self):
+        product = Product.objects.first()
+        response = self.client.patch(
+            '/api/v1/products/multiple-update/', [{'id': product.id, 'fields': {'price': '1.00'}}], format='json',
+        )
+        self.assertIn(response.status_code, (401, 403))
+
+
+class FacetCountersTest(ProductApiTestMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_catalog(4)
+        cls.other_category = Category.objects.create(name='Другая категория')
+
+    def assertCountersUpToDate(self):
+        self.assertEqual(facets.current_counts(), facets.expected_counts())
+
+    def test_counters_follow_writes(self):
+        self.assertCountersUpToDate()
+        product = Product.objects.create(
+            name='Новый', description='Описание', content='Контент', category=self.category, price=700,
+            user=self.user, rating=4,
+        )
+        self.assertCountersUpToDate()
+        product.tags.add(*self.tags[:2])
+        self.assertCountersUpToDate()
+        product.category, product.price, product.is_published = self.other_category, 60000, False
+        product.save()
+        self.assertCountersUpToDate()
+        product.tags.remove(self.tags[0], self.tags[2])
+        self.assertCountersUpToDate()
+        self.tags[1].product_set.remove(product)
+        self.assertCountersUpToDate()
+        self.tags[2].product_set.add(product, Product.objects.first())
+        self.assertCountersUpToDate()
+        self.tags[2].product_set.clear()
+        self.assertCountersUpToDate()
+        product.tags.set(self.tags)
+        product.tags.clear()
+        self.assertCountersUpToDate()
+        product.delete()
+        self.tags[0].delete()
+        self.assertCountersUpToDate()
+
+    def test_bulk_writes(self):
+        first, second = Product.objects.order_by('id')[:2]
+        self.client.force_authenticate(self.user)
+        response = self.client.patch('/api/v1/products/multiple-update/', [
+            {'id': first.id, 'fields': {'price': '20000.00', 'receive_type': Product.IN_STOCK}},
+            {'id': second.id, 'fields': {'tags': [self.tags[0].id]}},
+        ], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertCountersUpToDate()
+
+        Product.objects.filter(pk__in=[first.pk, second.pk]).delete()
+        self.assertCountersUpToDate()
+
+        # the same queryset object deleted again matches other rows by then
+        queryset = Product.objects.filter(category=self.category)
+        queryset.delete()
+        Product.objects.create(
+            name='Новый', description='Описание', content='Контент', category=self.category, user=self.user, rating=4,
+        )
+        queryset.delete()
+        self.assertCountersUpToDate()
+
+    def test_reconcile(self):
+        ProductFacetCount.objects.filter(tag__isnull=True).update(count=0)
+        out = io.StringIO()
+        call_command('reconcile_facets', '--dry-run', stdout=out)
+        self.assertIn('drifted', out.getvalue())
+        self.assertNotEqual(facets.current_counts(), facets.expected_counts())
+
+        call_command('reconcile_facets', stdout=io.StringIO())
+        self.assertCountersUpToDate()
+
+    def assertFacets(self, url, params, source):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Facets'], source)
+        return response.data
+
+    def test_endpoints(self):
+        product = Product.objects.order_by('id').first()
+        product.category, product.price = self.other_category, 5000
+        product.save()
+        product.tags.remove(self.tags[0])
+
+        cases = [
+            ('/api/v1/categories/facets/', {}),
+            ('/api/v1/categories/facets/', {'tags': self.tags[0].id, 'min_price': 100}),
+            ('/api/v1/tags/facets/', {'categories': self.category.id, 'is_published': 'true', 'max_price': '4999.99'}),
+            ('/api/v1/products/price-facets/', {'receive_types': Product.ORDER}),
+            ('/api/v1/products/price-facets/', {'tags': self.tags[1].id}),
+        ]
+        for url, params in cases:
+            counted = self.assertFacets(url, params, 'counters')
+            # an unaligned price bound or a filter the counters do not know forces the GROUP BY path
+            queried = self.assertFacets(url, {**params, 'user': self.user.id}, 'query')
+            self.assertEqual(counted, queried, (url, params))
+
+        self.assertEqual(
+            self.assertFacets('/api/v1/categories/facets/', {}, 'counters'),
+            [
+                {'id': self.other_category.id, 'name': self.other_category.name, 'count': 1},
+                {'id': self.category.id, 'name': self.category.name, 'count': 3},
+            ],
+        )
+        self.assertEqual(
+            [tag['count'] for tag in self.assertFacets('/api/v1/tags/facets/', {'min_price': 101}, 'query')],
+            [3, 4, 4],
+        )
+        buckets = self.assertFacets('/api/v1/products/price-facets/', {}, 'counters')
+        self.assertEqual(buckets[1], {'bucket': 1, 'min': '100.00', 'max': '499.99', 'count': 3})
+        self.assertEqual(buckets[4]['count'], 1)
+        self.assertIsNone(buckets[-1]['max'])
+        self.assertEqual(self.client.get('/api/v1/tags/facets/', {'min_price': 'abc'}).status_code, 400)
+
+
+class ProductIndexTest(ProductApiTestMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_catalog(3)
+
+    def test_list_queries_use_indexes(self):
+        out = io.StringIO()
+        call_command('explain_product_queries', '--fail', stdout=out)
+        self.assertIn('0 full scans', out.getvalue())
+
+    def test_explain_seeded_catalog(self):
+        command = 'store.management.commands.explain_product_queries'
+        with mock.patch(f'{command}.benchmark_database', nullcontext), \
+                mock.patch(f'{command}.seed_products') as seed_products:
+            call_command('explain_product_queries', '--products', '50', stdout=io.StringIO())
+        seed_products.assert_called_once_with(50, relations=True)
+        with self.assertRaises(CommandError):
+            call_command('explain_product_queries', '--seed', '50', stdout=io.StringIO())
+
+
+class ReplicaRouterTest(ProductApiTestMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_catalog(2)
+
+    def test_profiles(self):
+        env = {'DATABASE_REPLICAS': '/data/replica.sqlite3'}
+        sqlite = databases.get_databases('sqlite-wal', 'db.sqlite3', env)
+        self.assertEqual(list(sqlite), ['default', 'replica_0'])
+        self.assertIn('journal_mode=WAL', sqlite['default']['OPTIONS']['init_command'])
+        self.assertEqual(sqlite['replica_0']['NAME'], 'file:/data/replica.sqlite3?mode=ro')
+        self.assertNotIn('journal_mode', sqlite['replica_0']['OPTIONS']['init_command'])
+
+        env = {'DATABASE_REPLICAS': 'replica-1, replica-2:6432', 'POSTGRES_DB': 'market'}
+        postgres = databases.get_databases('postgres-pool', 'db.sqlite3', env)
+        self.assertEqual([(db['HOST'], db['PORT']) for db in postgres.values()], [
+            ('localhost', '5432'), ('replica-1', '5432'), ('replica-2', '6432'),
+        ])
+        self.assertNotIn('CONN_MAX_AGE', postgres['default'])
+        self.assertEqual(databases.get_databases('postgres', '', {})['default']['CONN_MAX_AGE'], 600)
+        with self.assertRaises(ValueError):
+            databases.get_databases('mysql', '', {})
+
+    @override_settings(DATABASE_REPLICAS=['default'])
+    def test_product_reads_are_pinned(self):
+        with mock.patch('api.mixins.pin_replica', wraps=databases.pin_replica) as pinned:
+            self.assertEqual(self.client.get('/api/v1/products/').status_code, 200)
+            self.assertEqual(self.client.get(f'/api/v1/products/{Product.objects.first().id}/').status_code, 200)
+            self.assertEqual(pinned.call_count, 2)
+            self.client.force_authenticate(self.user)
+            self.client.post('/api/v1/products/', {}, format='json')
+            self.assertEqual(pinned.call_count, 2)
+        self.assertEqual(Product.objects.all().db, 'default')
+
+    @override_settings(DATABASE_REPLICAS=['default'], API_CACHE_ENABLED=True)
+    def test_cached_reads_use_primary(self):
+        with mock.patch('api.mixins.pin_replica', wraps=databases.pin_replica) as pinned:
+            self.assertEqual(self.client.get('/api/v1/products/')['X-Cache'], 'MISS')
+            self.assertEqual(self.client.get('/api/v1/products/')['X-Cache'], 'HIT')
+            self.assertEqual(pinned.call_count, 0)
+            self.client.force_authenticate(self.user)
+            self.assertEqual(self.client.get('/api/v1/products/').status_code, 200)
+            self.assertEqual(pinned.call_count, 1)
+
+    @override_settings(DATABASE_REPLICAS=['default'], API_CACHE_ENABLED=True)
+    def test_replica_reads_are_not_cached(self):
+        with databases.read_from_replica():
+            self.assertNotIn('X-Cache', self.client.get('/api/v1/categories/'))
+        self.assertEqual(self.client.get('/api/v1/categories/')['X-Cache'], 'MISS')
+
+
+@override_settings(DATABASE_REPLICAS=['replica_0'])
+class ReplicaRoutingTest(SimpleTestCase):
+    # outside of the TestCase transaction, which keeps every read on the primary
+
+    def test_router(self):
+        product = Product(pk=1)
+        product._state.db = 'replica_0'
+        with databases.read_from_replica():
+            self.assertEqual(Product.objects.all().db, 'replica_0')
+            self.assertEqual(router.db_for_write(Product, instance=product), 'default')
+        self.assertEqual(Product.objects.all().db, 'default')
+
+    def test_transaction_reads_primary(self):
+        with databases.read_from_replica(), mock.patch.object(connection, 'in_atomic_block', True):
+            self.assertEqual(Product.objects.all().db, 'default')
+
+
+class MetricsTest(ProductApiTestMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_catalog(3)
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        get_registry.cache_clear()
+        self.addCleanup(get_registry.cache_clear)
+
+    def scrape(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        return response.content.decode()
+
+    def test_server_timing(self):
+        response = self.client.get('/api/v1/products/')
+        timings = dict(part.split(';', 1) for part in response['Server-Timing'].split(', '))
+        self.assertEqual(list(timings), ['sql', 'serialize', 'render', 'total'])
+        self.assertIn('desc="5 queries"', timings['sql'])
+        self.assertGreater(float(timings['serialize'].split('=')[1]), 0)
+        self.assertGreater(float(timings['render'].split('=')[1]), 0)
+
+    @override_settings(DEBUG=True)
+    def test_not_adapted_under_asgi(self):
+        # the handler only logs the adaptations in DEBUG
+        with self.assertNoLogs('django.request', 'DEBUG'):
+            ASGIHandler()
+
+    async def test_server_timing_under_asgi(self):
+        response = await self.async_client.get('/api/v1/products/')
+        self.assertIn('desc="5 queries"', response['Server-Timing'])
+        response = await self.async_client.get('/api/v1/async/products/')
+        self.assertIn('Server-Timing', response)
+
+    @override_settings(API_CACHE_ENABLED=True)
+    def test_histograms(self):
+        self.client.get('/api/v1/products/')
+        self.client.get('/api/v1/products/')  # from the response cache
+        self.client.get('/api/v1/products/0/')
+        self.client.get('/api/v1/categories/')
+
+        text = self.scrape()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', text)
+        self.assertIn('http_request_sql_queries_bucket{view="ProductViewSet.list",le="0"} 1', text)
+        self.assertIn('http_request_sql_queries_bucket{view="ProductViewSet.list",le="2"} 1', text)
+        self.assertIn('http_request_sql_queries_bucket{view="ProductViewSet.list",le="5"} 2', text)
+        self.assertIn('http_request_sql_queries_sum{view="ProductViewSet.list"} 5', text)
+        self.assertIn('http_request_serialize_duration_seconds_count{view="CategoryViewSet.list"} 1', text)
+        self.assertIn('http_response_size_bytes_count{view="ProductViewSet.retrieve"} 1', text)
+        self.assertIn('http_responses_total{view="ProductViewSet.list",status="200"} 2', text)
+        self.assertIn('http_responses_total{view="ProductViewSet.retrieve",status="404"} 1', text)
+
+    def test_shared_directory(self):
+        with override_settings(METRICS={'DIRECTORY': self.directory, 'FLUSH_INTERVAL': 0}):
+            get_registry.cache_clear()
+            self.client.get('/api/v1/categories/')
+            self.assertEqual(len(os.listdir(self.directory)), 1)
+
+            # another worker, flushed earlier, and one that has exited since
+            snapshot = {'histograms': [], 'counters': [['http_responses_total', ['CategoryViewSet.list', '200'], 5]]}
+            exited = subprocess.Popen(['true'])
+            exited.wait()
+            for pid in (os.getppid(), exited.pid):
+                with open(os.path.join(self.directory, f'{pid}-other.json'), 'w') as file:
+                    json.dump(snapshot, file)
+            text = self.scrape()
+        self.assertIn('http_responses_total{view="CategoryViewSet.list",status="200"} 6', text)
+        self.assertNotIn(f'{exited.pid}-other.json', os.listdir(self.directory))
+
+    def test_streamed_body_is_measured(self):
+        response = self.client.get('/api/v1/products/?use_pagination=false')
+        self.assertNotIn('http_request_sql_queries_count{view="ProductViewSet.list"}', self.scrape())
+        size = len(b''.join(response.streaming_content))
+        response.close()
+
+        text = self.scrape()
+        self.assertIn('http_request_sql_queries_count{view="ProductViewSet.list"} 1', text)
+        self.assertNotIn('http_request_sql_queries_sum{view="ProductViewSet.list"} 0', text)
+        self.assertIn(f'http_response_size_bytes_sum{{view="ProductViewSet.list"}} {size}', text)
+
+    def test_scrape_is_local(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.1').status_code, 404)
+
+    @override_settings(METRICS={'TOKEN': 'secret'})
+    def test_scrape_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+        response = self.client.get('/metrics', REMOTE_ADDR='10.0.0.1', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+
+
+class AsyncReadViewTest(ProductApiTestMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_catalog(5)
+
+    async def compare(self, path, **headers):
+        expected = await sync_to_async(self.client.get)(f'/api/v1/{path}', headers=headers)
+        response = await self.async_client.get(f'/api/v1/async/{path}', headers=headers)
+        self.assertEqual(response.status_code, expected.status_code)
+        # pagination links point at the async endpoints
+        self.assertEqual(json.loads(response.content.replace(b'/async/', b'/')), expected.json())
+        return response
+
+    async def test_product_list_matches_sync(self):
+        await self.compare('products/')
+        await self.compare('products/?_page=2&_page_size=2')
+        await self.compare('products/?ordering=-price&min_price=102')
+        await self.compare('products/?search=Товар')
+        await self.compare('products/?use_cursor=true&_page_size=2')
+        await self.compare('products/?_page=9')
+
+    async def test_product_retrieve_matches_sync(self):
+        product = await Product.objects.afirst()
+        await self.compare(f'products/{product.id}/')
+        await self.compare('products/0/')
+
+    async def test_categories_and_tags_match_sync(self):
+        await self.compare('categories/')
+        await self.compare(f'categories/{self.category.id}/')
+        await self.compare('tags/')
+        await self.compare(f'tags/{self.tags[0].id}/')
+
+    async def test_authentication(self):
+        token = await sync_to_async(Token.objects.create)(user=self.user)
+        await self.compare('products/', authorization=f'Token {token.key}')
+        response = await self.compare('products/', authorization='Token wrong')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Token')
+        response = await self.async_client.get(
+            '/api/v1/async/products/?use_pagination=false', headers={'authorization': 'Token wrong'},
+        )
+        self.assertEqual(response.status_code, 401)
+
+    async def test_stream(self):
+        paginated = (await self.async_client.get('/api/v1/async/products/?_page_size=20')).json()
+        response = await self.async_client.get('/api/v1/async/products/?use_pagination=false&stream_format=ndjson')
+        self.assertTrue(response.streaming)
+        lines = b''.join([chunk async for chunk in response.streaming_content]).splitlines()
+        self.assertEqual([json.loads(line) for line in lines], paginated['results'])
+
+
+class CompiledSerializerParityTest(ProductApiTestMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_catalog(4)
+        Product.objects.create(
+            name='Без картинок', description='', content='', category=cls.category,
+            price='0.10', user=cls.user, rating='0.0', is_published=False,
+        )
+        ProductImage.objects.filter(product__name='Товар 0').update(status=ProductImage.PENDING)
+
+    def setUp(self):
+        super().setUp()
+        self.request = APIRequestFactory().get('/api/v1/products/')
+        self.products = list(
+            Product.objects.select_related('category', 'user').prefetch_related('tags', 'attributes', 'images')
+        )
+
+    def assertParity(self, serializer_class, instances, many=True):
+        compiled_class = type(f'Compiled{serializer_class.__name__}', (CompiledSerializerMixin, serializer_class), {})
+        for context in ({}, {'request': Request(self.request)}):
+            expected = serializer_class(instances, many=many, context=context).data
+            actual = compiled_class(instances, many=many, context=context).data
+            self.assertEqual(JSONRenderer().render(actual), JSONRenderer().render(expected))
+
+    def test_product_serializers(self):
+        self.assertParity(ListProductSerializer, self.products)
+        self.assertParity(DetailProductSerializer, self.products[0], many=False)
+        self.assertParity(ProductSerializer, self.products)
+
+    def test_related_serializers(self):
+        self.assertParity(ProductImageSerializer, ProductImage.objects.all())
+        self.assertParity(ProductAttributeSerializer, ProductAttribute.objects.all())
+        self.assertParity(CategorySerializer, Category.objects.all())
+        self.assertParity(TagSerializer, Tag.objects.all())
+
+    def test_custom_to_representation_is_kept(self):
+        class UpperTagSerializer(TagSerializer):
+            def to_representation(self, instance):
+                return {'name': instance.name.upper()}
+
+        self.assertParity(UpperTagSerializer, Tag.objects.all())
+
+    def test_fast_serializers_are_used(self):
+        response = self.client.get('/api/v1/products/?_page_size=20')
+        expected = ListProductSerializer(
+            Product.objects.prefetch_related('images').order_by('-created_at'), many=True,
+            context={'request': response.wsgi_request},
+        ).data
+        self.assertEqual(response.json()['results'], json.loads(JSONRenderer().render(expected)))
+
+
+class FastJSONTest(APITestCase):
+
+    def payload(self):
+        return {
+            'price': Decimal('10.50'),
+            'created_at': datetime.datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=datetime.timezone.utc),
+            'updated_at': timezone.localtime(datetime.datetime(2024, 5, 1, tzinfo=datetime.timezone.utc)),
+            'date': datetime.date(2024, 5, 1),
+            'uuid': uuid.UUID(int=1),
+            'lazy': gettext_lazy('Не найдено.'),
+            'text': 'строка \u2028 \u2029 "\\',
+            'results': [{'id': 1, 'tags': ('a', 'b'), 1: None, 'rating': 4.5, 'ok': True}],
+        }
+
+    def test_renderer_matches_json_renderer(self):
+        for media_type in (None, 'application/json', 'application/json; indent=2', 'application/json; indent=4'):
+            expected = JSONRenderer().render(self.payload(), media_type)
+            self.assertEqual(FastJSONRenderer().render(self.payload(), media_type), expected)
+            with self.settings(API_JSON_BACKEND='json'):
+                self.assertEqual(FastJSONRenderer().render(self.payload(), media_type), expected)
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+        self.assertEqual(FastJSONRenderer().render({'big': 2 ** 70}), JSONRenderer().render({'big': 2 ** 70}))
+
+    def test_parser_matches_json_parser(self):
+        body = json.dumps({'name': 'Товар', 'images': ['A' * 100000], 'price': 1.5}).encode()
+        expected = JSONParser().parse(io.BytesIO(body))
+        self.assertEqual(FastJSONParser().parse(io.BytesIO(body)), expected)
+        with self.settings(API_JSON_BACKEND='json'):
+            self.assertEqual(FastJSONParser().parse(io.BytesIO(body)), expected)
+
+        cp1251 = '{"name": "Товар"}'.encode('cp1251')
+        self.assertEqual(FastJSONParser().parse(io.BytesIO(cp1251), parser_context={'encoding': 'cp1251'}),
+                         {'name': 'Товар'})
+
+    def test_parser_errors(self):
+        for body in (b'{"name": ', b'{"price": NaN}', b'\xff'):
+            with self.assertRaises(ParseError):
+                FastJSONParser().parse(io.BytesIO(body))
+
+    def test_api_uses_fast_json(self):
+        response = self.client.post('/api/v1/auth/login/', '{"email": ', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('JSON parse error', response.json()['detail'])
+        response = self.client.get('/api/v1/categories/')
+        self.assertIsInstance(response.accepted_renderer, FastJSONRenderer)
+
+
+@override_settings(API_THROTTLE={
+    'RATES': {'user': '20/min', 'anon': '10/min'},
+    'COSTS': {'read': 1, 'list': 2, 'unpaginated': 100, 'write': 5, 'import': 15, 'bulk_write': 2},
+})
+class CostRateThrottleTest(ProductApiTestMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_catalog(3)
+
+    def test_list_costs_more_than_retrieve(self):
+        product = Product.objects.first()
+        for _ in range(4):
+            self.assertEqual(self.client.get('/api/v1/products/').status_code, 200)
+        self.assertEqual(self.client.get(f'/api/v1/products/{product.id}/').status_code, 200)
+        self.assertEqual(self.client.get('/api/v1/products/').status_code, 429)
+        response = self.client.get(f'/api/v1/products/{product.id}/')
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(f'/api/v1/products/{product.id}/')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '6')
+
+    def test_large_pages_and_unpaginated_lists(self):
+        # a page of 40 spans two default pages of 20
+        self.assertEqual(self.client.get('/api/v1/products/?_page_size=40').status_code, 200)
+        self.assertEqual(self.client.get('/api/v1/products/?_page_size=40').status_code, 200)
+        self.assertEqual(self.client.get('/api/v1/products/?_page_size=40').status_code, 429)
+        self.assertEqual(self.client.get('/api/v1/products/').status_code, 200)
+
+        api_buckets.clear()
+        # more than the bucket holds takes all of it
+        self.assertEqual(self.client.get('/api/v1/products/?use_pagination=false').status_code, 200)
+        response = self.client.get('/api/v1/products/?use_pagination=false')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '60')
+
+    def test_users_have_their_own_buckets(self):
+        self.assertEqual(self.client.get('/api/v1/products/?use_pagination=false').status_code, 200)
+        self.assertEqual(self.client.get('/api/v1/categories/').status_code, 429)
+        self.client.force_authenticate(self.user)
+        for _ in range(10):
+            self.assertEqual(self.client.get('/api/v1/categories/').status_code, 200)
+        self.assertEqual(self.client.get('/api/v1/categories/').status_code, 429)
+
+        with self.settings(API_THROTTLE={'RATES': {'user': None}}):
+            self.assertEqual(self.client.get('/api/v1/categories/').status_code, 200)
+
+    def test_forwarded_for_is_ignored(self):
+        self.assertEqual(self.client.get('/api/v1/products/?use_pagination=false').status_code, 200)
+        response = self.client.get('/api/v1/categories/', HTTP_X_FORWARDED_FOR='10.0.0.1')
+        self.assertEqual(response.status_code, 429)
+
+    def test_batches_cost_per_row(self):
+        products = list(Product.objects.values_list('id', flat=True))
+        self.client.force_authenticate(self.user)
+        response = self.client.patch('/api/v1/products/multiple-update/', [
+            {'id': pk, 'fields': {'price': '1.00'}} for pk in products
+        ], format='json')
+        self.assertEqual(response.status_code, 200)
+        # 3 rows took 6 of 20 tokens, then 14 are left for 7 rows but not for 8
+        response = self.client.post('/api/v1/products/multiple-delete/', {'ids': ['0'] * 8}, format='json')
+        self.assertEqual(response.status_code, 429)
+        response = self.client.post('/api/v1/products/import/', {}, format='multipart')
+        self.assertEqual(response.status_code, 429)
+        response = self.client.post('/api/v1/products/multiple-delete/', {'ids': ['0'] * 7}, format='json')
+        self.assertNotEqual(response.status_code, 429)
+
+    def test_cache_store(self):
+        with self.settings(API_THROTTLE={**settings.API_THROTTLE, 'STORE': 'cache', 'RATES': {'anon': '10/min'}}):
+            self.assertEqual(self.client.get('/api/v1/products/?use_pagination=false').status_code, 200)
+            self.assertEqual(self.client.get('/api/v1/categories/').status_code, 429)
+            self.assertEqual(len(api_buckets), 0)
+            cache.clear()
+            self.assertEqual(self.client.get('/api/v1/categories/').status_code, 200)
+
+    async def test_async_views(self):
+        response = await self.async_client.get('/api/v1/async/products/?use_pagination=false')
+        self.assertEqual(response.status_code, 200)
+        response = await self.async_client.get('/api/v1/async/products/')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '12')
+
+
+class SparseFieldsTest(ProductApiTestMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_catalog(5)
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        product_sql = next(query['sql'] for query in context.captured_queries if 'FROM "store_product"' in query['sql']
+                           and 'COUNT' not in query['sql'])
+        return response, len(context.captured_queries), product_sql
+
+    def test_fields_prune_output_and_queries(self):
+        full, full_queries, full_sql = self.get('/api/v1/products/')
+        sparse, sparse_queries, sparse_sql = self.get('/api/v1/products/?fields=id,name,price,image')
+
+        item = sparse.json()['results'][0]
+        self.assertEqual(list(item), ['id', 'image', 'name', 'price'])
+        self.assertEqual(item['image'], full.json()['results'][0]['image'])
+        # only the images prefetch of the image field is left
+        self.assertEqual((full_queries, sparse_queries), (5, 3))
+        self.assertLess(len(sparse.content) * 3, len(full.content))
+        self.assertNotIn('"store_product"."description"', sparse_sql)
+        self.assertIn('"store_product"."description"', full_sql)
+        self.assertNotIn('"store_product"."content"', full_sql)
+        self.assertNotIn('store_category', sparse_sql)
+
+    def test_relations_are_collapsed_unless_expanded(self):
+        response, queries, sql = self.get('/api/v1/products/?fields=id,category,tags')
+        item = response.json()['results'][0]
+        self.assertEqual(item, {'id': item['id'], 'category': self.category.id, 'tags': [tag.id for tag in self.tags]})
+        self.assertEqual(queries, 3)
+        self.assertNotIn('store_category', sql)
+
+        response, queries, sql = self.get('/api/v1/products/?fields=id,tags&expand=category')
+        item = response.json()['results'][0]
+        self.assertEqual(item['category']['name'], 'Категория')
+        self.assertEqual(item['tags'], [tag.id for tag in self.tags])
+        self.assertIn('store_category', sql)
+
+    def test_retrieve_and_stream(self):
+        product = Product.objects.first()
+        response, queries, sql = self.get(f'/api/v1/products/{product.id}/?fields=name,content')
+        self.assertEqual(response.json(), {'name': product.name, 'content': product.content})
+        self.assertEqual(queries, 1)
+
+        response = self.client.get('/api/v1/products/?use_pagination=false&fields=id,name')
+        items = json.loads(b''.join(response.streaming_content))
+        self.assertEqual([list(item) for item in items], [['id', 'name']] * 5)
+
+    def test_read_model_and_async_views_match(self):
+        url = '/api/v1/products/?fields=id,name,image,attributes,tags&expand=tags'
+        expected = self.client.get(url).json()
+        with self.settings(PRODUCT_LIST_READ_MODEL=True):
+            rebuild_documents()
+            self.assertEqual(self.client.get(url).json(), expected)
+        response = async_to_sync(self.async_client.get)(url.replace('/v1/', '/v1/async/'))
+        self.assertEqual(json.loads(response.content.replace(b'/async/', b'/')), expected)
+
+    def test_unknown_fields(self):
+        response = self.client.get('/api/v1/products/?fields=id,password&expand=user')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()), {'fields', 'expand'})
+        self.assertEqual(self.client.get('/api/v1/categories/?fields=id,name').json()[0], {
+            'id': self.category.id, 'name': 'Категория',
+        })
+
+
+class GenerateCatalogTest(ProductApiTestMixin, APITestCase):
+
+    def generate(self, batch_size):
+        call_command(
+            'generate_catalog', products=12, users=2, categories=3, tags=4, seed=7, batch_size=batch_size,
+            password='password', stdout=io.StringIO(),
+        )
+        products = Product.objects.order_by('id').select_related('category', 'user').prefetch_related(
+            'tags', 'attributes', 'images',
+        )
+        return [
+            (
+                product.name, product.content, product.price, product.rating, product.receive_type,
+                product.is_published, product.category.name, product.user.email,
+                sorted(tag.name for tag in product.tags.all()),
+                sorted((attribute.name, attribute.value) for attribute in product.attributes.all()),
+                len(product.images.all()),
+            )
+            for product in products
+        ]
+
+    def test_counts_and_determinism(self):
+        versions = get_versions([Product, Category, Tag])
+        rows = self.generate(batch_size=5)
+        self.assertEqual(len(rows), 12)
+        self.assertEqual(User.objects.filter(email__startswith='seller-7-').count(), 2)
+        self.assertEqual((Category.objects.count(), Tag.objects.count()), (3, 4))
+        self.assertEqual(ProductImage.objects.count(), sum(row[-1] for row in rows))
+        for old, new in zip(versions, get_versions([Product, Category, Tag])):
+            self.assertGreater(new, old)
+        self.assertEqual(facets.current_counts(), facets.expected_counts())
+
+        # the generated ids were reserved, a regular insert takes the next one
+        last = Product.objects.order_by('id').last()
+        created = Product.objects.create(
+            name='Новый', description='', content='', category=last.category, user=last.user, rating=4,
+        )
+        self.assertEqual(created.id, last.id + 1)
+
+        for model in (Product, User, Category, Tag):
+            model.objects.all().delete()
+        self.assertEqual(self.generate(batch_size=3), rows)
@@ -0,0 +1,172 @@
+import io
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from decimal import Decimal
+from urllib.parse import urlsplit
+
+from django.db import connections
+
+HOST = 'localhost'
+
+WORDS = (
+    'телефон', 'ноутбук', 'чехол', 'кабель', 'наушники', 'зарядка', 'монитор', 'клавиатура', 'мышь', 'планшет',
+    'красный', 'черный', 'белый', 'синий', 'новый', 'быстрый', 'беспроводной', 'игровой', 'компактный', 'мощный',
+    'phone', 'laptop', 'case', 'cable', 'headphones', 'charger', 'monitor', 'keyboard', 'mouse', 'tablet',
+)
+
+
+@contextmanager
+def benchmark_database(using='default'):
+    """
+    Runs the block against a freshly created test database, the same way ``manage.py test`` does,
+    so benchmarks never touch real data.
+    """
+    connection = connections[using]
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+class Timing:
+
+    def __init__(self, timings):
+        self.timings = sorted(timings)
+
+    def percentile(self, value):
+        index = min(len(self.timings) - 1, round(value / 100 * (len(self.timings) - 1)))
+        return self.timings[index]
+
+    @property
+    def median(self):
+        return statistics.median(self.timings)
+
+    def __str__(self):
+        return (
+            f'min {self.timings[0] * 1000:.2f}ms  '
+            f'p50 {self.median * 1000:.2f}ms  '
+            f'p95 {self.percentile(95) * 1000:.2f}ms  '
+            f'max {self.timings[-1] * 1000:.2f}ms'
+        )
+
+
+def measure(func, repeat=10, warmup=1):
+    for _ in range(warmup):
+        func()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return Timing(timings)
+
+
+def count_queries(func, using='default'):
+    """Counts the SQL queries ``func`` runs; unlike CaptureQueriesContext it is not capped by queries_log."""
+    queries = []
+
+    def wrapper(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    with connections[using].execute_wrapper(wrapper):
+        func()
+    return len(queries)
+
+
+def random_text(rnd, words):
+    return ' '.join(rnd.choice(WORDS) for _ in range(words))
+
+
+def seed_products(count, seed=0, batch_size=2000, relations=False):
+    from account.services import User
+    from store.models import Category, Product, Tag, ProductAttribute, ProductImage
+
+    rnd = random.Random(seed)
+    user = User.objects.create_user(
+        email=f'bench-{seed}@example.com', password='password', phone=f'+99670{seed:07d}', role=User.SALESMAN,
+    )
+    categories = Category.objects.bulk_create([Category(name=f'Категория {seed}-{i}') for i in range(20)])
+    tags = Tag.objects.bulk_create([Tag(name=word) for word in WORDS])
+
+    for start in range(0, count, batch_size):
+        products = Product.objects.bulk_create([
+            Product(
+                name=random_text(rnd, 3)[:100],
+                description=random_text(rnd, 8)[:255],
+                content=random_text(rnd, 60),
+                category=rnd.choice(categories),
+                price=Decimal(rnd.randint(100, 100000)) / 100,
+                user=user,
+                receive_type=rnd.choice(Product.RECEIVE_TYPE)[0],
+                rating=Decimal(rnd.randint(10, 50)) / 10,
+            )
+            for _ in range(start, min(start + batch_size, count))
+        ])
+        if not relations:
+            continue
+
+        Through = Product.tags.through
+        Through.objects.bulk_create([
+            Through(product_id=product.id, tag_id=tag.id)
+            for product in products
+            for tag in rnd.sample(tags, 3)
+        ])
+        ProductAttribute.objects.bulk_create([
+            ProductAttribute(product=product, name=name, value=rnd.choice(WORDS))
+            for product in products
+            for name in ('Цвет', 'Материал')
+        ])
+        ProductImage.objects.bulk_create([
+            ProductImage(product=product, image=f'product_images/{product.id}-{i}.webp')
+            for product in products
+            for i in range(rnd.randint(1, 3))
+        ])
+
+
+def wsgi_request(application, url):
+    path = urlsplit(url)
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'SCRIPT_NAME': '',
+        'PATH_INFO': path.path,
+        'QUERY_STRING': path.query,
+        'SERVER_NAME': HOST,
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': HOST,
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    statuses = []
+    response = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+    try:
+        for _ in response:
+            pass
+    finally:
+        response.close()
+    return int(statuses[0].split()[0])
+
+
+def run_wsgi(application, path, requests, concurrency):
+    """Sends ``requests`` GETs from ``concurrency`` threads; returns (elapsed, timings, errors)."""
+    def one(_):
+        start = time.perf_counter()
+        status = wsgi_request(application, path)
+        return time.perf_counter() - start, status
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        results = list(executor.map(one, range(requests)))
+    elapsed = time.perf_counter() - start
+    return elapsed, [timing for timing, _ in results], sum(status != 200 for _, status in results)
@@ -0,0 +1,103 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+
+VERSION_KEY = 'version:{}'
+STATS_KEY = 'stats:{}'
+
+
+def get_cache(alias='default'):
+    return caches[alias]
+
+
+def _label(model):
+    return model._meta.label_lower
+
+
+def _initial_version():
+    # A version key that was evicted must never come back with a value an old entry was stored under.
+    return int(time.time() * 1000)
+
+
+def get_versions(models, alias='default'):
+    cache = get_cache(alias)
+    keys = [VERSION_KEY.format(_label(model)) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _initial_version(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_version(model, alias='default'):
+    cache = get_cache(alias)
+    key = VERSION_KEY.format(_label(model))
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, _initial_version(), timeout=None)
+
+
+def incr_stat(name, alias='default'):
+    cache = get_cache(alias)
+    key = STATS_KEY.format(name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def get_stats(names=('hit', 'miss'), alias='default'):
+    values = get_cache(alias).get_many([STATS_KEY.format(name) for name in names])
+    return {name: values.get(STATS_KEY.format(name), 0) for name in names}
+
+
+class LocalTTLCache:
+    """
+    Thread-safe in-process LRU cache whose entries also expire after ``ttl`` seconds.
+    """
+
+    def __init__(self, max_size=10000, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_where(self, predicate):
+        with self._lock:
+            for key in [key for key, (_, value) in self._data.items() if predicate(value)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
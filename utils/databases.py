@@ -0,0 +1,135 @@
+import os
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections, DEFAULT_DB_ALIAS
+
+PROFILES = ('sqlite', 'sqlite-wal', 'postgres', 'postgres-pool')
+SQLITE_PRAGMAS = (
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA mmap_size=268435456',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA busy_timeout=5000',
+)
+
+_replica = ContextVar('replica', default=None)
+
+
+def get_databases(profile, sqlite_path, environ=os.environ):
+    """
+    ``DATABASES`` of a profile:
+
+    * ``sqlite`` - the Django defaults;
+    * ``sqlite-wal`` - WAL journal, ``synchronous=NORMAL``, memory mapped reads and persistent connections;
+    * ``postgres`` - persistent connections (``CONN_MAX_AGE``) with health checks;
+    * ``postgres-pool`` - the psycopg 3 connection pool of the backend.
+
+    ``DATABASE_REPLICAS`` adds read-only ``replica_<n>`` aliases: comma separated ``host[:port]`` for
+    Postgres, database files for SQLite (the primary file itself is a local stand-in).
+    """
+    if profile not in PROFILES:
+        raise ValueError(f'Unknown database profile {profile!r}, use one of {", ".join(PROFILES)}.')
+    replicas = [replica.strip() for replica in environ.get('DATABASE_REPLICAS', '').split(',') if replica.strip()]
+    conn_max_age = int(environ.get('CONN_MAX_AGE', 600))
+
+    if profile.startswith('sqlite'):
+        primary = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': environ.get('SQLITE_PATH', sqlite_path)}
+        if profile == 'sqlite-wal':
+            primary.update({
+                'CONN_MAX_AGE': conn_max_age,
+                'OPTIONS': {
+                    'init_command': ';'.join(('PRAGMA journal_mode=WAL', *SQLITE_PRAGMAS)),
+                    'transaction_mode': 'IMMEDIATE',
+                },
+            })
+        databases = {DEFAULT_DB_ALIAS: primary}
+        for index, path in enumerate(replicas):
+            # the journal mode is kept in the file, a read-only connection cannot switch it
+            databases[f'replica_{index}'] = {
+                **primary,
+                'NAME': f'file:{path}?mode=ro',
+                'OPTIONS': {'init_command': ';'.join(SQLITE_PRAGMAS)} if profile == 'sqlite-wal' else {},
+                'TEST': {'MIRROR': DEFAULT_DB_ALIAS},
+            }
+        return databases
+
+    primary = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': environ.get('POSTGRES_DB', 'market'),
+        'USER': environ.get('POSTGRES_USER', 'postgres'),
+        'PASSWORD': environ.get('POSTGRES_PASSWORD', ''),
+        'HOST': environ.get('POSTGRES_HOST', 'localhost'),
+        'PORT': environ.get('POSTGRES_PORT', '5432'),
+    }
+    if profile == 'postgres-pool':
+        # the pool owns the connections, so CONN_MAX_AGE has to stay 0
+        primary['OPTIONS'] = {'pool': {
+            'min_size': int(environ.get('DATABASE_POOL_MIN_SIZE', 2)),
+            'max_size': int(environ.get('DATABASE_POOL_MAX_SIZE', 20)),
+        }}
+    else:
+        primary.update({'CONN_MAX_AGE': conn_max_age, 'CONN_HEALTH_CHECKS': True})
+
+    databases = {DEFAULT_DB_ALIAS: primary}
+    for index, replica in enumerate(replicas):
+        host, _, port = replica.partition(':')
+        databases[f'replica_{index}'] = {
+            **primary, 'HOST': host, 'PORT': port or primary['PORT'], 'TEST': {'MIRROR': DEFAULT_DB_ALIAS},
+        }
+    return databases
+
+
+def get_replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def pin_replica():
+    """Sends the following reads of this thread or task to a random replica; returns the token for ``unpin_replica``."""
+    replicas = get_replicas()
+    return _replica.set(random.choice(replicas) if replicas else None)
+
+
+def unpin_replica(token):
+    _replica.reset(token)
+
+
+def pinned_replica():
+    """The replica alias the reads of this thread or task are pinned to, if any."""
+    return _replica.get()
+
+
+@contextmanager
+def read_from_replica():
+    token = pin_replica()
+    try:
+        yield
+    finally:
+        unpin_replica(token)
+
+
+class ReplicaRouter:
+    """
+    Reads go to the replica pinned by ``read_from_replica`` unless the primary
+    is inside a transaction; everything else uses the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = _replica.get()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        # instances read from a replica must still be saved to the primary
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return False if db in get_replicas() else None
@@ -1,30 +1,117 @@
 import base64
+import binascii
+import io
+import tempfile
 
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files import File
+from PIL import Image
 
+# base64 characters per step; a multiple of 4 so that every step decodes on its own
+BASE64_CHUNK_SIZE = 64 * 1024
+HEADER_PROBE_LIMIT = 1024 * 1024
+SPOOL_MAX_SIZE = 1024 * 1024
 
-def base64_to_image_file(base64_string, filename='image'):
+MAGIC_NUMBERS = (
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+    (b'BM', 'bmp'),
+)
+
+
+class ImageDecodeError(ValueError):
+    pass
+
+
+def sniff_image_format(head):
+    """Returns the file extension for the image format given its first bytes, or ``None``."""
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    for magic, _format in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return _format
+    return None
+
+
+def _image_pixels(fp):
+    try:
+        with Image.open(fp) as image:
+            width, height = image.size
+    except Exception:
+        return None
+    return width * height
+
+
+def base64_to_image_file(base64_string, filename='image', max_size=None, max_pixels=None):
     """
-    Converts a base64 string to a Django ContentFile suitable for ImageField or FileField.
+    Converts a base64 string to a Django File suitable for ImageField or FileField.
+
+    The string is decoded chunk by chunk into a spooled temporary file, so the
+    decoded image never sits in memory next to the whole base64 string. The
+    size and pixel limits are enforced before the payload is fully decoded and
+    the format is taken from the magic bytes, not from the ``data:`` prefix.
 
-    :param base64_string: The base64-encoded string of the image
-    :param filename: The name to assign to the file
-    :return: A ContentFile object that can be saved to a Django model
+    :param base64_string: The base64-encoded string of the image, optionally with a ``data:...;base64,`` prefix
+    :param filename: The name to assign to the file, without extension
+    :param max_size: Max decoded size in bytes, ``IMAGE_UPLOAD_MAX_SIZE`` by default
+    :param max_pixels: Max width * height, ``IMAGE_UPLOAD_MAX_PIXELS`` by default
+    :return: A File object that can be saved to a Django model
     """
-    # Strip the data prefix if it exists (e.g., 'data:image/jpeg;base64,')
+    max_size = max_size or getattr(settings, 'IMAGE_UPLOAD_MAX_SIZE', 15 * 1024 * 1024)
+    max_pixels = max_pixels or getattr(settings, 'IMAGE_UPLOAD_MAX_PIXELS', Image.MAX_IMAGE_PIXELS)
+
+    # Strip the data prefix if it exists (e.g., 'data:image/jpeg;base64,') without copying the string
+    offset = 0
+    prefix_end = base64_string.find('base64,', 0, 256)
+    if prefix_end != -1:
+        offset = prefix_end + len('base64,')
+
+    if (len(base64_string) - offset) // 4 * 3 > max_size + 3:
+        raise ImageDecodeError('Изображение слишком большое.')
+
+    output = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    head, _format, pixels, size, carry = b'', None, None, 0, ''
+
+    try:
+        for start in range(offset, len(base64_string), BASE64_CHUNK_SIZE):
+            chunk = carry + ''.join(base64_string[start:start + BASE64_CHUNK_SIZE].split())
+            usable = len(chunk) - len(chunk) % 4
+            decoded = base64.b64decode(chunk[:usable], validate=True)
+            carry = chunk[usable:]
 
-    _format = 'jpg'
+            size += len(decoded)
+            if size > max_size:
+                raise ImageDecodeError('Изображение слишком большое.')
 
-    if 'data:' in base64_string:
-        _format = base64_string.split(';')[0].split(':')[1].split('/')[1]
+            if pixels is None and len(head) < HEADER_PROBE_LIMIT:
+                head += decoded
+                _format = _format or sniff_image_format(head)
+                if _format is None and len(head) >= 12:
+                    raise ImageDecodeError('Неподдерживаемый формат изображения.')
+                pixels = _image_pixels(io.BytesIO(head))
+                if pixels is not None and pixels > max_pixels:
+                    raise ImageDecodeError('Слишком большое разрешение изображения.')
 
-    if 'base64,' in base64_string:
-        base64_string = base64_string.split('base64,')[1]
+            output.write(decoded)
+    except binascii.Error:
+        output.close()
+        raise ImageDecodeError('Некорректная строка base64.')
+    except ImageDecodeError:
+        output.close()
+        raise
 
-    # Decode the base64 string
-    decoded_file = base64.b64decode(base64_string)
+    if carry or _format is None:
+        output.close()
+        raise ImageDecodeError('Некорректное изображение.')
 
-    # Create a ContentFile
-    image_file = ContentFile(decoded_file, name=f'{filename}.{_format}')
+    output.seek(0)
+    if pixels is None:
+        pixels = _image_pixels(output)
+        output.seek(0)
+        if pixels is None or pixels > max_pixels:
+            output.close()
+            raise ImageDecodeError('Некорректное изображение.')
 
-    return image_file
\ No newline at end of file
+    return File(output, name=f'{filename}.{_format}')
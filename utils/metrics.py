@@ -0,0 +1,178 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERIES = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+BYTES = (1024, 10 * 1024, 100 * 1024, 1024 ** 2, 10 * 1024 ** 2)
+
+HISTOGRAMS = {
+    'http_request_duration_seconds': ('Time spent in the Django request handler.', SECONDS),
+    'http_request_sql_queries': ('SQL queries per request.', QUERIES),
+    'http_request_sql_duration_seconds': ('Time spent executing SQL per request.', SECONDS),
+    'http_request_serialize_duration_seconds': ('Time spent producing serializer data per request.', SECONDS),
+    'http_request_render_duration_seconds': ('Time spent rendering the response body per request.', SECONDS),
+    'http_response_size_bytes': ('Size of the response bodies.', BYTES),
+}
+COUNTERS = {
+    'http_responses_total': 'Responses by view and status code.',
+}
+
+
+class MetricsRegistry:
+    """
+    Histograms and counters of this process, keyed by metric name and label
+    values. With a ``directory`` the process snapshot is written there at most
+    every ``flush_interval`` seconds, so that any worker can serve the totals
+    of all of them. The directory belongs to the workers of one host: the
+    snapshots of processes that are no longer running are removed on collect.
+    """
+
+    def __init__(self, directory=None, flush_interval=5):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.pid = os.getpid()
+        self.name = f'{self.pid}-{uuid.uuid4().hex[:8]}.json'
+        self._histograms = {}
+        self._counters = {}
+        self._flushed = 0
+
+    def _check_fork(self):
+        # a forked worker must not report the counts of its parent as its own
+        if os.getpid() != self.pid:
+            self._reset()
+
+    def observe(self, name, labels, value):
+        buckets = HISTOGRAMS[name][1]
+        with self._lock:
+            self._check_fork()
+            key = (name, labels)
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * len(buckets) + [0, 0]
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram[index] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def incr(self, name, labels, value=1):
+        with self._lock:
+            self._check_fork()
+            key = (name, labels)
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def snapshot(self):
+        with self._lock:
+            self._check_fork()
+            return {
+                'histograms': [[name, list(labels), values] for (name, labels), values in self._histograms.items()],
+                'counters': [[name, list(labels), value] for (name, labels), value in self._counters.items()],
+            }
+
+    def maybe_flush(self):
+        if self.directory and time.monotonic() - self._flushed >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self._flushed = time.monotonic()
+        os.makedirs(self.directory, exist_ok=True)
+        fd, path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as file:
+            json.dump(self.snapshot(), file)
+        os.replace(path, os.path.join(self.directory, self.name))
+
+    def collect(self):
+        """The snapshots of every process sharing the directory, this one live."""
+        snapshots = [self.snapshot()]
+        if not self.directory or not os.path.isdir(self.directory):
+            return snapshots
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json') or name == self.name:
+                continue
+            if not _is_running(name.split('-', 1)[0]):
+                # a restarted worker starts from zero, its predecessor must not be counted forever
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as file:
+                    snapshots.append(json.load(file))
+            except (OSError, ValueError):
+                continue  # removed or being replaced
+        return snapshots
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+def _is_running(pid):
+    try:
+        os.kill(int(pid), 0)
+    except ValueError:
+        return True  # not written by a registry, left alone
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # running as another user
+    return True
+
+
+def merge(snapshots):
+    histograms, counters = {}, {}
+    for snapshot in snapshots:
+        for name, labels, values in snapshot['histograms']:
+            if name not in HISTOGRAMS or len(values) != len(HISTOGRAMS[name][1]) + 2:
+                continue  # written with other buckets
+            key = (name, tuple(labels))
+            total = histograms.setdefault(key, [0] * len(values))
+            histograms[key] = [a + b for a, b in zip(total, values)]
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(labels))
+            counters[key] = counters.get(key, 0) + value
+    return histograms, counters
+
+
+def _labels(names, values, extra=None):
+    pairs = [*zip(names, values), *([extra] if extra else [])]
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(snapshots, histogram_labels=('view',), counter_labels=('view', 'status')):
+    """The Prometheus text exposition format of the merged ``snapshots``."""
+    histograms, counters = merge(snapshots)
+    lines = []
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+        for (metric, labels), values in sorted(histograms.items()):
+            if metric != name:
+                continue
+            for bound, count in zip((*buckets, '+Inf'), (*values[:len(buckets)], values[-1])):
+                lines.append(f'{name}_bucket{_labels(histogram_labels, labels, ("le", bound))} {count}')
+            lines.append(f'{name}_sum{_labels(histogram_labels, labels)} {_number(values[-2])}')
+            lines.append(f'{name}_count{_labels(histogram_labels, labels)} {values[-1]}')
+    for name, help_text in COUNTERS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f'{name}{_labels(counter_labels, labels)} {value}')
+    return '\n'.join(lines) + '\n'
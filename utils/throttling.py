@@ -0,0 +1,101 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 60 * 60 * 24}
+
+
+def parse_rate(rate):
+    """
+    Parses a DRF style rate such as ``'5/min'`` into ``(capacity, refill per second)``;
+    ``None`` means no limit.
+    """
+    if rate is None:
+        return None
+    num, period = rate.split('/')
+    capacity = int(num)
+    return capacity, capacity / PERIODS[period[0]]
+
+
+def take(tokens, updated, now, capacity, rate, cost):
+    """Refills a bucket last updated at ``updated``; returns its tokens after taking ``cost`` and the wait."""
+    tokens = min(capacity, tokens + (now - updated) * rate)
+    if tokens >= cost:
+        return tokens - cost, 0
+    return tokens, (cost - tokens) / rate
+
+
+class LocalTokenBucketStore:
+    """
+    Thread-safe in-process token buckets. A bucket starts full, holds at most
+    ``capacity`` tokens and refills ``rate`` tokens per second. Least recently
+    used buckets are dropped beyond ``max_size``; a dropped bucket comes back full.
+    """
+
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, rate, cost=1):
+        """Takes ``cost`` tokens and returns 0, or returns the seconds to wait and takes nothing."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens, wait = take(tokens, updated, now, capacity, rate, cost)
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_size:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def consume_all(self, buckets):
+        """
+        Takes the tokens of every ``(key, capacity, rate, cost)`` bucket when all
+        of them have enough and returns 0; otherwise takes nothing from any of
+        them and returns the longest wait.
+        """
+        now = time.monotonic()
+        with self._lock:
+            taken, longest = {}, 0
+            for key, capacity, rate, cost in buckets:
+                tokens, updated = self._buckets.get(key, (capacity, now))
+                tokens, wait = take(tokens, updated, now, capacity, rate, cost)
+                taken[key] = (tokens, now)
+                longest = max(longest, wait)
+            if longest:
+                return longest
+            for key, bucket in taken.items():
+                self._buckets[key] = bucket
+                self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_size:
+                self._buckets.popitem(last=False)
+        return 0
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class CacheTokenBucketStore:
+    """
+    Token buckets kept in a Django cache, so that the worker processes sharing
+    it share the buckets too. As with the throttles of DRF, reading and writing
+    a bucket is not atomic: requests racing on one bucket may all get through.
+    A bucket expires once it would have refilled anyway.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def consume(self, key, capacity, rate, cost=1):
+        # wall clock time, the monotonic clock of another process means nothing here
+        now = time.time()
+        tokens, updated = self.cache.get(key) or (capacity, now)
+        tokens, wait = take(tokens, updated, now, capacity, rate, cost)
+        self.cache.set(key, (tokens, now), math.ceil((capacity - tokens) / rate) + 1)
+        return wait